@@ -0,0 +1,64 @@
+"""
+Compares the geometry read paths of :class:`geotortoise.fields.GeometryField`.
+
+- ``wkt``: column selected through ``ST_AsText`` and parsed with ``shapely.wkt``.
+- ``hex``: raw column sent as hex EWKB text (asyncpg without a geometry codec).
+- ``old-hex``: the same payload through the previous ``int(value, 16)`` probe.
+- ``binary``: column selected through ``ST_AsBinary`` or decoded by the binary codec.
+
+Run with ``python -m benchmarks.bench_codec``. It does not need a database.
+"""
+import math
+import timeit
+
+import shapely.wkb
+from shapely.geometry import Polygon
+
+from geotortoise.codecs import decode_geometry
+from geotortoise.fields import PolygonField
+
+SIZES = (4, 1_000, 10_000, 100_000)
+
+
+def make_polygon(vertices: int) -> Polygon:
+    step = 2 * math.pi / vertices
+    return Polygon(
+        [
+            (2.8 + 0.1 * math.cos(i * step), 41.9 + 0.1 * math.sin(i * step))
+            for i in range(vertices)
+        ]
+    )
+
+
+def legacy_hex_decode(value: str):
+    int(value, 16)
+    return shapely.wkb.loads(value, hex=True)
+
+
+def run(number: int = 20) -> None:
+    field = PolygonField(srid=4326)
+    print(f"{'vertices':>10} {'path':>8} {'payload (B)':>12} {'decode (ms)':>12}")
+    for size in SIZES:
+        polygon = make_polygon(size)
+        payloads = {
+            "wkt": polygon.wkt,
+            "hex": shapely.wkb.dumps(polygon, hex=True, srid=4326),
+            "old-hex": shapely.wkb.dumps(polygon, hex=True, srid=4326),
+            "binary": shapely.wkb.dumps(polygon, srid=4326),
+        }
+        decoders = {
+            "wkt": field.to_python_value,
+            "hex": field.to_python_value,
+            "old-hex": legacy_hex_decode,
+            "binary": decode_geometry,
+        }
+        loops = max(1, number * 1_000 // size)
+        for path, payload in payloads.items():
+            elapsed = timeit.timeit(lambda: decoders[path](payload), number=loops)
+            print(
+                f"{size:>10} {path:>8} {len(payload):>12} {elapsed / loops * 1e3:>12.4f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
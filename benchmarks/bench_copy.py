@@ -0,0 +1,66 @@
+"""
+Compares the throughput of ``bulk_create`` and binary ``COPY`` for geometry models.
+
+Inserts the same points and polygons with both methods and reports the rows per
+second. It needs the PostGIS database of the tests (``tests/docker-compose.yml``),
+and truncates the test tables.
+
+Run with ``python -m benchmarks.bench_copy``.
+"""
+import asyncio
+import time
+
+from shapely.affinity import translate
+from shapely.geometry import Point
+from tortoise import Tortoise
+
+from geotortoise.bulk import copy_from_geometries
+from tests.models import DB_URL, Place, Region
+
+from .bench_codec import make_polygon
+
+BATCH_SIZE = 10_000
+
+
+def rows(model, count: int):
+    if model is Place:
+        return (
+            {"name": str(i), "point": Point(i % 360 - 180, 0)} for i in range(count)
+        )
+    polygon = make_polygon(100)
+    return (
+        {"name": str(i), "poly": translate(polygon, xoff=i * 1e-4)}
+        for i in range(count)
+    )
+
+
+async def bulk_create(model, count: int) -> None:
+    await model.bulk_create(
+        [model(**row) for row in rows(model, count)], batch_size=BATCH_SIZE
+    )
+
+
+async def copy(model, count: int) -> None:
+    await copy_from_geometries(model, rows(model, count), batch_size=BATCH_SIZE)
+
+
+async def run(count: int = 100_000) -> None:
+    await Tortoise.init(db_url=DB_URL, modules={"models": ["tests.models"]})
+    await Tortoise.generate_schemas()
+    try:
+        print(f"{'model':>8} {'method':>12} {'rows/s':>10}")
+        for model in (Place, Region):
+            for name, load in (("bulk_create", bulk_create), ("copy", copy)):
+                await model.all().delete()
+                start = time.perf_counter()
+                await load(model, count)
+                elapsed = time.perf_counter() - start
+                print(f"{model.__name__:>8} {name:>12} {count / elapsed:>10.0f}")
+        for model in (Place, Region):
+            await model.all().delete()
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,245 @@
+"""
+Benchmarks of the geometry codec and SQL generation hot paths, to catch regressions.
+
+Every geometry is benchmarked at several scales, from a single point to a polygon
+of 100k vertices. The database tier only runs when the PostGIS of the tests is
+reachable (see ``tests/docker-compose.yml``), and is skipped otherwise.
+
+Needs ``pytest-benchmark``, one of the dev dependencies. Run with::
+
+    python -m pytest benchmarks/bench_hot_paths.py --benchmark-only
+
+and compare against a previous run with ``--benchmark-autosave`` and
+``--benchmark-compare``.
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import asyncio
+import inspect
+import itertools
+
+import shapely.wkb
+from pypika import Field as PyPikaField
+from pypika.terms import LiteralValue
+from shapely.geometry import Point
+from tortoise import Tortoise
+from tortoise.queryset import QuerySet
+
+from geotortoise import functions
+from geotortoise._base_functions import Function
+from geotortoise.fields import PointField, PolygonField
+from geotortoise.functions import convert_to_db_value
+from geotortoise.queryset import GeometryQuerySet
+from tests.models import DB_URL, Region
+
+from .bench_codec import make_polygon
+
+SIZES = (1, 1_000, 10_000, 100_000)
+# Not rendered on their own
+ABSTRACT_FUNCTIONS = (
+    functions.ComparesGeometryLike,
+    functions.ComparesGeometryOperator,
+    functions.SubdividedLookup,
+    functions.SpatialAggregate,
+    functions.AggregateGeometry,
+    functions.ClusterWindowFunction,
+)
+COLUMN = PyPikaField("geom")
+
+
+def make_geometry(size):
+    return Point(2.8, 41.9) if size == 1 else make_polygon(size)
+
+
+def field_for(size):
+    return PointField(srid=4326) if size == 1 else PolygonField(srid=4326)
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: f"{size}v", scope="module")
+def geometry(request):
+    return make_geometry(request.param)
+
+
+# ====================
+# Codec
+# ====================
+
+
+@pytest.mark.parametrize("payload", ["wkt", "hex", "bytes"])
+@pytest.mark.parametrize("size", SIZES, ids=lambda size: f"{size}v")
+def test_to_python_value(benchmark, size, payload):
+    geometry = make_geometry(size)
+    value = {
+        "wkt": geometry.wkt,
+        "hex": shapely.wkb.dumps(geometry, hex=True, srid=4326),
+        "bytes": shapely.wkb.dumps(geometry, srid=4326),
+    }[payload]
+    benchmark.group = f"to_python_value-{size}v"
+
+    assert benchmark(field_for(size).to_python_value, value).equals(geometry)
+
+
+@pytest.mark.parametrize("size", SIZES, ids=lambda size: f"{size}v")
+def test_to_db_value(benchmark, size):
+    geometry = make_geometry(size)
+
+    hex_wkb = benchmark(field_for(size).to_db_value, geometry, None)
+
+    assert shapely.wkb.loads(hex_wkb, hex=True).equals(geometry)
+
+
+@pytest.mark.parametrize("target", ["geometry", "wkt"])
+def test_convert_to_db_value(benchmark, geometry, target):
+    value = geometry if target == "geometry" else geometry.wkt
+
+    assert benchmark(convert_to_db_value, value, 4326) is not None
+
+
+# ====================
+# SQL generation
+# ====================
+
+
+def comparative(cls):
+    return lambda geometry: cls(geom=geometry, g2_srid=4326)
+
+
+FUNCTIONS = {
+    functions.GeomFromText: lambda geometry: functions.GeomFromText(geometry.wkt),
+    functions.GeomFromWKB: lambda geometry: functions.GeomFromWKB(
+        shapely.to_wkb(geometry), 4326
+    ),
+    functions.AsText: lambda geometry: functions.AsText(COLUMN),
+    functions.AsBinary: lambda geometry: functions.AsBinary(COLUMN),
+    functions.ST_AsGeoJSON: lambda geometry: functions.ST_AsGeoJSON(COLUMN, 6),
+    functions.Geography: lambda geometry: functions.Geography(COLUMN),
+    functions.ST_Transform: lambda geometry: functions.ST_Transform(COLUMN, 3857),
+    functions.ST_SetSRID: lambda geometry: functions.ST_SetSRID(COLUMN, 4326),
+    functions.ST_SnapToGrid: lambda geometry: functions.ST_SnapToGrid(COLUMN, 0.5),
+    functions.ST_ReducePrecision: lambda geometry: functions.ST_ReducePrecision(
+        COLUMN, 1e-6
+    ),
+    functions.ST_Centroid: lambda geometry: functions.ST_Centroid(COLUMN),
+    functions.ST_Equals: comparative(functions.ST_Equals),
+    functions.ST_Disjoint: comparative(functions.ST_Disjoint),
+    functions.ST_Touches: comparative(functions.ST_Touches),
+    functions.ST_Within: comparative(functions.ST_Within),
+    functions.ST_Overlaps: comparative(functions.ST_Overlaps),
+    functions.ST_Intersects: comparative(functions.ST_Intersects),
+    functions.ST_Contains: comparative(functions.ST_Contains),
+    functions.ST_Distance: comparative(functions.ST_Distance),
+    functions.ST_DistanceSphere: comparative(functions.ST_DistanceSphere),
+    functions.ST_Intersection: comparative(functions.ST_Intersection),
+    functions.ST_Difference: comparative(functions.ST_Difference),
+    functions.ST_Union: comparative(functions.ST_Union),
+    functions.ST_ClosestPoint: comparative(functions.ST_ClosestPoint),
+    functions.ST_DWithin: lambda geometry: functions.ST_DWithin(
+        geom=geometry, distance=0.1, g2_srid=4326
+    ),
+    functions.BBoxIntersects: comparative(functions.BBoxIntersects),
+    functions.KNNDistance: comparative(functions.KNNDistance),
+    functions.KNNDistanceND: comparative(functions.KNNDistanceND),
+    functions.ST_Extent: lambda geometry: functions.ST_Extent(COLUMN),
+    functions.ST_Collect: lambda geometry: functions.ST_Collect(COLUMN),
+    functions.ST_MemUnion: lambda geometry: functions.ST_MemUnion(COLUMN),
+    functions.ST_ClusterDBSCAN: lambda geometry: functions.ST_ClusterDBSCAN(
+        COLUMN, 0.1, 2, partition_by=["category"]
+    ),
+    functions.ST_ClusterKMeans: lambda geometry: functions.ST_ClusterKMeans(COLUMN, 10),
+    functions.ST_TileEnvelope: lambda geometry: functions.ST_TileEnvelope(12, 2, 3),
+    functions.ST_AsMVTGeom: lambda geometry: functions.ST_AsMVTGeom(
+        COLUMN, functions.ST_TileEnvelope(12, 2, 3)
+    ),
+    functions.ST_AsMVT: lambda geometry: functions.ST_AsMVT(
+        LiteralValue('"tile"'), "places"
+    ),
+}
+
+
+def test_every_function_is_benchmarked():
+    classes = {
+        cls
+        for _, cls in inspect.getmembers(functions, inspect.isclass)
+        if issubclass(cls, Function)
+        and cls.__module__ == functions.__name__
+        and cls not in ABSTRACT_FUNCTIONS
+    }
+
+    assert classes == set(FUNCTIONS)
+
+
+@pytest.mark.parametrize("cls", FUNCTIONS, ids=lambda cls: cls.__name__)
+def test_get_function_sql(benchmark, geometry, cls):
+    function = FUNCTIONS[cls](geometry)
+    benchmark.group = f"get_function_sql-{cls.__name__}"
+
+    assert benchmark(function.get_function_sql, quote_char='"')
+
+
+# ====================
+# Database
+# ====================
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def regions(loop):
+    try:
+        loop.run_until_complete(
+            Tortoise.init(db_url=DB_URL, modules={"models": ["tests.models"]})
+        )
+        loop.run_until_complete(Tortoise.generate_schemas())
+    except OSError as exc:
+        pytest.skip(f"PostGIS is not available: {exc}")
+    loop.run_until_complete(
+        Region.bulk_create(
+            [Region(name=f"{size}v", poly=make_polygon(size)) for size in SIZES[1:]]
+        )
+    )
+    yield
+    loop.run_until_complete(Region.all().delete())
+    loop.run_until_complete(Tortoise.close_connections())
+
+
+@pytest.mark.parametrize("size", SIZES[1:], ids=lambda size: f"{size}v")
+def test_db_fetch_polygon(benchmark, loop, regions, size):
+    queryset = Region.filter(name=f"{size}v")
+
+    def fetch():
+        [region] = loop.run_until_complete(queryset)
+        # The polygon is lazy, decode it within the measure
+        return region.poly
+
+    poly = benchmark(fetch)
+
+    assert len(poly.exterior.coords) == size + 1
+
+
+def test_db_contains_filter(benchmark, loop, regions):
+    queryset = Region.filter(functions.ST_Contains(poly=Point(2.8, 41.9)))
+
+    assert len(benchmark(lambda: loop.run_until_complete(queryset))) == 3
+
+
+@pytest.mark.parametrize(
+    "queryset_class", [QuerySet, GeometryQuerySet], ids=["inline", "bound"]
+)
+def test_db_contains_distinct_geometries(benchmark, loop, regions, queryset_class):
+    # A new geometry every round: only the bound statement is prepared once
+    points = (Point(2.8 + i * 1e-9, 41.9) for i in itertools.count())
+
+    def fetch():
+        queryset = queryset_class(Region).filter(
+            functions.ST_Contains(poly=next(points))
+        )
+        return loop.run_until_complete(queryset)
+
+    assert len(benchmark(fetch)) == 3
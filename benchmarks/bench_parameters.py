@@ -0,0 +1,69 @@
+"""
+Compares inlined and bound geometries in spatial filters.
+
+Replays a workload of ``ST_Contains`` lookups against asyncpg's default
+prepared statement cache (an LRU of 100 statements per connection) and reports
+its hit rate, the statement size and the time to render it.
+
+Run with ``python -m benchmarks.bench_parameters``. It does not need a database.
+"""
+import random
+import time
+from collections import OrderedDict
+
+from shapely.affinity import translate
+from shapely.geometry import Point
+
+from geotortoise._base_functions import parameterize_sql
+from geotortoise.functions import ST_Contains
+
+from .bench_codec import make_polygon
+
+STATEMENT_CACHE_SIZE = 100
+
+
+def hit_rate(statements) -> float:
+    cache, hits = OrderedDict(), 0
+    for sql in statements:
+        if sql in cache:
+            hits += 1
+            cache.move_to_end(sql)
+        else:
+            cache[sql] = None
+            if len(cache) > STATEMENT_CACHE_SIZE:
+                cache.popitem(last=False)
+    return hits / len(statements)
+
+
+def run(lookups: int = 5_000) -> None:
+    rnd = random.Random(0)
+    targets = {
+        "point": [
+            Point(rnd.uniform(-180, 180), rnd.uniform(-90, 90)) for _ in range(lookups)
+        ],
+        "polygon": [translate(make_polygon(1_000), xoff=i * 0.01) for i in range(200)]
+        * (lookups // 200),
+    }
+    print(
+        f"{'target':>8} {'mode':>8} {'hit rate':>9} {'avg size (B)':>13} {'render (us)':>12}"
+    )
+    for name, geoms in targets.items():
+        renders = {
+            "inline": lambda g: ST_Contains(poly=g, g2_srid=4326).get_sql(),
+            "bound": lambda g: parameterize_sql(
+                ST_Contains(poly=g, g2_srid=4326).get_sql
+            )[0],
+        }
+        for mode, render in renders.items():
+            start = time.perf_counter()
+            statements = [render(g) for g in geoms]
+            elapsed = time.perf_counter() - start
+            size = sum(map(len, statements)) / len(statements)
+            print(
+                f"{name:>8} {mode:>8} {hit_rate(statements):>9.1%} {size:>13.0f}"
+                f" {elapsed / len(geoms) * 1e6:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
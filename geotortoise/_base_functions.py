@@ -3,12 +3,75 @@ Implements arbitrary SQL functions using getattr.
 
 Inspired by the SQLAlchemy function implementation.
 """
-from typing import Callable, Union
+import re
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from pypika.functions import Function as PyPikaFunction
-from pypika.terms import Criterion, Field, Parameter
+from pypika.terms import Criterion, Field, Parameter, Term, ValueWrapper
 from tortoise.expressions import Q
 from tortoise.query_utils import QueryModifier
 
+# Values collected while rendering a query in :func:`parameterize_sql`
+_collected_parameters: ContextVar[Optional[Dict[int, Tuple[int, Any]]]] = ContextVar(
+    "collected_parameters", default=None
+)
+PARAMETER_TOKEN = "$geotortoise_{}$"
+PARAMETER_TOKEN_RE = re.compile(r"\$geotortoise_(\d+)\$")
+
+
+class ValueParameter(Term):
+    """
+    A value that is sent as a bound parameter when the query is rendered
+    through :func:`parameterize_sql`, and inlined as a literal otherwise.
+    """
+
+    def __init__(self, value: Any, alias=None) -> None:
+        super().__init__(alias)
+        self.value = value
+
+    def get_sql(self, **kwargs: Any) -> str:
+        parameters = _collected_parameters.get()
+        if parameters is None:
+            return self.get_literal_sql(**kwargs)
+        index, _ = parameters.setdefault(id(self), (len(parameters), self.value))
+        return PARAMETER_TOKEN.format(index)
+
+    def get_literal_sql(self, **kwargs: Any) -> str:
+        if isinstance(self.value, bytes):
+            return f"decode('{self.value.hex()}','hex')"
+        return ValueWrapper(self.value).get_sql(**kwargs)
+
+
+def parameterize_sql(render: Callable[[], str]) -> Tuple[str, List[Any]]:
+    """
+    Renders a query replacing every :class:`ValueParameter` with a positional
+    placeholder (``$1``, ``$2``...), so that the statement text does not depend
+    on the values and the driver can reuse its prepared statement.
+
+    :param render: Callable returning the SQL, e.g. ``queryset.sql``.
+    :return: The SQL and the values to bind, in placeholder order.
+    """
+    token = _collected_parameters.set({})
+    try:
+        sql = render()
+        collected = dict(_collected_parameters.get().values())
+    finally:
+        _collected_parameters.reset(token)
+
+    # Terms may be rendered more than once while building a query, so placeholders
+    # are numbered by their position in the final SQL instead of by render order.
+    values: List[Any] = []
+    positions = {}
+
+    def replace(match: "re.Match") -> str:
+        index = int(match.group(1))
+        if index not in positions:
+            values.append(collected[index])
+            positions[index] = len(values)
+        return f"${positions[index]}"
+
+    return PARAMETER_TOKEN_RE.sub(replace, sql), values
+
 
 class FunctionReturn:
     def __init__(self, where_criterion, having_criterion, joins, field) -> None:
@@ -0,0 +1,160 @@
+"""
+Bulk loading of geometry models through binary ``COPY``.
+
+``bulk_create`` sends ``INSERT`` statements with every geometry as hex EWKB text,
+which PostgreSQL has to parse back. :func:`copy_from_geometries` streams the rows
+with asyncpg's ``copy_records_to_table`` in the binary format instead, with the
+geometries as EWKB bytes, so that reloading millions of rows is bound by the
+network and the table indexes rather than by statement parsing::
+
+    async def read_places(path):
+        async for line in ...:
+            yield {"name": ..., "point": Point(...)}
+
+    await copy_from_geometries(Place, read_places(path))
+"""
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+
+from tortoise import Model
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from .codecs import GEOMETRY_TYPE, encode_geometries, register_geometry_codec
+from .fields import GeohashField, GeometryField, SimplifiedPolygonField
+
+Row = Union[Model, Mapping[str, Any]]
+
+
+async def _batches(
+    rows: Union[Iterable[Row], AsyncIterable[Row]], batch_size: int
+) -> AsyncIterator[List[Row]]:
+    if isinstance(rows, AsyncIterable):
+        batch = []
+        async for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    else:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            yield batch
+
+
+async def _records(
+    model: Type[Model],
+    fields: List[str],
+    rows: Union[Iterable[Row], AsyncIterable[Row]],
+    batch_size: int,
+) -> AsyncIterator[Tuple[Any, ...]]:
+    fields_map = model._meta.fields_map
+    defaults = {name: fields_map[name].default for name in fields}
+
+    def value(row: Row, name: str) -> Any:
+        if isinstance(row, Model):
+            return getattr(row, name)
+        if name in row:
+            return row[name]
+        default = defaults[name]
+        return default() if callable(default) else default
+
+    async for batch in _batches(rows, batch_size):
+        columns = []
+        for name in fields:
+            field = fields_map[name]
+            if isinstance(field, SimplifiedPolygonField):
+                values = field.simplify([value(row, field.source) for row in batch])
+            elif isinstance(field, GeohashField):
+                columns.append(
+                    field.derive([value(row, field.source) for row in batch])
+                )
+                continue
+            else:
+                values = [value(row, name) for row in batch]
+            if isinstance(field, GeometryField):
+                # One vectorized call per column and batch, as EWKB bytes
+                columns.append(
+                    encode_geometries(values, field.srid, False, field.grid_size)
+                )
+            else:
+                columns.append(
+                    [
+                        field.to_db_value(
+                            value, row if isinstance(row, Model) else model
+                        )
+                        for value, row in zip(values, batch)
+                    ]
+                )
+        for record in zip(*columns):
+            yield record
+
+
+async def copy_from_geometries(
+    model: Type[Model],
+    rows: Union[Iterable[Row], AsyncIterable[Row]],
+    fields: Optional[Iterable[str]] = None,
+    batch_size: int = 10_000,
+    using_db: Optional[BaseDBAsyncClient] = None,
+    register_codec: bool = True,
+) -> int:
+    """
+    Inserts rows into the table of a model with a single binary ``COPY``.
+
+    The rows are consumed lazily, ``batch_size`` at a time, so the input never
+    has to be fully in memory. ``save`` signals are not sent and the instances
+    are not updated with their generated primary keys.
+
+    :param model: The model of the table.
+    :param rows: Model instances, or mappings from field names to values, in an
+        iterable or an async iterable. Missing keys take the default of the field.
+    :param fields: The fields to copy. All the fields, except the generated ones,
+        by default.
+    :param batch_size: The number of rows encoded at a time.
+    :param using_db: The connection to use. The default one of the model by default.
+    :param register_codec: Registers the binary geometry codec on the connection for
+        the copy, which needs it. Set it to False when the pool already registers
+        :func:`geotortoise.codecs.register_geometry_codec` on every connection.
+    :return: The number of rows copied.
+    """
+    meta = model._meta
+    if fields is None:
+        fields = [
+            name
+            for name in meta.fields_db_projection
+            if not meta.fields_map[name].generated
+        ]
+    else:
+        fields = list(fields)
+    columns = [meta.fields_db_projection[name] for name in fields]
+    db = using_db or meta.db
+
+    async with db.acquire_connection() as connection:
+        if register_codec:
+            await register_geometry_codec(connection)
+        try:
+            status = await connection.copy_records_to_table(
+                meta.db_table,
+                records=_records(model, fields, rows, batch_size),
+                columns=columns,
+                schema_name=getattr(meta, "schema", None),
+            )
+        finally:
+            if register_codec:
+                await connection.reset_type_codec(GEOMETRY_TYPE)
+    return int(status.split()[-1])
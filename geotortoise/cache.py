@@ -0,0 +1,257 @@
+"""
+In-process spatial cache for small, hot reference tables.
+
+Tables such as administrative regions are small, rarely change and are queried on
+every request. :class:`SpatialCache` loads their rows once, keeps the geometries
+prepared in an ``STRtree`` and answers spatial filters locally, without a round
+trip to the database::
+
+    regions = SpatialCache(Region.all())
+
+    await regions.contains(point)
+    await regions.filter(ST_Contains(poly=point))
+    await regions.nearest(point, limit=3)
+"""
+import asyncio
+import logging
+import weakref
+from typing import Any, Callable, Coroutine, List, Optional
+
+import numpy as np
+import shapely
+import shapely.wkt
+from shapely.geometry.base import BaseGeometry
+from tortoise import Model
+from tortoise.queryset import QuerySet
+from tortoise.signals import Signals
+
+from .evaluator import SHAPELY_FUNCTIONS
+from .fields import get_geometry_field
+from .functions import (
+    ComparesGeometryLike,
+    ST_Contains,
+    ST_DWithin,
+    ST_Equals,
+    ST_Intersects,
+    ST_Overlaps,
+    ST_Touches,
+    ST_Within,
+)
+from .queryset import nearest
+
+logger = logging.getLogger("geotortoise")
+
+# The predicates that only hold for geometries whose bounding boxes intersect
+TREE_PREDICATES = (
+    ST_Contains,
+    ST_Within,
+    ST_Intersects,
+    ST_Touches,
+    ST_Overlaps,
+    ST_Equals,
+)
+# Bytes taken by a 2D coordinate, which dominate the size of the cache
+COORDINATE_NBYTES = 16
+
+
+def _invalidation_listener(
+    ref: "weakref.ref[SpatialCache]",
+) -> Callable[..., Coroutine[Any, Any, None]]:
+    """
+    Returns a signal listener invalidating the referenced cache while it tracks
+    changes. Tortoise keeps listeners forever, so the listener only holds a weak
+    reference to the cache, and does nothing once the cache is closed or collected.
+    """
+
+    async def on_change(*args: Any) -> None:
+        cache = ref()
+        if cache is not None and cache._tracking:
+            cache.invalidate()
+
+    return on_change
+
+
+class SpatialCache:
+    """
+    Answers spatial filters on a queryset from an in-memory ``STRtree``.
+
+    The rows are loaded on first use. When tracking changes, saving or deleting
+    an instance of the model marks the cache as stale, and the next lookup reloads
+    it. Bulk operations and queryset updates do not send signals: call
+    :meth:`invalidate` after them.
+
+    Only the lookups made through the cache are answered from memory: the
+    querysets of the model keep querying the database.
+
+    If the geometries exceed ``max_bytes``, nothing is kept in memory and every
+    lookup is sent to the database.
+
+    The cached instances are shared between lookups and must not be modified.
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        geom_field: Optional[str] = None,
+        max_bytes: int = 64 * 2**20,
+        track_changes: bool = True,
+    ) -> None:
+        """
+        :param queryset: The rows to cache, e.g. ``Region.all()``.
+        :param geom_field: The geometry field. The first one of the model by default.
+        :param max_bytes: The maximum size of the cached coordinates.
+        :param track_changes: Invalidates the cache when an instance is saved or deleted.
+        """
+        self.queryset = queryset
+        self.field = get_geometry_field(queryset.model, geom_field)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._instances: List[Model] = []
+        self._geoms = np.empty(0, dtype=object)
+        self._tree: Optional[shapely.STRtree] = None
+        self._stale = True
+        self._lock: Optional[asyncio.Lock] = None
+        self._tracking = False
+        self._listener: Optional[Callable[..., Coroutine[Any, Any, None]]] = None
+        if track_changes:
+            self.track_changes()
+
+    def __len__(self) -> int:
+        return len(self._instances)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the lookups are answered from memory."""
+        return self._tree is not None
+
+    def track_changes(self) -> None:
+        """Invalidates the cache whenever an instance of the model is saved or deleted."""
+        if self._listener is None:
+            self._listener = _invalidation_listener(weakref.ref(self))
+            model = self.queryset.model
+            model.register_listener(Signals.post_save, self._listener)
+            model.register_listener(Signals.post_delete, self._listener)
+        self._tracking = True
+
+    def close(self) -> None:
+        """Stops tracking changes and drops the cached rows."""
+        self._tracking = False
+        self._instances, self._geoms, self._tree = [], np.empty(0, dtype=object), None
+        self.nbytes = 0
+        self._stale = True
+
+    def invalidate(self) -> None:
+        """Marks the cache as stale, so the next lookup reloads it."""
+        self._stale = True
+
+    async def refresh(self) -> None:
+        """Reloads the rows and rebuilds the tree."""
+        # Changes made while the rows are fetched must reload them again
+        self._stale = False
+        try:
+            instances = await self.queryset
+        except Exception:
+            self._stale = True
+            raise
+        stale = self._stale
+        self.populate(instances)
+        self._stale = stale
+
+    def populate(self, instances: List[Model]) -> None:
+        """
+        Builds the tree from rows that were already fetched.
+
+        :param instances: The rows of the queryset, in order.
+        """
+        geoms = np.empty(len(instances), dtype=object)
+        geoms[:] = [getattr(i, self.field.model_field_name) for i in instances]
+        nbytes = int(shapely.get_num_coordinates(geoms).sum()) * COORDINATE_NBYTES
+
+        if nbytes > self.max_bytes:
+            logger.warning(
+                "%s cache disabled, its geometries take %d bytes (max_bytes=%d).",
+                self.queryset.model.__name__,
+                nbytes,
+                self.max_bytes,
+            )
+            self._instances, self._geoms, self._tree = [], geoms[:0], None
+            self.nbytes = 0
+        else:
+            # Prepared geometries make repeated predicates on the same geometry faster
+            shapely.prepare(geoms)
+            self._instances, self._geoms = instances, geoms
+            self._tree = shapely.STRtree(geoms)
+            self.nbytes = nbytes
+        self._stale = False
+
+    async def _load(self) -> bool:
+        if self._stale:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._stale:
+                    await self.refresh()
+        return self._tree is not None
+
+    async def filter(self, function: ComparesGeometryLike) -> List[Model]:
+        """
+        Returns the rows matching a spatial filter, in the order of the queryset.
+
+        Filters on the cached field against a Shapely geometry or WKT, using the
+        key-value form (``ST_Contains(poly=point)``), are evaluated locally. Any other
+        filter, or every filter when the cache is disabled, runs on the database.
+        """
+        lookup = getattr(function, "lookup", None)
+        local = lookup is not None and lookup[0] in (
+            self.field.model_field_name,
+            self.field.source_field,
+        )
+        if local:
+            geom = lookup[1]
+            if isinstance(geom, str):
+                geom = shapely.wkt.loads(geom)
+            local = isinstance(geom, BaseGeometry)
+        if isinstance(function, ST_DWithin):
+            local = local and not function.geography
+        else:
+            local = local and type(function) in TREE_PREDICATES
+        if not local or not await self._load():
+            return await self.queryset.filter(function)
+
+        if isinstance(function, ST_DWithin):
+            matches = self._tree.query(
+                geom, predicate="dwithin", distance=function.distance
+            )
+        else:
+            candidates = self._tree.query(geom)
+            predicate = SHAPELY_FUNCTIONS[type(function)]
+            matches = candidates[predicate(self._geoms[candidates], geom)]
+        return [self._instances[i] for i in np.sort(matches)]
+
+    async def contains(self, geom: BaseGeometry) -> List[Model]:
+        """Returns the rows whose geometry contains the given one."""
+        return await self.filter(ST_Contains(**{self.field.model_field_name: geom}))
+
+    async def within(self, geom: BaseGeometry) -> List[Model]:
+        """Returns the rows whose geometry is within the given one."""
+        return await self.filter(ST_Within(**{self.field.model_field_name: geom}))
+
+    async def intersects(self, geom: BaseGeometry) -> List[Model]:
+        """Returns the rows whose geometry intersects the given one."""
+        return await self.filter(ST_Intersects(**{self.field.model_field_name: geom}))
+
+    async def nearest(self, geom: BaseGeometry, limit: int = 1) -> List[Model]:
+        """
+        Returns the ``limit`` nearest rows to a geometry, nearest first.
+
+        Ties are broken by the order of the queryset.
+        """
+        if not await self._load():
+            kwargs = {self.field.model_field_name: geom}
+            return await nearest(self.queryset, limit, **kwargs)
+        if limit == 1:
+            matches = np.sort(self._tree.query_nearest(geom))[:1]
+        else:
+            distances = shapely.distance(self._geoms, geom)
+            matches = np.argsort(distances, kind="stable")[:limit]
+        return [self._instances[i] for i in matches]
@@ -0,0 +1,196 @@
+"""
+Geohash cell keys of (longitude, latitude) coordinates.
+
+A geohash names a cell of a fixed grid with a short string, and cells sharing a
+prefix are nested, so the keys of a column can be compared with a B-tree index,
+grouped or hashed to shard rows, instead of evaluating a geometry predicate::
+
+    geohashes([2.8288], [41.9867], 7)
+    # ["sp6nb77"]
+    cells_in_bbox((2.8, 41.9, 2.9, 42.0), 5)
+    # ["sp3yr", "sp6n2", "sp6n3", ...]
+
+Precisions go from 1 (cells of 45 x 45 degrees) to :data:`MAX_PRECISION`. With 7
+characters, cells are about 153 x 153 m at the equator.
+"""
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 12
+# Mean Earth radius, as used by ST_DistanceSphere
+EARTH_RADIUS = 6_371_008.8
+METERS_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+_ALPHABET = np.frombuffer(BASE32.encode(), dtype=np.uint8)
+_DIGITS = {char: digit for digit, char in enumerate(BASE32)}
+
+BBox = Tuple[float, float, float, float]
+
+
+def _bits(precision: int) -> Tuple[int, int]:
+    """Returns the bits of the longitude and the latitude of a precision."""
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(
+            f"Invalid geohash precision {precision}, "
+            f"expected a value between 1 and {MAX_PRECISION}."
+        )
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+
+def _grid_index(values: np.ndarray, low: float, high: float, bits: int) -> np.ndarray:
+    size = 1 << bits
+    index = np.floor((values - low) / (high - low) * size)
+    return np.clip(index, 0, size - 1).astype(np.uint64)
+
+
+def _interleave(ix: np.ndarray, iy: np.ndarray, precision: int) -> np.ndarray:
+    """Interleaves the grid indexes into the bits of the geohash, longitude first."""
+    lon_bits, lat_bits = _bits(precision)
+    code = np.zeros(ix.shape, dtype=np.uint64)
+    for bit in range(5 * precision):
+        index, shift = (ix, lon_bits) if bit % 2 == 0 else (iy, lat_bits)
+        shift -= bit // 2 + 1
+        code = (code << np.uint64(1)) | ((index >> np.uint64(shift)) & np.uint64(1))
+    return code
+
+
+def _encode(code: np.ndarray, precision: int) -> List[str]:
+    shifts = np.arange(5 * (precision - 1), -1, -5, dtype=np.uint64)
+    digits = (code[:, None] >> shifts) & np.uint64(31)
+    chars = np.ascontiguousarray(_ALPHABET[digits.astype(np.intp)])
+    return chars.view(f"S{precision}").ravel().astype(f"U{precision}").tolist()
+
+
+def geohashes(x: Sequence[float], y: Sequence[float], precision: int) -> List[str]:
+    """
+    Returns the geohash of every coordinate, in a single vectorized pass.
+
+    Coordinates out of the valid range are assigned to the cells of the bounds.
+
+    :param x: The longitudes.
+    :param y: The latitudes.
+    :param precision: The length of the geohashes.
+    """
+    lon_bits, lat_bits = _bits(precision)
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    if not len(x):
+        return []
+    code = _interleave(
+        _grid_index(x, -180, 180, lon_bits),
+        _grid_index(y, -90, 90, lat_bits),
+        precision,
+    )
+    return _encode(code, precision)
+
+
+def cell_bounds(cell: str) -> BBox:
+    """
+    Returns the bounds of a geohash cell.
+
+    :param cell: The geohash.
+    :return: (min longitude, min latitude, max longitude, max latitude)
+    """
+    lon_bits, lat_bits = _bits(len(cell))
+    ix = iy = 0
+    bit = 0
+    for char in cell:
+        try:
+            digit = _DIGITS[char]
+        except KeyError:
+            raise ValueError(f'Invalid geohash "{cell}".') from None
+        for shift in range(4, -1, -1):
+            value = (digit >> shift) & 1
+            if bit % 2 == 0:
+                ix = (ix << 1) | value
+            else:
+                iy = (iy << 1) | value
+            bit += 1
+    width, height = 360 / (1 << lon_bits), 180 / (1 << lat_bits)
+    return (
+        -180 + ix * width,
+        -90 + iy * height,
+        -180 + (ix + 1) * width,
+        -90 + (iy + 1) * height,
+    )
+
+
+def cells_in_bbox(bbox: BBox, precision: int, max_cells: int = 1024) -> List[str]:
+    """
+    Returns the geohashes of the cells intersecting a bounding box.
+
+    Boxes crossing the antimeridian are given with a min longitude greater than the
+    max longitude, e.g. ``(170, -10, -170, 10)``.
+
+    :param bbox: (min longitude, min latitude, max longitude, max latitude)
+    :param precision: The length of the geohashes.
+    :param max_cells: The maximum number of cells. Raises ``ValueError`` when the
+        box covers more cells, so that prefilters never grow unbounded: use a
+        coarser precision for large boxes.
+    """
+    lon_bits, lat_bits = _bits(precision)
+    minx, miny, maxx, maxy = bbox
+    first_x, last_x = _grid_index(np.array([minx, maxx]), -180, 180, lon_bits)
+    first_y, last_y = _grid_index(np.array([miny, maxy]), -90, 90, lat_bits)
+    if first_x > last_x:
+        columns = np.concatenate(
+            [
+                np.arange(first_x, 1 << lon_bits, dtype=np.uint64),
+                np.arange(0, last_x + 1, dtype=np.uint64),
+            ]
+        )
+    else:
+        columns = np.arange(first_x, last_x + 1, dtype=np.uint64)
+    rows = np.arange(min(first_y, last_y), max(first_y, last_y) + 1, dtype=np.uint64)
+
+    count = len(columns) * len(rows)
+    if count > max_cells:
+        raise ValueError(
+            f"The box covers {count} cells of precision {precision}, more than "
+            f"{max_cells}: use a coarser precision."
+        )
+    ix, iy = np.meshgrid(columns, rows)
+    return _encode(_interleave(ix.ravel(), iy.ravel(), precision), precision)
+
+
+def radius_bbox(x: float, y: float, radius: float) -> BBox:
+    """
+    Returns the bounding box of a circle on the sphere.
+
+    :param x: The longitude of the center.
+    :param y: The latitude of the center.
+    :param radius: The radius, in meters.
+    :return: A box as expected by :func:`cells_in_bbox`.
+    """
+    delta_y = radius / METERS_PER_DEGREE
+    miny, maxy = max(y - delta_y, -90.0), min(y + delta_y, 90.0)
+    cos_y = math.cos(math.radians(max(abs(miny), abs(maxy))))
+    if miny == -90 or maxy == 90 or delta_y >= 180 * cos_y:
+        # The circle reaches a pole, or wraps the whole parallel
+        return -180.0, miny, 180.0, maxy
+    delta_x = delta_y / cos_y
+    minx, maxx = x - delta_x, x + delta_x
+    if minx < -180:
+        minx += 360
+    if maxx > 180:
+        maxx -= 360
+    return minx, miny, maxx, maxy
+
+
+def cells_in_radius(
+    x: float, y: float, radius: float, precision: int, max_cells: int = 1024
+) -> List[str]:
+    """
+    Returns the geohashes of the cells intersecting the bounding box of a circle.
+
+    :param x: The longitude of the center.
+    :param y: The latitude of the center.
+    :param radius: The radius, in meters.
+    :param precision: The length of the geohashes.
+    :param max_cells: See :func:`cells_in_bbox`.
+    """
+    return cells_in_bbox(radius_bbox(x, y, radius), precision, max_cells)
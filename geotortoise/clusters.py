@@ -0,0 +1,119 @@
+"""
+Server-side clustering of geometries for zoomed-out maps.
+
+Instead of fetching every row and clustering them in Python, PostGIS assigns a
+cluster to every row and aggregates each cluster into its centroid, number of rows
+and extent, so that only one row per cluster is transferred::
+
+    # Bucketed in a grid of 0.5 degrees
+    cells = await fetch_clusters(Place.all(), 0.5)
+
+    # Places with the same name within 0.1 degrees of each other
+    point = Place._meta.fields_map["point"]
+    groups = await fetch_clusters(
+        Place.all(), ST_ClusterDBSCAN(point, 0.1, 2, partition_by=["name"])
+    )
+"""
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import shapely
+from pypika import Field as PyPikaField
+from tortoise.queryset import QuerySet
+
+from ._base_functions import parameterize_sql
+from .fields import get_geometry_field
+from .functions import ClusterWindowFunction, ST_Centroid, ST_SnapToGrid
+
+CLUSTER = "cluster"
+EXTENT = {"xmin": "ST_XMin", "ymin": "ST_YMin", "xmax": "ST_XMax", "ymax": "ST_YMax"}
+
+Cluster = Union[float, ClusterWindowFunction]
+
+
+def _partition(cluster: Cluster) -> List[str]:
+    if not isinstance(cluster, ClusterWindowFunction):
+        return []
+    names = []
+    for term in cluster.partition_by:
+        if not isinstance(term, PyPikaField):
+            raise TypeError("Clusters can only be partitioned by fields.")
+        names.append(term.name)
+    return names
+
+
+def clusters_sql(
+    queryset: QuerySet, cluster: Cluster, geom_field: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Builds the query returning one row per cluster of a queryset.
+
+    Each row has the partition fields, the ``cluster``, the ``count`` of rows,
+    the ``centroid`` of the cluster as WKB and its extent (``xmin``, ``ymin``,
+    ``xmax`` and ``ymax``). Rows left out of every cluster by a window function,
+    such as the noise of ``ST_ClusterDBSCAN``, get a row of their own with a NULL
+    ``cluster``.
+
+    :param queryset: The rows to cluster. Filters are kept.
+    :param cluster: The size of the cells of a grid, in projected units, to bucket
+        the rows by the cell of their centroid with ``ST_SnapToGrid``. The cluster is
+        then the snapped centroid as WKB. Otherwise, a cluster window function such as
+        :class:`ST_ClusterDBSCAN` or :class:`ST_ClusterKMeans`, whose partitions
+        are kept in the result.
+    :param geom_field: The geometry field. The first one of the model by default.
+    :return: The SQL and the values to bind.
+    """
+    field = get_geometry_field(queryset.model, geom_field)
+    geom = f'"{field.model_field_name}"'
+    partition = _partition(cluster)
+    group_by = [f'"{name}"' for name in partition]
+    selected = [*partition, field.model_field_name, CLUSTER]
+    if isinstance(cluster, ClusterWindowFunction):
+        key, cluster_column = cluster, f'"{CLUSTER}"'
+        # Grouping NULL clusters by the primary key keeps their rows apart
+        pk = queryset.model._meta.pk_attr
+        selected.append(pk)
+        group_by.append(f'CASE WHEN "{CLUSTER}" IS NULL THEN "{pk}" END')
+    else:
+        column = PyPikaField(field.source_field or field.model_field_name)
+        key = ST_SnapToGrid(ST_Centroid(column), cluster)
+        cluster_column = f'ST_AsBinary("{CLUSTER}") "{CLUSTER}"'
+
+    rows = queryset.annotate(**{CLUSTER: key}).values(*selected)
+    rows_sql, values = parameterize_sql(rows.sql)
+    columns = [
+        *(f'"{name}"' for name in partition),
+        cluster_column,
+        'COUNT(*) "count"',
+        f'ST_AsBinary(ST_Centroid(ST_Collect({geom}))) "centroid"',
+        *(f'{func}(ST_Extent({geom})) "{name}"' for name, func in EXTENT.items()),
+    ]
+    group_by.insert(len(partition), f'"{CLUSTER}"')
+    sql = (
+        f'SELECT {",".join(columns)} FROM ({rows_sql}) "rows" '
+        f'GROUP BY {",".join(group_by)}'
+    )
+    return sql, values
+
+
+async def fetch_clusters(
+    queryset: QuerySet, cluster: Cluster, geom_field: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Returns one row per cluster of a queryset, with its centroid as a Shapely point.
+
+    Grid cells are returned with their snapped centroid as the ``cluster``.
+    ``ST_ClusterDBSCAN`` rows that do not belong to any cluster are returned one
+    by one, with a ``None`` cluster and a ``count`` of 1. See :func:`clusters_sql` for the parameters.
+    """
+    sql, values = clusters_sql(queryset, cluster, geom_field)
+    # The queryset is never run itself, so its connection may not be chosen yet
+    _, rows = await queryset._choose_db().execute_query(sql, values)
+    rows = [dict(row) for row in rows]
+    centroids = shapely.from_wkb([row["centroid"] for row in rows])
+    for row, centroid in zip(rows, centroids):
+        row["centroid"] = centroid
+    if not isinstance(cluster, ClusterWindowFunction):
+        cells = shapely.from_wkb([row[CLUSTER] for row in rows])
+        for row, cell in zip(rows, cells):
+            row[CLUSTER] = cell
+    return rows
@@ -0,0 +1,164 @@
+"""
+Binary codecs to exchange geometries with PostGIS as (E)WKB.
+
+By default asyncpg has no codec for the ``geometry`` type, so PostGIS sends every
+value as hex-encoded EWKB text, which is twice the size of the binary payload and
+has to be validated and unhexed in Python before Shapely can parse it.
+
+Registering :func:`register_geometry_codec` on every connection of the pool makes
+asyncpg use the binary protocol for ``geometry`` columns and decode them straight
+to Shapely geometries. With Tortoise, pass it as the asyncpg ``init`` callback::
+
+    TORTOISE_ORM = {
+        "connections": {
+            "default": {
+                "engine": "tortoise.backends.asyncpg",
+                "credentials": {..., "init": register_geometry_codec},
+            }
+        },
+        ...
+    }
+"""
+import re
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import shapely
+import shapely.wkb
+from shapely.errors import ShapelyError
+from shapely.geometry.base import BaseGeometry
+from tortoise.exceptions import FieldError, OperationalError
+
+from .instrumentation import DECODE, ENCODE, input_size, instrumented, output_size
+
+GEOMETRY_TYPE = "geometry"
+HEX_WKB_PREFIXES = ("00", "01")
+BOX2D_RE = re.compile(r"BOX\(([^ ]+) ([^,]+),([^ ]+) ([^)]+)\)")
+
+
+@instrumented(ENCODE, output_size)
+def encode_geometry(value: Union[BaseGeometry, bytes, str]) -> bytes:
+    """
+    Encode a value as EWKB for the binary ``geometry`` codec.
+
+    Accepts Shapely geometries, (E)WKB bytes and hex-encoded (E)WKB strings,
+    which is what :meth:`GeometryField.to_db_value` produces.
+    """
+    if isinstance(value, BaseGeometry):
+        return shapely.wkb.dumps(value, srid=shapely.get_srid(value) or None)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, str):
+        return bytes.fromhex(value)
+    raise FieldError(
+        f'Invalid type: "{type(value)}", expected a geometry, bytes or str.'
+    )
+
+
+@instrumented(DECODE, input_size)
+def decode_geometry(data: Union[bytes, bytearray, memoryview]) -> BaseGeometry:
+    """Decode the EWKB payload sent by PostGIS into a Shapely geometry."""
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    return shapely.wkb.loads(data)
+
+
+async def register_geometry_codec(connection: Any, schema: str = "public") -> None:
+    """
+    Register the binary ``geometry`` codec on an asyncpg connection.
+
+    :param connection: The asyncpg connection.
+    :param schema: The schema where the PostGIS extension is installed.
+    """
+    await connection.set_type_codec(
+        GEOMETRY_TYPE,
+        encoder=encode_geometry,
+        decoder=decode_geometry,
+        schema=schema,
+        format="binary",
+    )
+
+
+@instrumented(ENCODE, output_size)
+def encode_geometries(
+    values: Sequence[Union[BaseGeometry, str, None]],
+    srid: Optional[int] = None,
+    hex: bool = True,
+    grid_size: Optional[float] = None,
+) -> List[Optional[Union[str, bytes]]]:
+    """
+    Encode a whole column of geometries as hex EWKB in a single vectorized call.
+
+    Produces the same output as calling :meth:`GeometryField.to_db_value` on each
+    value, but GEOS is only entered once per column instead of once per row.
+
+    :param values: Shapely geometries, WKT strings or ``None``.
+    :param srid: The (optional) SRID to embed in every value.
+    :param hex: Encodes as hex strings. When False, as EWKB bytes for the binary codec.
+    :param grid_size: The (optional) grid size to round the coordinates to.
+    """
+    geoms = np.empty(len(values), dtype=object)
+    geoms[:] = values
+    is_text = np.fromiter((isinstance(v, str) for v in values), bool, len(values))
+    if is_text.any():
+        try:
+            geoms[is_text] = shapely.from_wkt(geoms[is_text])
+        except ShapelyError:
+            raise FieldError(
+                "The value to be saved must be a Shapely geometry or a WKT geometry."
+            )
+    if not shapely.is_valid_input(geoms).all():
+        raise FieldError(
+            "The value to be saved must be a Shapely geometry or a WKT geometry."
+        )
+    if grid_size:
+        geoms = shapely.set_precision(geoms, grid_size)
+    if srid:
+        return shapely.to_wkb(
+            shapely.set_srid(geoms, srid), hex=hex, include_srid=True
+        ).tolist()
+    return shapely.to_wkb(geoms, hex=hex).tolist()
+
+
+@instrumented(DECODE, input_size)
+def decode_geometries(
+    values: Sequence[Union[bytes, bytearray, memoryview, str, BaseGeometry, None]]
+) -> List[Optional[BaseGeometry]]:
+    """
+    Decode a whole column of database values in a single vectorized call per format.
+
+    Accepts what :meth:`GeometryField.to_python_value` does: (E)WKB bytes, hex (E)WKB
+    and WKT strings, geometries already decoded by the binary codec and ``None``.
+    """
+    data = np.empty(len(values), dtype=object)
+    try:
+        # GEOS hex parsing is much slower than unhexlifying in C first
+        data[:] = [
+            bytes(value)
+            if isinstance(value, (bytearray, memoryview))
+            else bytes.fromhex(value)
+            if isinstance(value, str) and value[:2] in HEX_WKB_PREFIXES
+            else value
+            for value in values
+        ]
+        is_wkt = np.fromiter((isinstance(v, str) for v in data), bool, len(data))
+        is_wkb = np.fromiter((isinstance(v, bytes) for v in data), bool, len(data))
+        data[is_wkb] = shapely.from_wkb(data[is_wkb])
+        data[is_wkt] = shapely.from_wkt(data[is_wkt])
+    except (ValueError, ShapelyError, TypeError) as exc:
+        raise OperationalError("Could not parse the provided data.") from exc
+    return data.tolist()
+
+
+def parse_box2d(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Parse the text of a PostGIS ``box2d``, such as the result of ``ST_Extent``.
+
+    :return: The ``(xmin, ymin, xmax, ymax)`` bounds, or ``None`` for empty groups.
+    """
+    if value is None:
+        return None
+    match = BOX2D_RE.fullmatch(value)
+    if match is None:
+        raise OperationalError(f'Could not parse the box "{value}".')
+    return tuple(float(bound) for bound in match.groups())
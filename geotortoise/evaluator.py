@@ -0,0 +1,152 @@
+"""
+Local evaluation of the geotortoise functions with Shapely vectorized operations.
+
+The same expression objects used to filter querysets can be applied to rows that
+are already in memory, either model instances or arrays of Shapely geometries::
+
+    function = ST_Contains(poly=point)
+
+    regions = await Region.filter(function)
+    regions = local_filter(regions, function, ST_Intersects(poly=other))
+
+Fields are looked up in the data by name. Every function is evaluated for all
+the rows in a single Shapely call, following the PostGIS semantics: for instance,
+``ST_Equals`` tests topological equality, not the equality of the coordinates.
+"""
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Type, Union
+
+import numpy as np
+import shapely
+from pypika import Field as PyPikaField
+from pypika.terms import ValueWrapper
+
+from ._base_functions import Function, ValueParameter
+from .exceptions import LocalEvaluationError
+from .functions import (
+    BBoxIntersects,
+    ComparesGeometryLike,
+    GeomFromText,
+    GeomFromWKB,
+    KNNDistance,
+    ST_ClosestPoint,
+    ST_Contains,
+    ST_Difference,
+    ST_Disjoint,
+    ST_Distance,
+    ST_DWithin,
+    ST_Equals,
+    ST_Intersection,
+    ST_Intersects,
+    ST_Overlaps,
+    ST_Touches,
+    ST_Union,
+    ST_Within,
+)
+
+Data = Union[Sequence[Any], np.ndarray, Mapping[str, np.ndarray]]
+
+
+def _bbox_intersects(g1: np.ndarray, g2: np.ndarray) -> np.ndarray:
+    b1, b2 = shapely.bounds(g1), shapely.bounds(g2)
+    return (
+        (b1[..., 0] <= b2[..., 2])
+        & (b2[..., 0] <= b1[..., 2])
+        & (b1[..., 1] <= b2[..., 3])
+        & (b2[..., 1] <= b1[..., 3])
+    )
+
+
+def _closest_point(g1: np.ndarray, g2: np.ndarray) -> np.ndarray:
+    return shapely.get_point(shapely.shortest_line(g1, g2), 0)
+
+
+# The Shapely equivalent of each function, taking the arguments in the same order
+SHAPELY_FUNCTIONS: Dict[Type[ComparesGeometryLike], Callable[..., np.ndarray]] = {
+    ST_Equals: shapely.equals,
+    ST_Disjoint: shapely.disjoint,
+    ST_Touches: shapely.touches,
+    ST_Within: shapely.within,
+    ST_Overlaps: shapely.overlaps,
+    ST_Intersects: shapely.intersects,
+    ST_Contains: shapely.contains,
+    ST_Distance: shapely.distance,
+    ST_Intersection: shapely.intersection,
+    ST_Difference: shapely.difference,
+    ST_Union: shapely.union,
+    ST_ClosestPoint: _closest_point,
+    ST_DWithin: shapely.dwithin,
+    BBoxIntersects: _bbox_intersects,
+    KNNDistance: shapely.distance,
+}
+
+
+def _column(data: Data, name: str) -> np.ndarray:
+    if isinstance(data, np.ndarray):
+        return data
+    if isinstance(data, Mapping):
+        return np.asarray(data[name])
+    column = np.empty(len(data), dtype=object)
+    column[:] = [getattr(row, name) for row in data]
+    return column
+
+
+def _length(data: Data) -> int:
+    if isinstance(data, Mapping):
+        return len(next(iter(data.values()), ()))
+    return len(data)
+
+
+def _argument(arg: Any, data: Data) -> Any:
+    if isinstance(arg, PyPikaField):
+        return _column(data, arg.name)
+    if isinstance(arg, GeomFromWKB):
+        return shapely.from_wkb(arg.args[0].value)
+    if isinstance(arg, GeomFromText):
+        return shapely.from_wkt(arg.args[0].value)
+    if isinstance(arg, (ValueParameter, ValueWrapper)):
+        return arg.value
+    raise LocalEvaluationError(f"Cannot evaluate {arg} locally.")
+
+
+def evaluate(function: Function, data: Data) -> np.ndarray:
+    """
+    Evaluates a function for every row of the data.
+
+    :param function: A function comparing geometries, e.g. ``ST_Within(point=area)``.
+    :param data: Model instances, an array of Shapely geometries which every field
+        refers to, or a mapping from field names to arrays.
+    :return: An array with the result of every row: booleans for predicates,
+        floats for distances and geometries for the rest.
+    """
+    try:
+        shapely_function = SHAPELY_FUNCTIONS[type(function)]
+    except KeyError:
+        raise LocalEvaluationError(
+            f"{type(function).__name__} cannot be evaluated locally."
+        )
+    if isinstance(function, ST_Union) and function.aggregate:
+        raise LocalEvaluationError("Aggregates cannot be evaluated locally.")
+    if isinstance(function, ST_DWithin) and function.geography:
+        raise LocalEvaluationError(
+            "The geography variant of ST_DWithin cannot be evaluated locally."
+        )
+
+    args = [_argument(arg, data) for arg in function.args]
+    result = shapely_function(*args)
+    # Functions of two constant geometries are the same for every row
+    if np.ndim(result) == 0:
+        result = np.full(_length(data), result, dtype=np.asarray(result).dtype)
+    return result
+
+
+def local_filter(data: Sequence[Any], *functions: Function) -> List[Any]:
+    """
+    Returns the rows matching every predicate, keeping their order.
+
+    :param data: Model instances, or an array of Shapely geometries.
+    :param functions: The predicates, such as :class:`ST_Contains`.
+    """
+    mask = np.ones(len(data), dtype=bool)
+    for function in functions:
+        mask &= evaluate(function, data).astype(bool)
+    return [data[i] for i in np.flatnonzero(mask)]
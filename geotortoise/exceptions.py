@@ -1,2 +1,6 @@
 class InvalidCoordinateError(Exception):
     pass
+
+
+class LocalEvaluationError(Exception):
+    pass
@@ -1,15 +1,60 @@
-from typing import Any, Type, Union
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Type, Union
 
+import numpy as np
+import shapely
 import shapely.wkb
 import shapely.wkt
+from pypika import Field as PyPikaField
+from pypika.terms import Term
 from shapely.errors import ShapelyError
 from shapely.geometry import Point, Polygon
 from shapely.geometry.base import BaseGeometry
 from tortoise import ConfigurationError, Model
+from tortoise.contrib.postgres.indexes import BrinIndex, GistIndex, SpGistIndex
 from tortoise.exceptions import FieldError, OperationalError
-from tortoise.fields import Field
+from tortoise.fields import CharField, Field
+from tortoise.indexes import Index
+
+from .cells import MAX_PRECISION, geohashes
+from .codecs import HEX_WKB_PREFIXES, encode_geometries
+from .functions import ST_ReducePrecision
+from .instrumentation import (
+    DECODE,
+    ENCODE,
+    input_size,
+    instrumentation,
+    measure,
+    output_size,
+)
+
+SPATIAL_INDEX_TYPES = {"gist": GistIndex, "spgist": SpGistIndex, "brin": BrinIndex}
+# Instance attribute holding the values encoded in bulk by :meth:`GeometryField.to_db_values`
+ENCODED_GEOMETRIES_ATTR = "_encoded_geometries"
+
+
+class RawGeometry:
+    """
+    Raw database value of a lazy geometry column, decoded on first access.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Union[bytes, str]) -> None:
+        self.data = data
 
-from .functions import AsText
+
+def pop_encoded(instance: Union[Type[Model], Model], name: str) -> Tuple[Any, Any]:
+    """
+    Pops the ``(value, encoded)`` pair held in bulk for a field of an instance, so
+    that it is only written once. Returns ``(None, None)`` when there is none.
+    """
+    encoded = getattr(instance, ENCODED_GEOMETRIES_ATTR, None)
+    if not encoded:
+        return None, None
+    pair = encoded.pop(name, (None, None))
+    if not encoded:
+        del instance.__dict__[ENCODED_GEOMETRIES_ATTR]
+    return pair
 
 
 class GeometryField(Field):
@@ -41,10 +86,61 @@ class GeometryField(Field):
         the values belong to the application.
     :type srid: int
 
+    :param grid_size: Defines the precision of the coordinates, as the size of the
+        grid they are rounded to, in spatial ref units. For instance, ``1e-6`` degrees
+        is about 0.1 m at the equator. Values are reduced with ``shapely.set_precision``
+        when written, and with *ST_ReducePrecision* when read, which needs PostGIS 3.1.
+        Reads of models inheriting from :class:`geotortoise.models.GeometryModel`
+        are reduced, as well as those of :func:`geotortoise.queryset.fetch_parameterized`,
+        :func:`geotortoise.queryset.stream` and :func:`geotortoise.queryset.fetch_columns`.
+        WKB keeps 8 bytes per coordinate: the reduction shrinks WKT and GeoJSON,
+        and makes WKB compress better.
+        The default is None, which keeps the full precision.
+    :type grid_size: float
+
     :param spatial_index: Defines whether the column will have a Spatial Index.
-        This index is created by defining an index using *GIST* on the column.
+        The index is added to the model indexes, so it is created by
+        ``generate_schemas`` and by aerich migrations.
         The default is True.
     :type spatial_index: bool
+
+    :param index_type: Defines the access method of the Spatial Index.
+        *gist* suits most workloads, *spgist* can be faster for points and
+        non-overlapping geometries, and *brin* is a tiny index for append-only tables
+        whose rows are inserted in spatial order, such as GPS tracks.
+        The default is "gist".
+    :type index_type: str
+
+    :param binary: Defines whether the geometry is read as binary WKB instead of
+        hex EWKB text. The column is selected with *ST_AsBinary*, halving the
+        transfer, and values are decoded straight to Shapely.
+        Only applies to the querysets of models inheriting from
+        :class:`geotortoise.models.GeometryModel`, and to
+        :func:`geotortoise.queryset.fetch_parameterized` and
+        :func:`geotortoise.queryset.stream`. Other querysets select the raw column:
+        to exchange it in binary too, register
+        :func:`geotortoise.codecs.register_geometry_codec` on the connection.
+        The default is False.
+    :type binary: bool
+
+    :param lazy: Defines whether the geometry is decoded on first access.
+        Instances keep the raw value sent by the database and only parse it to
+        Shapely the first time the attribute is read, caching the result.
+        Only applies to models inheriting from :class:`geotortoise.models.GeometryModel`.
+        The default is False.
+    :type lazy: bool
+
+    :param cells: Defines geohash cell keys of the geometry, by name and precision,
+        from 1 to 12 characters. Each one is stored in its own indexed
+        ``<field>_<name>`` column, derived from the point, or from the centroid of
+        other geometries, whenever the geometry is written. The keys can be grouped
+        or sharded. The keys of points can also be used as a B-tree prefilter with
+        :func:`geotortoise.queryset.bbox_prefilter` and
+        :func:`geotortoise.queryset.radius_prefilter`: other geometries can reach
+        into a cell from the cell of their centroid. They assume (longitude,
+        latitude) coordinates.
+        Only applies to models inheriting from :class:`geotortoise.models.GeometryModel`.
+    :type cells: dict
     """
 
     SQL_TYPE: str = "GEOMETRY"
@@ -52,18 +148,78 @@ class GeometryField(Field):
     def __init__(
         self,
         srid: int = None,
+        binary: bool = False,
+        lazy: bool = False,
+        grid_size: Optional[float] = None,
+        cells: Optional[Mapping[str, int]] = None,
+        spatial_index: bool = True,
+        index_type: str = "gist",
         **kwargs: Any,
     ) -> None:
         self.srid = srid
+        self.binary = binary
+        self.lazy = lazy
+        self.grid_size = grid_size
+        self.cells = dict(cells or {})
+        self.spatial_index = spatial_index
+        self.index_type = index_type
         index = kwargs.pop("index", None)
-        # TODO: Improve error about not support index=True
         if index is not None:
             raise AttributeError(
-                "Create index using index=True is not supported. Set indexes inside `class Meta:`"
+                "Create index using index=True is not supported. "
+                "Use spatial_index and index_type, or set indexes inside `class Meta:`"
+            )
+        if index_type not in SPATIAL_INDEX_TYPES:
+            raise ConfigurationError(
+                f'Invalid index_type "{index_type}", '
+                f"expected one of {', '.join(SPATIAL_INDEX_TYPES)}."
             )
+        for cell, precision in self.cells.items():
+            if not 1 <= precision <= MAX_PRECISION:
+                raise ConfigurationError(
+                    f'Invalid precision {precision} of the cell "{cell}", '
+                    f"expected a value between 1 and {MAX_PRECISION}."
+                )
 
         super().__init__(**kwargs)
 
+    @property
+    def model(self) -> Type[Model]:
+        return self._model
+
+    @model.setter
+    def model(self, model: Type[Model]) -> None:
+        # Tortoise binds the field to its model once the class is created,
+        # which is the first moment the Spatial Index can be declared on the model.
+        self._model = model
+        if model is not None and self.spatial_index and self.model_field_name:
+            index = self.get_spatial_index()
+            if not any(
+                isinstance(i, Index) and i.fields == index.fields
+                for i in model._meta.indexes
+            ):
+                model._meta.indexes = (*model._meta.indexes, index)
+
+    def get_spatial_index(self) -> Index:
+        """Returns the Spatial Index of the column."""
+        column = self.source_field or self.model_field_name
+        return SPATIAL_INDEX_TYPES[self.index_type](fields=(column,))
+
+    def get_cell_field_name(self, cell: str) -> str:
+        """Returns the name of the field holding a cell key of the geometry."""
+        if cell not in self.cells:
+            raise FieldError(f'"{cell}" is not a cell of {self.model_field_name}.')
+        return f"{self.model_field_name}_{cell}"
+
+    def get_cell_fields(self) -> Dict[str, "GeohashField"]:
+        """Returns the fields of the cell keys, by name."""
+        return {
+            self.get_cell_field_name(cell): GeohashField(
+                source=self.model_field_name, precision=precision
+            )
+            for cell, precision in self.cells.items()
+        }
+
     def to_db_value(
         self,
         value: BaseGeometry,
@@ -72,6 +228,16 @@ class GeometryField(Field):
         if value is None:
             return value
 
+        hex_wkb = self.pop_encoded_value(value, instance)
+        if hex_wkb is not None:
+            return hex_wkb
+
+        if instrumentation.enabled:
+            name = "GeometryField.to_db_value"
+            return measure(ENCODE, name, output_size, self._encode, value)
+        return self._encode(value)
+
+    def _encode(self, value: Union[BaseGeometry, str]) -> str:
         if not isinstance(value, BaseGeometry):
             try:
                 value = shapely.wkt.loads(value)
@@ -80,27 +246,57 @@ class GeometryField(Field):
                     "The value to be saved must be a Shapely geometry or a WKT geometry."
                 )
 
+        if self.grid_size:
+            value = shapely.set_precision(value, self.grid_size)
         return shapely.wkb.dumps(value, hex=True, srid=self.srid)
 
+    def pop_encoded_value(
+        self, value: Any, instance: Union[Type[Model], Model]
+    ) -> Optional[str]:
+        """
+        Returns the value encoded by :meth:`to_db_values` for an instance, if any.
+        It is only used once.
+        """
+        geom, hex_wkb = pop_encoded(instance, self.model_field_name)
+        return hex_wkb if geom is value else None
+
+    def to_db_values(
+        self, values: Sequence[Union[BaseGeometry, str, None]]
+    ) -> List[Optional[str]]:
+        """
+        Vectorized :meth:`to_db_value` encoding a whole column in a single call.
+
+        :param values: Shapely geometries, WKT strings or ``None``.
+        """
+        return encode_geometries(values, self.srid, grid_size=self.grid_size)
+
     def to_python_value(self, value: Any) -> BaseGeometry:
-        if value is None or isinstance(value, BaseGeometry):
+        if value is None or isinstance(value, (BaseGeometry, RawGeometry)):
             return value
 
-        if not isinstance(value, (bytes, str)):
+        if not isinstance(value, (bytes, bytearray, memoryview, str)):
             raise FieldError(f'Invalid type: "{type(value)}", expected "bytes or str".')
+        if instrumentation.enabled:
+            name = "GeometryField.to_python_value"
+            return measure(DECODE, name, input_size, self._decode, value)
+        return self._decode(value)
 
-        if isinstance(value, bytes):
+    def _decode(self, value: Union[bytes, bytearray, memoryview, str]) -> BaseGeometry:
+        if not isinstance(value, str):
             try:
-                return shapely.wkb.loads(value)
+                return shapely.wkb.loads(bytes(value))
             except ShapelyError as exc:
                 raise OperationalError("Could not parse the provided data.") from exc
 
         exc_hex = None
-        try:
-            int(value, 16)  # Prevents "ParseException: Invalid HEX char."
-            return shapely.wkb.loads(value, hex=True)
-        except (ValueError, ShapelyError) as exc:
-            exc_hex = exc
+        # Hex (E)WKB always starts with the byte order mark, while WKT starts with
+        # the geometry type name, so there is no need to validate the whole string.
+        if value[:2] in HEX_WKB_PREFIXES:
+            try:
+                # GEOS hex parsing is much slower than unhexlifying in C first
+                return shapely.wkb.loads(bytes.fromhex(value))
+            except (ValueError, ShapelyError) as exc:
+                exc_hex = exc
 
         try:
             return shapely.wkt.loads(value)
@@ -113,13 +309,36 @@ class GeometryField(Field):
     def get_sql(self, quote_char="", *args, **kwargs):
         return quote_char + self.model_field_name + quote_char
 
-    def get_select(self, capabilities, table):
-        try:
-            return AsText(super().get_select(capabilities, table)).as_(
-                self.model_field_name
-            )
-        except KeyError:
-            raise ConfigurationError("Dialect does not support geospatial data!")
+    def get_select_term(self, column: Optional[Term] = None) -> Term:
+        """
+        Returns the column to select, with its precision reduced to the grid size.
+
+        :param column: The column term. The column of the field by default.
+        """
+        if column is None:
+            column = PyPikaField(self.source_field or self.model_field_name)
+        if self.grid_size:
+            return ST_ReducePrecision(column, self.grid_size)
+        return column
+
+
+def get_geometry_field(model: Type[Model], name: Optional[str] = None) -> GeometryField:
+    """
+    Returns a geometry field of a model.
+
+    :param model: The model.
+    :param name: The name of the field. The first geometry field by default.
+    """
+    fields_map = model._meta.fields_map
+    if name is None:
+        for field in fields_map.values():
+            if isinstance(field, GeometryField):
+                return field
+        raise FieldError(f"{model.__name__} has no geometry field.")
+    field = fields_map.get(name)
+    if not isinstance(field, GeometryField):
+        raise FieldError(f'"{name}" is not a geometry field of {model.__name__}.')
+    return field
 
 
 class PointField(GeometryField):
@@ -142,10 +361,145 @@ class PolygonField(GeometryField):
 
     This field is used to save a polygon. It takes at least three points to create
     a polygon. The polygon can have one shell and one or more holes inside the shell.
+
+    :param resolutions: Defines simplified copies of the polygon, by name and
+        tolerance, in spatial ref units. Each one is stored in its own
+        ``<field>_<name>`` column, simplified like *ST_SimplifyPreserveTopology*
+        whenever the polygon is written, and can be selected instead of the full
+        polygon with :func:`geotortoise.queryset.select_resolution`.
+        Only applies to models inheriting from :class:`geotortoise.models.GeometryModel`.
+    :type resolutions: dict
     """
 
     field_type = Polygon
 
+    def __init__(
+        self, resolutions: Optional[Mapping[str, float]] = None, **kwargs: Any
+    ) -> None:
+        self.resolutions = dict(resolutions or {})
+        super().__init__(**kwargs)
+
     @property
     def SQL_TYPE(self) -> str:
         return f"GEOMETRY(POLYGON,{self.srid})" if self.srid else "GEOMETRY(POLYGON)"
+
+    def get_resolution_field_name(self, resolution: str) -> str:
+        """Returns the name of the field holding a resolution of the polygon."""
+        if resolution not in self.resolutions:
+            raise FieldError(
+                f'"{resolution}" is not a resolution of {self.model_field_name}.'
+            )
+        return f"{self.model_field_name}_{resolution}"
+
+    def get_resolution_fields(self) -> Dict[str, "SimplifiedPolygonField"]:
+        """Returns the fields of the resolutions, by name."""
+        return {
+            self.get_resolution_field_name(resolution): SimplifiedPolygonField(
+                source=self.model_field_name,
+                tolerance=tolerance,
+                srid=self.srid,
+                binary=self.binary,
+                lazy=self.lazy,
+                grid_size=self.grid_size,
+            )
+            for resolution, tolerance in self.resolutions.items()
+        }
+
+
+class SimplifiedPolygonField(PolygonField):
+    """
+    Simplified copy of another polygon of the model, derived on write.
+
+    Declared through the ``resolutions`` of :class:`PolygonField`.
+    The copy has no Spatial Index by default.
+
+    :param source: The name of the field with the full polygon.
+    :param tolerance: The simplification tolerance, in spatial ref units.
+    """
+
+    def __init__(self, source: str, tolerance: float, **kwargs: Any) -> None:
+        self.source = source
+        self.tolerance = tolerance
+        kwargs.setdefault("spatial_index", False)
+        kwargs.setdefault("null", True)
+        super().__init__(**kwargs)
+
+    def simplify(self, values: Sequence[Union[BaseGeometry, str, None]]) -> List[Any]:
+        """
+        Simplifies a whole column of source polygons in a single vectorized call.
+
+        :param values: Shapely geometries, WKT strings or ``None``.
+        """
+        geoms = np.empty(len(values), dtype=object)
+        geoms[:] = [
+            shapely.wkt.loads(value) if isinstance(value, str) else value
+            for value in values
+        ]
+        return shapely.simplify(geoms, self.tolerance, preserve_topology=True).tolist()
+
+    def to_db_value(
+        self,
+        value: BaseGeometry,
+        instance: Union[Type[Model], Model],
+    ) -> str:
+        if isinstance(instance, Model):
+            hex_wkb = self.pop_encoded_value(value, instance)
+            if value is not None and hex_wkb is not None:
+                return hex_wkb
+            # Derive it again, the source may have changed since it was loaded
+            (value,) = self.simplify([getattr(instance, self.source)])
+            setattr(instance, self.model_field_name, value)
+        return super().to_db_value(value, instance)
+
+
+class GeohashField(CharField):
+    """
+    Geohash cell key of another geometry of the model, derived on write.
+
+    Declared through the ``cells`` of :class:`GeometryField`.
+    The key has a B-tree index.
+
+    :param source: The name of the field with the geometry.
+    :param precision: The length of the geohash.
+    """
+
+    def __init__(self, source: str, precision: int, **kwargs: Any) -> None:
+        self.source = source
+        self.precision = precision
+        kwargs.setdefault("index", True)
+        kwargs.setdefault("null", True)
+        super().__init__(max_length=precision, **kwargs)
+
+    def derive(self, values: Sequence[Union[BaseGeometry, str, None]]) -> List[Any]:
+        """
+        Computes the keys of a whole column of source geometries in a single
+        vectorized call, from the point or the centroid of each geometry.
+
+        :param values: Shapely geometries, WKT strings or ``None``.
+        """
+        geoms = np.empty(len(values), dtype=object)
+        geoms[:] = [
+            shapely.wkt.loads(value) if isinstance(value, str) else value
+            for value in values
+        ]
+        present = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+        points = geoms[present]
+        not_points = shapely.get_type_id(points) != shapely.GeometryType.POINT
+        points[not_points] = shapely.centroid(points[not_points])
+
+        keys: List[Any] = [None] * len(values)
+        cells = geohashes(shapely.get_x(points), shapely.get_y(points), self.precision)
+        for index, key in zip(np.flatnonzero(present), cells):
+            keys[index] = key
+        return keys
+
+    def to_db_value(self, value: Any, instance: Union[Type[Model], Model]) -> Any:
+        if isinstance(instance, Model):
+            source = getattr(instance, self.source)
+            geom, key = pop_encoded(instance, self.model_field_name)
+            if geom is not source:
+                # Derive it again, the source may have changed since it was loaded
+                (key,) = self.derive([source])
+            value = key
+            setattr(instance, self.model_field_name, value)
+        return super().to_db_value(value, instance)
@@ -1,18 +1,18 @@
 from itertools import chain
-from typing import Any, Optional, Union
+from typing import Any, Optional, Sequence, Union
 
+import shapely
 from pypika import Field as PyPikaField
+from pypika.terms import Criterion, LiteralValue, NullValue, Term
 from shapely.geometry.base import BaseGeometry
 from tortoise.fields import Field
 
-from ._base_functions import Function
+from ._base_functions import Function, ValueParameter
 
 # ====================
 # PostGIS transformation operations
 # ====================
 
-# TODO: Add GeoJSON support
-
 
 class GeomFromText(Function):
     """Generates geometry from well known text."""
@@ -24,27 +24,149 @@ class GeomFromText(Function):
         :param srid: The (optional) SRID to interpret it as..
         :param alias: The alias for the function.
         """
-        args = filter(lambda x: x is not None, (wkt, srid))
+        args = filter(lambda x: x is not None, (ValueParameter(wkt), srid))
         super().__init__("ST_GeomFromText", *args, alias=alias)
 
 
+class GeomFromWKB(Function):
+    """Generates geometry from well known binary."""
+
+    def __init__(self, wkb: bytes, srid: Optional[int] = None, alias=None):
+        """
+        Generate geometry from the given well-known binary.
+        :param wkb: The well-known binary to insert.
+        :param srid: The (optional) SRID to interpret it as..
+        :param alias: The alias for the function.
+        """
+        args = filter(lambda x: x is not None, (ValueParameter(wkb), srid))
+        super().__init__("ST_GeomFromWKB", *args, alias=alias)
+
+
 class AsText(Function):
     """PostGIS function to extract geometry as WKT"""
 
-    def __init__(self, field: Field, alias):
-        super().__init__("ST_AsText", field, alias)
+    def __init__(self, field: Field, alias=None):
+        super().__init__("ST_AsText", field, alias=alias)
+
+
+class ST_AsGeoJSON(Function):
+    """PostGIS function to extract geometry as GeoJSON"""
+
+    def __init__(
+        self,
+        geom: Union[Field, Term],
+        max_decimal_digits: Optional[int] = None,
+        geom_column: Optional[str] = None,
+        alias=None,
+    ):
+        """
+        :param geom: The geometry, or a row to encode as a GeoJSON Feature.
+        :param max_decimal_digits: The maximum number of decimal places of the
+            coordinates. PostGIS defaults to 9.
+        :param geom_column: The geometry column of the row. The rest of the columns
+            are encoded as the Feature properties.
+        """
+        if isinstance(geom, Field):
+            geom = PyPikaField(geom.model_field_name)
+        if geom_column is not None:
+            args = (
+                geom,
+                geom_column,
+                9 if max_decimal_digits is None else max_decimal_digits,
+            )
+        else:
+            args = filter(lambda x: x is not None, (geom, max_decimal_digits))
+        super().__init__("ST_AsGeoJSON", *args, alias=alias)
+
+
+class Geography(Function):
+    """PostGIS function to cast a geometry to geography"""
+
+    def __init__(self, field: Field, alias=None):
+        super().__init__("geography", field, alias=alias)
+
+
+class AsBinary(Function):
+    """PostGIS function to extract geometry as WKB"""
+
+    def __init__(self, field: Field, alias=None):
+        super().__init__("ST_AsBinary", field, alias=alias)
+
+
+class ST_Transform(Function):
+    """PostGIS function to reproject a geometry to another SRID"""
+
+    def __init__(self, geom: Term, srid: int, alias=None):
+        super().__init__("ST_Transform", geom, srid, alias=alias)
+
+
+class ST_SetSRID(Function):
+    """PostGIS function to set the SRID of a geometry without reprojecting it"""
+
+    def __init__(self, geom: Term, srid: int, alias=None):
+        super().__init__("ST_SetSRID", geom, srid, alias=alias)
+
+
+class ST_SnapToGrid(Function):
+    """PostGIS function to snap the vertices of a geometry to a regular grid"""
+
+    def __init__(
+        self,
+        geom: Term,
+        size_x: Union[float, int],
+        size_y: Optional[Union[float, int]] = None,
+        alias=None,
+    ):
+        """
+        :param geom: The geometry.
+        :param size_x: The size of the grid cells, in projected units.
+        :param size_y: The height of the cells, when they are not squared.
+        """
+        args = filter(lambda x: x is not None, (geom, size_x, size_y))
+        super().__init__("ST_SnapToGrid", *args, alias=alias)
+
+
+class ST_ReducePrecision(Function):
+    """
+    PostGIS function to round the coordinates of a geometry to a grid, keeping it
+    valid. Requires PostGIS 3.1.
+    """
+
+    def __init__(self, geom: Term, grid_size: Union[float, int], alias=None):
+        super().__init__("ST_ReducePrecision", geom, grid_size, alias=alias)
+
+
+class ST_Centroid(Function):
+    """
+    PostGIS function to calculate the geometric center of a geometry.
+
+    Of an aggregate such as :class:`ST_Collect`, it is the center of every group.
+    """
+
+    def __init__(self, geom: Term, alias=None):
+        super().__init__("ST_Centroid", geom, alias=alias)
 
 
 # ====================
 # Comparative geospatial functions
 # ====================
 
-GeometryLike = Union[BaseGeometry, "GeomFromText", Field, str]
+
+def field_term(geom: Union[str, Field, Term]) -> Term:
+    """Returns the column of a field, given by name or as a Tortoise field."""
+    if isinstance(geom, str):
+        return PyPikaField(geom)
+    if isinstance(geom, Field):
+        return PyPikaField(geom.model_field_name)
+    return geom
+
+
+GeometryLike = Union[BaseGeometry, "GeomFromText", "GeomFromWKB", Field, str]
 
 
 def convert_to_db_value(target: GeometryLike, srid=None):
     if isinstance(target, BaseGeometry):
-        return GeomFromText(target.wkt, srid)
+        return GeomFromWKB(shapely.to_wkb(target), srid)
     if isinstance(target, str):
         return GeomFromText(target, srid)
         # todo validate wkb
@@ -66,7 +188,7 @@ class ComparesGeometryLike(Function):
         g2: Optional[GeometryLike] = None,
         g1_srid=None,
         g2_srid=None,
-        **kwargs
+        **kwargs,
     ):
         """
         Accepts either two geometry-like objects, or a single key-value
@@ -80,11 +202,14 @@ class ComparesGeometryLike(Function):
         :param kwargs: An optional single key and value to filter against a field.
         """
 
+        # The field and the geometry-like of the key-value form, before conversion
+        self.lookup = None
         if g1 and g2 and not kwargs:
             g1 = convert_to_db_value(g1, g1_srid)
             g2 = convert_to_db_value(g2, g2_srid)
         elif len(kwargs) == 1:
             field, target = chain.from_iterable(kwargs.items())
+            self.lookup = (field, target)
             g1 = PyPikaField(field)
             g2 = convert_to_db_value(target, g2_srid)
         else:
@@ -125,7 +250,86 @@ class ST_Overlaps(ComparesGeometryLike):
     name = "ST_Overlaps"
 
 
-class ST_Contains(ComparesGeometryLike):
+class SubdividedCriterion(Criterion):
+    """
+    Evaluates a filter on a polygon field against its subdivided pieces.
+
+    The pieces have small bounding boxes, so the spatial index of the pieces table
+    discards most rows, and the predicate is evaluated on a few vertices only.
+    """
+
+    def __init__(
+        self,
+        function: "ComparesGeometryLike",
+        pieces_table: str,
+        parent_column: str,
+        table: str,
+        pk_column: str,
+        geom_column: str,
+        alias=None,
+    ):
+        super().__init__(alias)
+        self.function = function
+        self.pieces_table = pieces_table
+        self.parent_column = parent_column
+        self.table = table
+        self.pk_column = pk_column
+        self.geom_column = geom_column
+
+    def get_pieces_sql(self, predicate: str, **kwargs: Any) -> str:
+        target = self.function.get_arg_sql(self.function.args[1], **kwargs)
+        return (
+            f'"{self.table}"."{self.pk_column}" IN (SELECT "{self.parent_column}" '
+            f'FROM "{self.pieces_table}" '
+            f'WHERE {predicate}("{self.geom_column}",{target}))'
+        )
+
+    def get_sql(self, **kwargs: Any) -> str:
+        # A polygon intersects a geometry if any of its pieces does
+        candidates = self.get_pieces_sql("ST_Intersects", **kwargs)
+        if self.function.name == "ST_Intersects":
+            return candidates
+        # A polygon contains a geometry if any of its pieces does. Otherwise, the
+        # geometry may cross the pieces, and only then the whole polygon is evaluated.
+        contained = self.get_pieces_sql("ST_Contains", **kwargs)
+        return (
+            f"{candidates} AND CASE WHEN {contained} THEN true "
+            f"ELSE {self.function.get_function_sql(**kwargs)} END"
+        )
+
+
+class SubdividedLookup(ComparesGeometryLike):
+    """
+    The functions that use the pieces of a subdivided polygon field when filtering.
+
+    See :func:`geotortoise.subdivide.subdivision_model`.
+    """
+
+    def resolve(self, model, annotations, custom_filters=None, *args):
+        resolved = super().resolve(model, annotations, custom_filters, *args)
+        if self.lookup is None:
+            return resolved
+        field = model._meta.fields_map.get(self.lookup[0])
+        pieces = getattr(field, "subdivision_model", None)
+        if pieces is not None:
+            resolved.where_criterion = SubdividedCriterion(
+                self,
+                pieces._meta.db_table,
+                pieces._meta.fields_db_projection["parent_id"],
+                model._meta.db_table,
+                model._meta.db_pk_column,
+                pieces._meta.fields_db_projection["geom"],
+            )
+        return resolved
+
+
+class ST_Intersects(SubdividedLookup):
+    """Calculates whether the supplied GeometryLikes share any portion of space."""
+
+    name = "ST_Intersects"
+
+
+class ST_Contains(SubdividedLookup):
     """Calculates whether the first GeometryLike completely contains the 2nd."""
 
     name = "ST_Contains"
@@ -157,10 +361,34 @@ class ST_Difference(ComparesGeometryLike):
 
 
 class ST_Union(ComparesGeometryLike):
-    """Calculates the union of the two GeometryLikes."""
+    """
+    Calculates the union of the two GeometryLikes.
+
+    Given a single field instead, it is the aggregate dissolving the geometries of
+    every group of rows, like the rest of :class:`SpatialAggregate`.
+    """
 
     name = "ST_Union"
 
+    def __init__(
+        self,
+        g1: Optional[GeometryLike] = None,
+        g2: Optional[GeometryLike] = None,
+        g1_srid=None,
+        g2_srid=None,
+        **kwargs,
+    ):
+        self.aggregate = g1 is not None and g2 is None and not kwargs
+        if self.aggregate:
+            self.lookup = None
+            Function.__init__(self, self.name, field_term(g1))
+        else:
+            super().__init__(g1, g2, g1_srid, g2_srid, **kwargs)
+
+    @property
+    def is_aggregate(self) -> Optional[bool]:
+        return True if self.aggregate else super().is_aggregate
+
 
 class ST_ClosestPoint(ComparesGeometryLike):
     """Calculates the point on the first GeometryLike that is closes to the 2nd."""
@@ -168,11 +396,145 @@ class ST_ClosestPoint(ComparesGeometryLike):
     name = "ST_ClosestPoint"
 
 
+class ST_DWithin(ComparesGeometryLike):
+    """
+    Calculates whether the GeometryLikes are within the given distance of one another.
+
+    Unlike filtering on an annotated ``ST_Distance``, it can use a spatial index.
+    """
+
+    name = "ST_DWithin"
+
+    def __init__(
+        self,
+        g1: Optional[GeometryLike] = None,
+        g2: Optional[GeometryLike] = None,
+        distance: Union[float, int] = None,
+        g1_srid=None,
+        g2_srid=None,
+        geography: bool = False,
+        use_spheroid: Optional[bool] = None,
+        **kwargs,
+    ):
+        """
+        :param distance: The distance in projected units (spatial ref units), or
+            in meters for the geography variant.
+        :param geography: Compares the GeometryLikes as geographies, which must be
+            in lon/lat (EPSG:4326). To use an index, the column needs an index on
+            the ``geography(column)`` expression.
+        :param use_spheroid: Whether the geography variant measures on the spheroid
+            (the default in PostGIS) or on the faster sphere.
+        """
+        if distance is None:
+            raise TypeError("This function requires a distance.")
+        if use_spheroid is not None and not geography:
+            raise TypeError("use_spheroid is only supported by the geography variant.")
+
+        super().__init__(g1, g2, g1_srid, g2_srid, **kwargs)
+        self.distance = distance
+        self.geography = geography
+
+        if geography:
+            self.args = [Geography(arg) for arg in self.args]
+        self.args.append(self.wrap_constant(distance))
+        if use_spheroid is not None:
+            self.args.append(self.wrap_constant(use_spheroid))
+
+
+class ComparesGeometryOperator(ComparesGeometryLike):
+    """
+    The set of PostGIS operators that compare two geometry-like objects.
+    """
+
+    def get_function_sql(self, **kwargs: Any) -> str:
+        g1, g2 = (self.get_arg_sql(arg, **kwargs) for arg in self.args)
+        return f"{g1} {self.name} {g2}"
+
+
+class BBoxIntersects(ComparesGeometryOperator):
+    """Calculates whether the bounding boxes of the two GeometryLikes intersect."""
+
+    name = "&&"
+
+
+class KNNDistance(ComparesGeometryOperator):
+    """
+    Calculates the 2D distance between the two GeometryLikes with the ``<->`` operator.
+
+    When used in ``ORDER BY`` with a ``LIMIT``, PostGIS walks the spatial index in
+    distance order (KNN) instead of computing the distance of every row and sorting.
+    """
+
+    name = "<->"
+
+
+class KNNDistanceND(ComparesGeometryOperator):
+    """
+    Calculates the n-D distance between the bounding boxes of the two GeometryLikes
+    with the ``<<->>`` operator. It needs an n-D index (``gist_geometry_ops_nd``).
+    """
+
+    name = "<<->>"
+
+
 # ====================
 # Aggregate geospatial functions
 # ====================
 
 
+class SpatialAggregate(Function):
+    """
+    The set of PostGIS aggregates reducing the geometries of a group of rows to a
+    single value, so that the reduction happens in the database::
+
+        await (
+            Place.annotate(extent=ST_Extent("point"), center=ST_Centroid(ST_Collect("point")))
+            .group_by("name")
+            .values("name", "extent", "center")
+        )
+
+    Geometries are returned as sent by the database, hex EWKB unless the binary
+    codec is registered, and can be decoded with
+    :func:`geotortoise.codecs.decode_geometries`.
+    """
+
+    name = None
+    is_aggregate = True
+
+    def __init__(self, geom: Union[str, Field, Term], alias=None):
+        """
+        :param geom: The geometry field, by name or as a Tortoise field, or an
+            expression of it.
+        """
+        super().__init__(self.name, field_term(geom), alias=alias)
+
+
+class ST_Extent(SpatialAggregate):
+    """
+    Calculates the bounding box of the geometries, as a ``box2d``.
+
+    It is returned as text, e.g. ``BOX(1 2,3 4)``: parse it with
+    :func:`geotortoise.codecs.parse_box2d`.
+    """
+
+    name = "ST_Extent"
+
+
+class ST_Collect(SpatialAggregate):
+    """Collects the geometries in a single multi-geometry or collection, as is."""
+
+    name = "ST_Collect"
+
+
+class ST_MemUnion(SpatialAggregate):
+    """
+    Dissolves the geometries like the aggregate :class:`ST_Union`, using less memory
+    and more time.
+    """
+
+    name = "ST_MemUnion"
+
+
 class AggregateGeometry(Function):
     name = None
 
@@ -182,14 +544,46 @@ class AggregateGeometry(Function):
         arg1: Union[float, int] = None,
         arg2: int = None,
         g1_srid=None,
-        **kwargs
+        **kwargs,
     ):
         g1 = convert_to_db_value(g1, g1_srid)
 
         super().__init__(self.name, g1, arg1, arg2, **kwargs)
 
 
-class ST_ClusterDBSCAN(AggregateGeometry):
+class ClusterWindowFunction(AggregateGeometry):
+    """
+    The set of PostGIS window functions assigning a cluster to every row.
+
+    The rows are clustered together unless ``partition_by`` is given, in which case
+    each partition is clustered on its own.
+    """
+
+    def __init__(
+        self,
+        g1: Optional[GeometryLike] = None,
+        arg1: Union[float, int] = None,
+        arg2: Union[float, int] = None,
+        g1_srid=None,
+        partition_by: Sequence[Union[str, Field, Term]] = (),
+        **kwargs,
+    ):
+        super().__init__(g1, arg1, arg2, g1_srid, **kwargs)
+        self.args = [arg for arg in self.args if not isinstance(arg, NullValue)]
+        self.partition_by = [field_term(term) for term in partition_by]
+
+    def get_function_sql(self, **kwargs: Any) -> str:
+        special_params_sql = self.get_special_params_sql(**kwargs)
+        partition = ",".join(term.get_sql(**kwargs) for term in self.partition_by)
+        return "{name}({args}{special}) OVER({partition})".format(
+            name=self.name,
+            args=",".join(self.get_arg_sql(arg, **kwargs) for arg in self.args),
+            special=(" " + special_params_sql) if special_params_sql else "",
+            partition=f"PARTITION BY {partition}" if partition else "",
+        )
+
+
+class ST_ClusterDBSCAN(ClusterWindowFunction):
     name = "ST_ClusterDBSCAN"
 
     def __init__(
@@ -198,7 +592,8 @@ class ST_ClusterDBSCAN(AggregateGeometry):
         elements_distance: float = None,
         cluster_min_elements: int = None,
         g1_srid=None,
-        **kwargs
+        partition_by: Sequence[Union[str, Field, Term]] = (),
+        **kwargs,
     ):
         """
         elements_distance: value is in degrees related to the CRS in use.
@@ -207,18 +602,104 @@ class ST_ClusterDBSCAN(AggregateGeometry):
             - 1 degree of latitude corresponds to 111km
             - 1 degree of longitude corresponds to 73km
 
+        Rows that do not belong to any cluster get a NULL cluster.
         """
 
         super().__init__(
-            geom, elements_distance, cluster_min_elements, g1_srid, **kwargs
+            geom,
+            elements_distance,
+            cluster_min_elements,
+            g1_srid,
+            partition_by,
+            **kwargs,
         )
 
-    def get_function_sql(self, **kwargs: Any) -> str:
-        special_params_sql = self.get_special_params_sql(**kwargs)
-        # REVIEW: Currently the `OVER()` that is necessary to run ST_ClusterDBSCAN is hardcoded
-        # If needed in future we can create a Over function or request it from tortoise-orm
-        return "{name}({args}{special}) OVER()".format(
-            name=self.name,
-            args=",".join(self.get_arg_sql(arg, **kwargs) for arg in self.args),
-            special=(" " + special_params_sql) if special_params_sql else "",
+
+class ST_ClusterKMeans(ClusterWindowFunction):
+    name = "ST_ClusterKMeans"
+
+    def __init__(
+        self,
+        geom: Optional[GeometryLike] = None,
+        number_of_clusters: int = None,
+        max_radius: Optional[float] = None,
+        g1_srid=None,
+        partition_by: Sequence[Union[str, Field, Term]] = (),
+        **kwargs,
+    ):
+        """
+        number_of_clusters: the number of clusters, or less if there are fewer rows.
+        max_radius: the maximum radius of the clusters, in projected units. When set,
+        more clusters may be created to honour it. Requires PostGIS 3.2.
+        """
+
+        super().__init__(
+            geom, number_of_clusters, max_radius, g1_srid, partition_by, **kwargs
         )
+
+
+# ====================
+# Vector tile functions
+# ====================
+
+
+class ST_TileEnvelope(Function):
+    """Calculates the bounds of the z/x/y tile in Web Mercator (EPSG:3857)."""
+
+    def __init__(self, z: int, x: int, y: int, margin: float = 0, alias=None):
+        """
+        :param margin: Expands the bounds by this fraction of the tile size on every
+            side. Needs PostGIS 3.1.
+        """
+        args = [z, x, y]
+        if margin:
+            args.append(LiteralValue(f"margin=>{margin}"))
+        super().__init__("ST_TileEnvelope", *args, alias=alias)
+
+
+class ST_AsMVTGeom(Function):
+    """
+    Transforms a geometry into the coordinate space of a tile,
+    clipping it to the tile bounds.
+    """
+
+    def __init__(
+        self,
+        geom: Term,
+        bounds: Term,
+        extent: int = 4096,
+        buffer: int = 256,
+        clip_geom: bool = True,
+        alias=None,
+    ):
+        """
+        :param geom: The geometry, in the same SRID as the bounds.
+        :param bounds: The bounds of the tile, usually a :class:`ST_TileEnvelope`.
+        :param extent: The size of the tile in tile coordinate space.
+        :param buffer: The distance in tile coordinate space to keep around the bounds.
+        :param clip_geom: Whether to clip the geometry to the (buffered) bounds.
+        """
+        super().__init__(
+            "ST_AsMVTGeom", geom, bounds, extent, buffer, clip_geom, alias=alias
+        )
+
+
+class ST_AsMVT(Function):
+    """Aggregates rows into a Mapbox Vector Tile layer."""
+
+    def __init__(
+        self,
+        row: Term,
+        name: str,
+        extent: int = 4096,
+        geom_name: Optional[str] = None,
+        alias=None,
+    ):
+        """
+        :param row: The row expression with the attributes and the tile geometry.
+        :param name: The name of the layer.
+        :param extent: The size of the tile in tile coordinate space.
+        :param geom_name: The name of the geometry column of the row.
+        """
+        args = filter(lambda x: x is not None, (row, name, extent, geom_name))
+        super().__init__("ST_AsMVT", *args, alias=alias)
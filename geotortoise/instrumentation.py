@@ -0,0 +1,342 @@
+"""
+Opt-in instrumentation of the geometry hot paths.
+
+Tells where a slow spatial endpoint spends its time: encoding geometries for the
+database, decoding them back, or running the SQL of each spatial function. It is
+disabled by default, and then every hook costs a single attribute lookup::
+
+    instrumentation.enable(callback=statsd_export)
+    instrument_client(Tortoise.get_connection("default"))
+
+    regions = await Region.filter(ST_Contains(poly=point))
+    instrumentation.stats()
+    # {"decode": {"GeometryField.to_python_value": {"calls": 12, "seconds": ..., "bytes": ...}},
+    #  "sql": {"ST_Contains": {"calls": 1, "seconds": ..., "bytes": 0}}}
+
+    plan = await explain(Region.filter(ST_Contains(poly=point)))
+    plan.uses_spatial_index
+"""
+import json
+import re
+import threading
+from functools import partial, wraps
+from time import perf_counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.queryset import QuerySet
+
+from ._base_functions import parameterize_sql
+
+ENCODE = "encode"
+DECODE = "decode"
+SQL = "sql"
+# The access methods of the spatial indexes, see ``GeometryField.index_type``
+SPATIAL_ACCESS_METHODS = ("gist", "spgist", "brin")
+# PostGIS functions and the bounding box and KNN operators
+SPATIAL_FUNCTION_RE = re.compile(r"\b(ST_\w+)\(|(&&|<<->>|<->)", re.IGNORECASE)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Measurement(NamedTuple):
+    """A single instrumented call, as passed to the export callback."""
+
+    operation: str
+    name: str
+    seconds: float
+    nbytes: int
+
+
+class Counter:
+    """Accumulated calls, time and bytes of an operation."""
+
+    __slots__ = ("calls", "seconds", "nbytes")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.nbytes = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "seconds": self.seconds, "bytes": self.nbytes}
+
+
+class Instrumentation:
+    """
+    Counters of the instrumented operations, by operation and name.
+
+    The module-level :data:`instrumentation` is the one fed by every hook.
+    The counters are guarded by a lock, as geometries may be encoded and decoded
+    in worker threads.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.callback: Optional[Callable[[Measurement], None]] = None
+        self._counters: Dict[Tuple[str, str], Counter] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, callback: Optional[Callable[[Measurement], None]] = None) -> None:
+        """
+        Starts measuring.
+
+        :param callback: Called with every :class:`Measurement`, to export them to a
+            metrics backend. It runs inline with the instrumented call, so it must be cheap.
+        """
+        self.callback = callback
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops measuring, keeping the counters."""
+        self.enabled = False
+        self.callback = None
+
+    def reset(self) -> None:
+        """Clears the counters."""
+        with self._lock:
+            self._counters = {}
+
+    def record(
+        self, operation: str, name: str, seconds: float, nbytes: int = 0
+    ) -> None:
+        """Adds a measurement to the counters and exports it."""
+        with self._lock:
+            counter = self._counters.get((operation, name))
+            if counter is None:
+                counter = self._counters[operation, name] = Counter()
+            counter.calls += 1
+            counter.seconds += seconds
+            counter.nbytes += nbytes
+        if self.callback is not None:
+            self.callback(Measurement(operation, name, seconds, nbytes))
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Returns the counters by operation and name, with the ``calls``, ``seconds``
+        and ``bytes`` of each one.
+        """
+        stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._lock:
+            for (operation, name), counter in self._counters.items():
+                stats.setdefault(operation, {})[name] = counter.as_dict()
+        return stats
+
+
+instrumentation = Instrumentation()
+
+
+def _size(value: Any) -> int:
+    return len(value) if isinstance(value, (bytes, bytearray, memoryview, str)) else 0
+
+
+def measure(
+    operation: str,
+    name: str,
+    nbytes: Callable[[Sequence[Any], Any], int],
+    function: Callable[..., Any],
+    *args: Any,
+) -> Any:
+    """
+    Calls a function and records its time. Hot paths call it only when
+    ``instrumentation.enabled``, so that they do not pay for an extra call otherwise.
+
+    See :func:`instrumented` for the parameters.
+    """
+    start = perf_counter()
+    result = function(*args)
+    instrumentation.record(
+        operation, name, perf_counter() - start, nbytes(args, result)
+    )
+    return result
+
+
+def instrumented(
+    operation: str,
+    nbytes: Callable[[Sequence[Any], Any], int],
+    name: Optional[str] = None,
+) -> Callable[[F], F]:
+    """
+    Measures the calls of a function while the instrumentation is enabled.
+
+    :param operation: :data:`ENCODE` or :data:`DECODE`.
+    :param nbytes: Returns the bytes processed from the arguments and the result.
+    :param name: The name of the counter. The qualified name of the function by default.
+    """
+
+    def decorator(function: F) -> F:
+        counter_name = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            return measure(
+                operation, counter_name, nbytes, partial(function, **kwargs), *args
+            )
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def input_size(args: Sequence[Any], result: Any) -> int:
+    """Bytes of the last positional argument, or of its items, for decoders."""
+    if isinstance(args[-1], list):
+        return sum(_size(value) for value in args[-1])
+    return _size(args[-1])
+
+
+def output_size(args: Sequence[Any], result: Any) -> int:
+    """Bytes of the result, or of every item of a list result, for encoders."""
+    if isinstance(result, list):
+        return sum(_size(value) for value in result)
+    return _size(result)
+
+
+def spatial_functions(sql: str) -> List[str]:
+    """Returns the spatial functions and operators of a statement, in order."""
+    names = []
+    for function, operator in SPATIAL_FUNCTION_RE.findall(sql):
+        name = function or operator
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def instrument_client(client: BaseDBAsyncClient) -> BaseDBAsyncClient:
+    """
+    Measures the statements run by a Tortoise connection, by spatial function.
+
+    The time of each statement, including the transfer and decoding of its rows by
+    the driver, is added to every spatial function it uses. Statements without spatial
+    functions are not measured. The client is patched in place, once; transactions
+    open their own client, which has to be instrumented separately.
+
+    :param client: The connection, e.g. ``Tortoise.get_connection("default")``.
+    :return: The same client.
+    """
+    if getattr(client, "_geotortoise_instrumented", False):
+        return client
+
+    def timed(execute: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(execute)
+        async def wrapper(query: str, *args: Any, **kwargs: Any) -> Any:
+            if not instrumentation.enabled:
+                return await execute(query, *args, **kwargs)
+            names = spatial_functions(query)
+            if not names:
+                return await execute(query, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return await execute(query, *args, **kwargs)
+            finally:
+                seconds = perf_counter() - start
+                for name in names:
+                    instrumentation.record(SQL, name, seconds)
+
+        return wrapper
+
+    client.execute_query = timed(client.execute_query)  # type: ignore
+    client.execute_query_dict = timed(client.execute_query_dict)  # type: ignore
+    client._geotortoise_instrumented = True  # type: ignore
+    return client
+
+
+class IndexScan(NamedTuple):
+    """An index read by a query plan."""
+
+    index: str
+    access_method: str
+    relation: Optional[str]
+    condition: Optional[str]
+
+
+class QueryPlan(NamedTuple):
+    """The plan of a query, as reported by :func:`explain`."""
+
+    plan: Dict[str, Any]
+    functions: List[str]
+    index_scans: List[IndexScan]
+    seq_scans: List[str]
+
+    @property
+    def spatial_index_scans(self) -> List[IndexScan]:
+        """The scans of GiST, SP-GiST or BRIN indexes."""
+        return [
+            scan
+            for scan in self.index_scans
+            if scan.access_method in SPATIAL_ACCESS_METHODS
+        ]
+
+    @property
+    def uses_spatial_index(self) -> bool:
+        """Whether the spatial filters are assisted by a spatial index."""
+        return bool(self.spatial_index_scans)
+
+
+def _nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _nodes(child)
+
+
+async def explain(
+    queryset: QuerySet,
+    analyze: bool = False,
+    using_db: Optional[BaseDBAsyncClient] = None,
+) -> QueryPlan:
+    """
+    Returns the plan of a queryset, with the indexes it reads and their access
+    method, to check whether its spatial filters, such as :class:`ST_Contains`,
+    use a spatial index or scan the whole table.
+
+    :param queryset: The queryset. Same restrictions as
+        :func:`geotortoise.queryset.fetch_parameterized`.
+    :param analyze: Runs the query, adding the actual times and rows to the plan.
+    :param using_db: The connection to use. The one of the queryset by default.
+    """
+    sql, values = parameterize_sql(queryset.sql)
+    db = using_db or queryset._db
+    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+    _, rows = await db.execute_query(f"EXPLAIN ({options}) {sql}", values)
+    document = rows[0][0]
+    if isinstance(document, str):
+        document = json.loads(document)
+    plan = document[0]["Plan"]
+
+    nodes = [node for node in _nodes(plan) if node.get("Index Name")]
+    methods = {}
+    if nodes:
+        _, indexes = await db.execute_query(
+            "SELECT c.relname, a.amname FROM pg_class c "
+            "JOIN pg_am a ON a.oid = c.relam WHERE c.relname = ANY($1)",
+            [sorted({node["Index Name"] for node in nodes})],
+        )
+        methods = {row[0]: row[1] for row in indexes}
+    index_scans = [
+        IndexScan(
+            node["Index Name"],
+            methods.get(node["Index Name"], ""),
+            node.get("Relation Name"),
+            node.get("Index Cond"),
+        )
+        for node in nodes
+    ]
+    seq_scans = [
+        node["Relation Name"]
+        for node in _nodes(plan)
+        if node.get("Node Type") == "Seq Scan"
+    ]
+    return QueryPlan(plan, spatial_functions(sql), index_scans, seq_scans)
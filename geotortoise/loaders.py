@@ -0,0 +1,165 @@
+"""
+Request-coalescing loaders for spatial lookups.
+
+Answering "which region contains this point?" with one query per point pays a
+database round trip per lookup. :class:`ContainsLoader` collects the lookups made
+concurrently within a short window and resolves all of them with a single query,
+joining the array of points against the table::
+
+    loader = ContainsLoader(Region.all())
+
+    # Concurrent callers share the same query
+    regions = await loader.load(Point(2.82, 41.98))
+
+    # Batch jobs can resolve many points at once
+    regions_per_point = await loader.bulk_contains(points)
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import shapely
+from pypika.terms import LiteralValue
+from shapely.geometry.base import BaseGeometry
+from tortoise.queryset import QuerySet
+
+from ._base_functions import func, parameterize_sql
+from .fields import get_geometry_field
+from .functions import ST_Contains
+from .queryset import _init_instances
+
+LOOKUP = "geotortoise_lookup"
+LOOKUP_WKB = "lookup_wkb"
+LOOKUP_INDEX = "lookup_index"
+
+PointLike = Union[BaseGeometry, str]
+
+
+class ContainsLoader:
+    """
+    Resolves the rows of a queryset whose geometry contains each given point.
+
+    Calls to :meth:`load` made within ``delay`` seconds of each other, or until
+    ``max_batch_size`` points are waiting, are sent as a single query. Every point
+    is unnested from one array parameter and matched with a lateral join, so the
+    spatial index is used once per point while the round trip is paid once per batch.
+    The statement is the same for every batch, so its prepared statement is reused.
+
+    The loader must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        geom_field: Optional[str] = None,
+        delay: float = 0.002,
+        max_batch_size: int = 1000,
+    ) -> None:
+        """
+        :param queryset: The candidate rows, e.g. ``Region.all()``. Filters are kept,
+            ordering and limits apply to the rows of every point.
+        :param geom_field: The geometry field. The first one of the model by default.
+        :param delay: The seconds to wait for other lookups before sending a batch.
+        :param max_batch_size: The number of points that sends a batch right away.
+        """
+        self.queryset = queryset
+        self.field = get_geometry_field(queryset.model, geom_field)
+        self.delay = delay
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[PointLike, "asyncio.Future[List[Any]]"]] = []
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def load(self, point: PointLike) -> List[Any]:
+        """
+        Returns the rows containing a point, batched with the concurrent lookups.
+
+        :param point: A Shapely geometry or its WKT.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((point, future))
+        if len(self._pending) >= self.max_batch_size:
+            self.dispatch()
+        elif self._handle is None:
+            self._handle = loop.call_later(self.delay, self.dispatch)
+        return await future
+
+    def dispatch(self) -> None:
+        """Sends the pending lookups without waiting for the rest of the window."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._resolve(batch))
+        # Keep a reference until done, the loop only holds weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(
+        self, batch: List[Tuple[PointLike, "asyncio.Future[List[Any]]"]]
+    ) -> None:
+        try:
+            results = await self.bulk_contains([point for point, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), rows in zip(batch, results):
+            if not future.done():
+                future.set_result(rows)
+
+    def sql(self, points: Sequence[PointLike]) -> Tuple[str, List[Any], List[int]]:
+        """
+        Builds the query matching the points against the queryset.
+
+        Repeated points are only sent once.
+
+        :param points: Shapely geometries or their WKT.
+        :return: The SQL, the values to bind and, for every point, the position
+            of its WKB in the array parameter.
+        """
+        geoms = [shapely.from_wkt(p) if isinstance(p, str) else p for p in points]
+        unique: Dict[bytes, int] = {}
+        positions = [
+            unique.setdefault(wkb, len(unique)) for wkb in shapely.to_wkb(geoms)
+        ]
+
+        column = self.field.source_field or self.field.model_field_name
+        lookup = LiteralValue(f'"{LOOKUP}"."{LOOKUP_WKB}"')
+        point = (
+            func.ST_GeomFromWKB(lookup, self.field.srid)
+            if self.field.srid
+            else func.ST_GeomFromWKB(lookup)
+        )
+        rows = self.queryset.filter(ST_Contains(**{column: point}))
+        rows_sql, values = parameterize_sql(rows.sql)
+        table = rows.model._meta.db_table
+        sql = (
+            f'SELECT "{LOOKUP}"."{LOOKUP_INDEX}","{table}".* '
+            f"FROM unnest(${len(values) + 1}::bytea[]) "
+            f'WITH ORDINALITY "{LOOKUP}"("{LOOKUP_WKB}","{LOOKUP_INDEX}") '
+            f'CROSS JOIN LATERAL ({rows_sql}) "{table}"'
+        )
+        return sql, [*values, list(unique)], positions
+
+    async def bulk_contains(self, points: Sequence[PointLike]) -> List[List[Any]]:
+        """
+        Returns the rows containing each point with a single query.
+
+        :param points: Shapely geometries or their WKT.
+        :return: The list of rows for every point, in the same order.
+        """
+        if not points:
+            return []
+        sql, values, positions = self.sql(points)
+        db = self.queryset._db or self.queryset._choose_db()
+        _, rows = await db.execute_query(sql, values)
+
+        # unnest ordinality is 1-based
+        matches: List[List[Any]] = [[] for _ in range(len(values[-1]) + 1)]
+        for row, instance in zip(rows, _init_instances(self.queryset, rows)):
+            matches[row[LOOKUP_INDEX]].append(instance)
+        return [list(matches[position + 1]) for position in positions]
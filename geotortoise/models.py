@@ -0,0 +1,192 @@
+from typing import Any, Iterable, List, Optional, Type
+
+from tortoise import Model
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.filters import get_filters_for_field
+from tortoise.manager import Manager
+from tortoise.queryset import BulkCreateQuery, BulkUpdateQuery, QuerySet
+
+from .fields import (
+    ENCODED_GEOMETRIES_ATTR,
+    GeohashField,
+    GeometryField,
+    PolygonField,
+    RawGeometry,
+    SimplifiedPolygonField,
+)
+from .queryset import GeometryQuerySet
+
+
+class LazyGeometryAttribute:
+    """
+    Model attribute of a lazy geometry column, decoding its raw value on first access.
+    """
+
+    def __init__(self, name: str, field: GeometryField) -> None:
+        self.name = name
+        self.field = field
+
+    def __get__(self, instance: Optional[Model], owner: Type[Model]) -> Any:
+        if instance is None:
+            return self
+        try:
+            value = instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+        if isinstance(value, RawGeometry):
+            value = instance.__dict__[self.name] = self.field.to_python_value(
+                value.data
+            )
+        return value
+
+    def __set__(self, instance: Model, value: Any) -> None:
+        instance.__dict__[self.name] = value
+
+
+def encode_geometry_columns(
+    model: Type[Model], objects: List[Model], fields: Optional[Iterable[str]] = None
+) -> None:
+    """
+    Encodes the geometry columns of the given instances in one vectorized call
+    per column, so that :meth:`GeometryField.to_db_value` only has to look them up.
+    The cell keys of the geometries are derived the same way.
+
+    :param model: The model of the instances.
+    :param objects: The instances about to be written.
+    :param fields: The fields to encode. All the geometry fields by default.
+    """
+    fields_map = model._meta.fields_map
+    names = fields if fields is not None else fields_map
+    for name in names:
+        field = fields_map.get(name)
+        if isinstance(field, GeohashField):
+            sources = [getattr(obj, field.source) for obj in objects]
+            for obj, source, key in zip(objects, sources, field.derive(sources)):
+                setattr(obj, name, key)
+                encoded = obj.__dict__.setdefault(ENCODED_GEOMETRIES_ATTR, {})
+                encoded[name] = (source, key)
+            continue
+        if not isinstance(field, GeometryField):
+            continue
+        if isinstance(field, SimplifiedPolygonField):
+            values = field.simplify([getattr(obj, field.source) for obj in objects])
+            for obj, value in zip(objects, values):
+                setattr(obj, name, value)
+        else:
+            values = [getattr(obj, name) for obj in objects]
+        for obj, value, hex_wkb in zip(objects, values, field.to_db_values(values)):
+            encoded = obj.__dict__.setdefault(ENCODED_GEOMETRIES_ATTR, {})
+            encoded[name] = (value, hex_wkb)
+
+
+class GeometryManager(Manager):
+    """
+    Manager returning :class:`geotortoise.queryset.GeometryQuerySet` querysets.
+    """
+
+    def get_queryset(self) -> QuerySet:
+        return GeometryQuerySet(self._model)
+
+
+class GeometryModel(Model):
+    """
+    Model with vectorized geometry encoding on bulk writes and lazy decoding.
+
+    ``bulk_create`` and ``bulk_update`` encode each geometry column with a single
+    Shapely call instead of a GEOS round trip per row.
+
+    Geometry fields defined with ``lazy=True`` keep the raw value fetched from the
+    database and decode it on first access.
+
+    Querysets bind the geometries of their spatial filters as parameters, see
+    :class:`geotortoise.queryset.GeometryQuerySet`. Models defining their own
+    manager should return that queryset too.
+
+    Polygon fields defined with ``resolutions`` get a field per resolution, derived
+    from the polygon on ``save``, ``bulk_create`` and ``bulk_update``. Geometry
+    fields defined with ``cells`` get a field per cell key, derived the same way.
+    Queryset updates do not derive them.
+    """
+
+    class Meta:
+        abstract = True
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        meta = cls._meta
+        if type(meta.manager) is Manager:
+            meta.manager = GeometryManager()
+        for name, field in list(meta.fields_map.items()):
+            if not isinstance(field, GeometryField):
+                continue
+            derived = field.get_cell_fields()
+            if isinstance(field, PolygonField):
+                derived.update(field.get_resolution_fields())
+            for derived_name, derived_field in derived.items():
+                # Inherited from a parent model
+                if derived_name in meta.fields_map:
+                    continue
+                derived_field.model_field_name = derived_name
+                meta.fields_map[derived_name] = derived_field
+                meta.fields_db_projection[derived_name] = derived_name
+                meta._filters.update(
+                    get_filters_for_field(derived_name, derived_field, derived_name)
+                )
+
+        lazy_columns = []
+        for name, field in cls._meta.fields_map.items():
+            if isinstance(field, GeometryField) and field.lazy:
+                setattr(cls, name, LazyGeometryAttribute(name, field))
+                lazy_columns.append(field.source_field or name)
+        cls._lazy_geometry_columns = tuple(lazy_columns)
+
+    @classmethod
+    def _init_from_db(cls, **kwargs: Any) -> Model:
+        for column in cls._lazy_geometry_columns:
+            value = kwargs.get(column)
+            if value is not None:
+                kwargs[column] = RawGeometry(value)
+        return super()._init_from_db(**kwargs)
+
+    @classmethod
+    def bulk_create(
+        cls, objects: Iterable[Model], *args: Any, **kwargs: Any
+    ) -> BulkCreateQuery:
+        objects = list(objects)
+        encode_geometry_columns(cls, objects)
+        return super().bulk_create(objects, *args, **kwargs)
+
+    @classmethod
+    def bulk_update(
+        cls, objects: Iterable[Model], fields: Iterable[str], *args: Any, **kwargs: Any
+    ) -> BulkUpdateQuery:
+        objects, fields = list(objects), cls._with_derived_fields(fields)
+        encode_geometry_columns(cls, objects, fields)
+        return super().bulk_update(objects, fields, *args, **kwargs)
+
+    async def save(
+        self,
+        using_db: Optional[BaseDBAsyncClient] = None,
+        update_fields: Optional[Iterable[str]] = None,
+        force_create: bool = False,
+        force_update: bool = False,
+    ) -> None:
+        if update_fields is not None:
+            update_fields = self._with_derived_fields(update_fields)
+        await super().save(using_db, update_fields, force_create, force_update)
+
+    @classmethod
+    def _with_derived_fields(cls, fields: Iterable[str]) -> List[str]:
+        """
+        Adds the resolutions and cell keys of the updated geometries to the updated
+        fields.
+        """
+        fields = list(fields)
+        for name, field in cls._meta.fields_map.items():
+            if (
+                isinstance(field, (SimplifiedPolygonField, GeohashField))
+                and field.source in fields
+            ):
+                if name not in fields:
+                    fields.append(name)
+        return fields
@@ -0,0 +1,608 @@
+"""
+Helpers to run Tortoise querysets through code paths tailored for geometries.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Type
+
+import numpy as np
+import shapely
+from pypika import Field as PyPikaField
+from pypika.functions import Cast, Coalesce
+from pypika.terms import LiteralValue
+from tortoise import Model
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import FieldError
+from tortoise.expressions import Q, RawSQL
+from tortoise.queryset import BulkUpdateQuery, QuerySet
+
+from ._base_functions import func, parameterize_sql
+from .cells import BBox, cells_in_bbox, cells_in_radius
+from .codecs import decode_geometries
+from .fields import (
+    GeohashField,
+    GeometryField,
+    PointField,
+    PolygonField,
+    get_geometry_field,
+)
+from .functions import (
+    AsBinary,
+    GeometryLike,
+    KNNDistance,
+    KNNDistanceND,
+    ST_AsGeoJSON,
+)
+
+# Values decoded between two yields to the event loop by :func:`decode_geometry_columns`
+DECODE_CHUNK_SIZE = 100
+
+
+def parameterized_sql(queryset: QuerySet) -> Tuple[str, List[Any]]:
+    """
+    Returns the SQL of a queryset with its geometries as bound parameters.
+
+    Spatial filters built from Shapely geometries or WKT render placeholders
+    (``ST_GeomFromWKB($1)``) instead of inlined literals, so the statement is the
+    same for every geometry and asyncpg's prepared statement cache can reuse it.
+
+    Geometry columns of fields with a ``grid_size`` are selected with their
+    precision reduced, and those of ``binary`` fields through *ST_AsBinary*.
+    """
+
+    def render() -> str:
+        query = queryset.as_query()
+        _geometry_selects(queryset.model, query)
+        return query.get_sql()
+
+    return parameterize_sql(render)
+
+
+def _geometry_selects(model: Type[Model], query: Any) -> None:
+    table = model._meta.basetable
+    fields = {
+        field.source_field or name: field
+        for name, field in model._meta.fields_map.items()
+        if isinstance(field, GeometryField) and (field.grid_size or field.binary)
+    }
+    if not fields:
+        return
+    for index, term in enumerate(query._selects):
+        if (
+            isinstance(term, PyPikaField)
+            and term.name in fields
+            and term.table in (None, table)
+        ):
+            field = fields[term.name]
+            selected = field.get_select_term(term)
+            if field.binary:
+                selected = AsBinary(selected)
+            query._selects[index] = selected.as_(term.alias or term.name)
+
+
+class _BoundValuesClient:
+    """
+    Database client sending the values bound to a statement along with it.
+    Every other query and attribute goes to the wrapped client as is.
+    """
+
+    def __init__(self, db: BaseDBAsyncClient, sql: str, values: List[Any]) -> None:
+        self.db = db
+        self.sql = sql
+        self.values = values
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.db, name)
+
+    async def execute_query(
+        self, query: str, values: Optional[List[Any]] = None
+    ) -> Tuple[int, List[Any]]:
+        if query == self.sql and not values:
+            values = self.values
+        return await self.db.execute_query(query, values)
+
+
+class GeometryBulkUpdateQuery(BulkUpdateQuery):
+    """
+    Bulk update sending the geometries as hex EWKB.
+
+    Tortoise casts the raw attribute of every instance, which renders Shapely
+    geometries as unquoted WKT. The geometry fields and their cell keys are
+    converted with ``to_db_value`` while the query is built, then restored.
+    """
+
+    __slots__ = ()
+
+    def _make_query(self) -> None:
+        fields_map = self.model._meta.fields_map
+        fields = [
+            fields_map[name]
+            for name in self.fields
+            if isinstance(fields_map[name], (GeometryField, GeohashField))
+        ]
+        originals = []
+        try:
+            for obj in self.objects:
+                values = [
+                    field.to_db_value(getattr(obj, field.model_field_name), obj)
+                    for field in fields
+                ]
+                for field, value in zip(fields, values):
+                    name = field.model_field_name
+                    originals.append((obj, name, getattr(obj, name)))
+                    setattr(obj, name, value)
+            super()._make_query()
+        finally:
+            for obj, name, value in reversed(originals):
+                setattr(obj, name, value)
+
+
+class GeometryQuerySet(QuerySet):
+    """
+    Queryset binding the geometries of its spatial filters as parameters.
+
+    Awaiting it runs the statement of :func:`parameterized_sql`. The geometries are
+    placeholders instead of inlined literals, so the statement is the same for every
+    geometry and asyncpg's prepared statement cache can reuse it. The geometry
+    columns are selected as defined by their ``grid_size`` and ``binary``.
+    Models inheriting from :class:`geotortoise.models.GeometryModel` return it::
+
+        regions = await Region.filter(ST_Contains(poly=point))
+
+    Only the queries returning model instances bind their geometries: ``values``,
+    ``values_list``, ``count``, ``exists``, ``update`` and ``delete`` still inline
+    them.
+    """
+
+    async def _execute(self) -> List[Any]:
+        _geometry_selects(self.model, self.query)
+        sql, values = parameterize_sql(self.query.get_sql)
+        query, db = self.query, self._db
+        self.query = RawSQL(sql)
+        self._db = _BoundValuesClient(db, sql, values)
+        try:
+            return await super()._execute()
+        finally:
+            self.query, self._db = query, db
+
+    def bulk_update(self, *args: Any, **kwargs: Any) -> BulkUpdateQuery:
+        query = super().bulk_update(*args, **kwargs)
+        query.__class__ = GeometryBulkUpdateQuery
+        return query
+
+
+async def fetch_parameterized(
+    queryset: QuerySet, decode_chunk_size: Optional[int] = None
+) -> List[Any]:
+    """
+    Executes a queryset binding its geometries as parameters.
+
+    Awaiting a :class:`GeometryQuerySet` binds them too. This helper also runs the
+    querysets of other models, and can decode the geometries in chunks.
+    Only plain querysets are supported: ``select_related`` and ``prefetch_related``
+    must go through the regular ``await queryset`` path.
+
+    :param queryset: The queryset to execute.
+    :param decode_chunk_size: Decodes the geometry columns in chunks of this many
+        values with :func:`decode_geometry_columns`, letting other coroutines run
+        between them, instead of row by row in a single stretch.
+    """
+    sql, values = parameterized_sql(queryset)
+    _, rows = await queryset._db.execute_query(sql, values)
+    if decode_chunk_size is not None:
+        rows = await decode_geometry_columns(queryset.model, rows, decode_chunk_size)
+    return _init_instances(queryset, rows)
+
+
+async def decode_geometry_columns(
+    model: Type[Model],
+    rows: Iterable[Any],
+    chunk_size: int = DECODE_CHUNK_SIZE,
+) -> List[Dict[str, Any]]:
+    """
+    Decodes the geometry columns of fetched rows in chunks, yielding to the event
+    loop between them.
+
+    Each chunk is decoded as an array by :func:`geotortoise.codecs.decode_geometries`,
+    so that a large result does not stall the other coroutines while it is parsed:
+    they wait for one chunk at most instead of the whole result::
+
+        regions = await fetch_parameterized(Region.all(), decode_chunk_size=100)
+
+    Shapely holds the GIL while parsing, so decoding in a thread pool would not be
+    faster, and contending for the GIL makes it slower.
+
+    :param model: The model of the rows.
+    :param rows: The records fetched from the database.
+    :param chunk_size: The number of values decoded between two yields.
+    :return: The rows as dicts, with the geometries as Shapely objects.
+    """
+    rows = [dict(row) for row in rows]
+    if not rows:
+        return rows
+    columns = [
+        field.source_field or name
+        for name, field in model._meta.fields_map.items()
+        if isinstance(field, GeometryField) and (field.source_field or name) in rows[0]
+    ]
+    for column in columns:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            for row, geom in zip(chunk, decode_geometries([r[column] for r in chunk])):
+                row[column] = geom
+            await asyncio.sleep(0)
+    return rows
+
+
+async def stream(
+    queryset: QuerySet,
+    chunk_size: int = 1000,
+    raw: bool = False,
+    decode_chunk_size: Optional[int] = None,
+) -> AsyncIterator[List[Any]]:
+    """
+    Iterates over a queryset in chunks using a server-side cursor, so that only
+    ``chunk_size`` rows and their geometries are held in memory at a time::
+
+        async for regions in stream(Region.all(), chunk_size=500):
+            for region in regions:
+                ...
+
+    The cursor runs in its own transaction on a dedicated pool connection. When
+    called inside a transaction, do not run other queries on it until the iteration
+    ends, as the connection is locked by the cursor.
+
+    :param queryset: The queryset to iterate. Same restrictions as :func:`fetch_parameterized`.
+    :param chunk_size: The number of rows fetched from the cursor at a time.
+    :param raw: Yields the records as sent by the database, without decoding the
+        geometries or building model instances.
+    :param decode_chunk_size: Decodes the geometry columns of each chunk in smaller
+        chunks. See :func:`fetch_parameterized`.
+    """
+    sql, values = parameterized_sql(queryset)
+    async with queryset._db.acquire_connection() as connection:
+        async with connection.transaction():
+            cursor = await connection.cursor(sql, *values)
+            while True:
+                rows = await cursor.fetch(chunk_size)
+                if not rows:
+                    break
+                if raw:
+                    yield rows
+                    continue
+                if decode_chunk_size is not None:
+                    rows = await decode_geometry_columns(
+                        queryset.model, rows, decode_chunk_size
+                    )
+                yield _init_instances(queryset, rows)
+
+
+def feature_collection_sql(
+    queryset: QuerySet,
+    fields: Iterable[str] = (),
+    geom_field: Optional[str] = None,
+    max_decimal_digits: Optional[int] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    Builds the query returning a queryset as a single GeoJSON FeatureCollection.
+
+    :param queryset: The rows to encode. Filters are kept, and the features follow
+        its ordering, whose fields must be among the properties.
+    :param fields: The fields added as Feature properties.
+    :param geom_field: The geometry field. The first one of the model by default.
+    :param max_decimal_digits: The maximum number of decimal places of the coordinates.
+    :return: The SQL and the values to bind.
+    """
+    field = get_geometry_field(queryset.model, geom_field)
+    fields = list(fields)
+    order = []
+    for name, direction in queryset._orderings:
+        if name not in fields:
+            raise FieldError(
+                f'Cannot order the features by "{name}", which is not a property.'
+            )
+        order.append(f'"feature"."{name}" {direction.value}')
+
+    features = queryset.values(*fields, field.model_field_name)
+    features_sql, values = parameterize_sql(features.sql)
+    feature = Cast(
+        ST_AsGeoJSON(
+            LiteralValue('"feature".*'), max_decimal_digits, field.model_field_name
+        ),
+        "json",
+    )
+    # The order of a subquery is not kept by aggregates, it has to be explicit
+    aggregate = func.json_agg(feature)
+    if order:
+        aggregate = LiteralValue(
+            f"json_agg({feature.get_sql()} ORDER BY {','.join(order)})"
+        )
+    collection = func.json_build_object(
+        "type",
+        "FeatureCollection",
+        "features",
+        Coalesce(aggregate, LiteralValue("'[]'::json")),
+    )
+    sql = f'SELECT {Cast(collection, "text").get_sql()} FROM ({features_sql}) "feature"'
+    return sql, values
+
+
+async def fetch_feature_collection(
+    queryset: QuerySet,
+    fields: Iterable[str] = (),
+    geom_field: Optional[str] = None,
+    max_decimal_digits: Optional[int] = None,
+) -> str:
+    """
+    Returns a queryset as GeoJSON FeatureCollection text, encoded by PostGIS.
+
+    No geometry nor model instance is created in Python, so the result can be
+    sent to the client as is. See :func:`feature_collection_sql` for the parameters.
+    """
+    sql, values = feature_collection_sql(
+        queryset, fields, geom_field, max_decimal_digits
+    )
+    _, rows = await queryset._db.execute_query(sql, values)
+    return rows[0][0]
+
+
+# Kinds of the columns of :func:`fetch_columns`
+SCALAR, COORDINATE, GEOMETRY = "scalar", "coordinate", "geometry"
+
+
+def _select_columns(
+    queryset: QuerySet, fields: Optional[Iterable[str]]
+) -> Tuple[QuerySet, Dict[str, str]]:
+    fields_map = queryset.model._meta.fields_map
+    if fields is None:
+        fields = queryset.model._meta.fields_db_projection
+    annotations, kinds = {}, {}
+    for name in fields:
+        field = fields_map.get(name)
+        if not isinstance(field, GeometryField):
+            kinds[name] = SCALAR
+            continue
+        column = field.get_select_term()
+        if isinstance(field, PointField):
+            annotations[f"{name}_x"] = func.ST_X(column)
+            annotations[f"{name}_y"] = func.ST_Y(column)
+            kinds[f"{name}_x"] = kinds[f"{name}_y"] = COORDINATE
+        else:
+            annotations[name] = AsBinary(column)
+            kinds[name] = GEOMETRY
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset.values(*kinds), kinds
+
+
+def columns_sql(
+    queryset: QuerySet, fields: Optional[Iterable[str]] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Builds the query of :func:`fetch_columns`.
+
+    Point fields are selected as two ``<field>_x`` and ``<field>_y`` columns with
+    ``ST_X`` and ``ST_Y``, and the other geometry fields as WKB with ``ST_AsBinary``.
+
+    :param queryset: The rows to fetch. Filters and ordering are kept.
+    :param fields: The fields to fetch. All the fields of the model by default.
+    :return: The SQL and the values to bind.
+    """
+    values, _ = _select_columns(queryset, fields)
+    return parameterize_sql(values.sql)
+
+
+def _array(values: List[Any]) -> np.ndarray:
+    try:
+        array = np.array(values)
+    except ValueError:
+        array = None
+    if array is None or array.ndim != 1:
+        # Values that are sequences themselves, such as JSON lists
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+    return array
+
+
+async def fetch_columns(
+    queryset: QuerySet,
+    fields: Optional[Iterable[str]] = None,
+    geometries: str = "shapely",
+) -> Dict[str, np.ndarray]:
+    """
+    Returns the rows of a queryset as a NumPy array per column, for analytics jobs
+    that do not need model instances::
+
+        columns = await fetch_columns(Place.filter(name="Garden"), ["id", "point"])
+        lon, lat = columns["point_x"], columns["point_y"]
+
+    No model instance is created, and points are never decoded: their coordinates
+    are float arrays, with NaN for the NULL ones. See :func:`columns_sql` for the
+    columns of every field.
+
+    :param queryset: The rows to fetch. Same restrictions as :func:`fetch_parameterized`.
+    :param fields: The fields to fetch. All the fields of the model by default.
+    :param geometries: How the geometry fields other than points are returned:
+        ``"shapely"`` decodes the whole column in a single vectorized call, and
+        ``"wkb"`` keeps the WKB bytes.
+    :return: The arrays by column name, in the order of the rows.
+    """
+    if geometries not in ("shapely", "wkb"):
+        raise ValueError('geometries must be either "shapely" or "wkb".')
+    values_queryset, kinds = _select_columns(queryset, fields)
+    sql, values = parameterize_sql(values_queryset.sql)
+    _, rows = await queryset._db.execute_query(sql, values)
+
+    columns = {}
+    for name, kind in kinds.items():
+        values = [row[name] for row in rows]
+        if kind == COORDINATE:
+            columns[name] = np.array(values, dtype=float)
+        elif kind == GEOMETRY:
+            wkb = np.empty(len(values), dtype=object)
+            wkb[:] = values
+            columns[name] = shapely.from_wkb(wkb) if geometries == "shapely" else wkb
+        else:
+            columns[name] = _array(values)
+    return columns
+
+
+def _init_instances(queryset: QuerySet, rows: Iterable[Any]) -> List[Any]:
+    annotations = list(queryset._annotations)
+    instances = []
+    for row in rows:
+        instance = queryset.model._init_from_db(**row)
+        for field in annotations:
+            setattr(instance, field, row[field])
+        instances.append(instance)
+    return instances
+
+
+def nearest(
+    queryset: QuerySet,
+    limit: int,
+    after: Optional[Tuple[float, Any]] = None,
+    srid: Optional[int] = None,
+    nd: bool = False,
+    alias: str = "distance",
+    **kwargs: GeometryLike,
+) -> QuerySet:
+    """
+    Returns the ``limit`` nearest rows to a geometry, nearest first, using
+    index-assisted KNN ordering.
+
+    Pages are fetched with keyset pagination: pass the distance and primary key of
+    the last row of the previous page as ``after`` instead of using an offset, so
+    deep pages do not re-fetch and sort every previous row::
+
+        page = await nearest(Place.all(), 20, point=here)
+        page = await nearest(Place.all(), 20, after=(page[-1].distance, page[-1].pk), point=here)
+
+    :param queryset: The queryset to search.
+    :param limit: The number of rows to return.
+    :param after: The ``(distance, pk)`` of the last row of the previous page.
+    :param srid: The optional srid of the geometry.
+    :param nd: Uses the n-D ``<<->>`` operator instead of the 2D ``<->``.
+    :param alias: The name of the annotation holding the distance.
+    :param kwargs: A single key and value with the field and the geometry-like.
+    """
+    distance_class = KNNDistanceND if nd else KNNDistance
+    pk_attr = queryset.model._meta.pk_attr
+    queryset = queryset.annotate(**{alias: distance_class(g2_srid=srid, **kwargs)})
+    if after is not None:
+        distance, pk = after
+        queryset = queryset.filter(
+            Q(**{f"{alias}__gt": distance})
+            | Q(**{alias: distance, f"{pk_attr}__gt": pk})
+        )
+    return queryset.order_by(alias, pk_attr).limit(limit)
+
+
+def select_resolution(
+    queryset: QuerySet, resolution: str, geom_field: Optional[str] = None
+) -> QuerySet:
+    """
+    Selects a simplified resolution of a polygon instead of the full polygon.
+
+    The instances only have the resolution field, e.g. ``poly_low``, so that list and
+    map endpoints transfer and decode a fraction of the vertices. They are partial
+    and cannot be saved::
+
+        regions = await select_resolution(Region.all(), "low")
+        outlines = [region.poly_low for region in regions]
+
+    :param queryset: The queryset.
+    :param resolution: The name of the resolution, as defined in the field.
+    :param geom_field: The polygon field. The first geometry field by default.
+    """
+    field = get_geometry_field(queryset.model, geom_field)
+    if not isinstance(field, PolygonField):
+        raise FieldError(f'"{field.model_field_name}" is not a polygon field.')
+    selected = field.get_resolution_field_name(resolution)
+    skipped = {
+        field.model_field_name,
+        *(field.get_resolution_field_name(name) for name in field.resolutions),
+    } - {selected}
+    return queryset.only(
+        *(
+            name
+            for name in queryset.model._meta.fields_db_projection
+            if name not in skipped
+        )
+    )
+
+
+def _cell_field(
+    queryset: QuerySet, cell: str, geom_field: Optional[str]
+) -> Tuple[str, int]:
+    """Returns the name and the precision of the cell key of a point field."""
+    field = get_geometry_field(queryset.model, geom_field)
+    name = field.get_cell_field_name(cell)
+    if not isinstance(field, PointField):
+        # The key of other geometries is the cell of their centroid, which may be
+        # out of the box while the geometry reaches into it
+        raise FieldError(
+            f'"{field.model_field_name}" is not a point field, '
+            "its cells cannot prefilter by location."
+        )
+    return name, field.cells[cell]
+
+
+def bbox_prefilter(
+    queryset: QuerySet,
+    bbox: BBox,
+    cell: str,
+    geom_field: Optional[str] = None,
+    max_cells: int = 1024,
+) -> QuerySet:
+    """
+    Filters a queryset by the cell keys intersecting a bounding box.
+
+    The ``IN`` filter on the indexed cell column discards most rows with a B-tree
+    lookup, before the exact spatial filter of the queryset is evaluated on the
+    remaining candidates. Only point fields are supported, as the key of other
+    geometries is the cell of their centroid::
+
+        places = await bbox_prefilter(
+            Place.filter(ST_Within(point=box(*bbox))), bbox, "hash"
+        )
+
+    :param queryset: The queryset.
+    :param bbox: (min longitude, min latitude, max longitude, max latitude)
+    :param cell: The name of the cell key, as defined in the field.
+    :param geom_field: The point field. The first geometry field by default.
+    :param max_cells: See :func:`geotortoise.cells.cells_in_bbox`.
+    """
+    name, precision = _cell_field(queryset, cell, geom_field)
+    cells = cells_in_bbox(bbox, precision, max_cells)
+    return queryset.filter(**{f"{name}__in": cells})
+
+
+def radius_prefilter(
+    queryset: QuerySet,
+    x: float,
+    y: float,
+    radius: float,
+    cell: str,
+    geom_field: Optional[str] = None,
+    max_cells: int = 1024,
+) -> QuerySet:
+    """
+    Filters a queryset by the cell keys around a point, like :func:`bbox_prefilter`::
+
+        center = Point(2.82, 41.98)
+        places = await radius_prefilter(
+            Place.filter(ST_DWithin(point=center, distance=500, geography=True)),
+            center.x, center.y, 500, "hash",
+        )
+
+    :param queryset: The queryset.
+    :param x: The longitude of the center.
+    :param y: The latitude of the center.
+    :param radius: The radius, in meters.
+    :param cell: The name of the cell key, as defined in the field.
+    :param geom_field: The point field. The first geometry field by default.
+    :param max_cells: See :func:`geotortoise.cells.cells_in_bbox`.
+    """
+    name, precision = _cell_field(queryset, cell, geom_field)
+    cells = cells_in_radius(x, y, radius, precision, max_cells)
+    return queryset.filter(**{f"{name}__in": cells})
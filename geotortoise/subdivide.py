@@ -0,0 +1,124 @@
+"""
+Companion tables of subdivided polygons for fast containment filters.
+
+Huge polygons, such as countries or time zones, have enormous bounding boxes, so a
+spatial index barely discards any row, and every candidate needs a full-geometry
+``ST_Contains``. Splitting each polygon with ``ST_Subdivide`` into pieces of a few
+vertices, stored in a companion table with its own spatial index, makes these
+filters both selective and cheap.
+
+The companion model is created from the polygon field, and must be assigned in
+the models module, so that Tortoise generates its table::
+
+    class Country(Model):
+        area = PolygonField()
+
+    CountryAreaPiece = subdivision_model(Country, "area")
+
+From then on, ``ST_Contains`` and ``ST_Intersects`` filters on ``area`` use the
+pieces, which are refreshed when a country is saved.
+"""
+from typing import Any, Iterable, Optional, Type
+
+from tortoise import Model, fields
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.signals import Signals
+
+from .fields import GeometryField, get_geometry_field
+
+PARENT = "parent"
+GEOM = "geom"
+
+
+def subdivision_model(
+    model: Type[Model],
+    field_name: str,
+    max_vertices: int = 256,
+    app: str = "models",
+    name: Optional[str] = None,
+) -> Type[Model]:
+    """
+    Creates the model of the pieces of a polygon field, and maintains them.
+
+    The pieces are rebuilt by the database whenever an instance is saved, and
+    deleted with it. Bulk operations and queryset updates do not send signals: call
+    :func:`refresh_subdivisions` after them.
+
+    :param model: The model with the polygon field.
+    :param field_name: The name of the polygon field.
+    :param max_vertices: The maximum number of vertices of each piece.
+    :param app: The Tortoise app of the model.
+    :param name: The name of the pieces model. ``<Model><Field>Piece`` by default.
+    :return: The pieces model.
+    """
+    field = get_geometry_field(model, field_name)
+    pieces = type(
+        name or f"{model.__name__}{field_name.title().replace('_', '')}Piece",
+        (Model,),
+        {
+            "__module__": model.__module__,
+            PARENT: fields.ForeignKeyField(
+                f"{app}.{model.__name__}",
+                related_name=f"{field_name}_pieces",
+                on_delete=fields.CASCADE,
+            ),
+            GEOM: GeometryField(srid=field.srid),
+        },
+    )
+    field.subdivision_model = pieces
+    field.subdivision_max_vertices = max_vertices
+
+    async def refresh_on_save(
+        sender: Type[Model],
+        instance: Model,
+        created: bool,
+        using_db: Optional[BaseDBAsyncClient],
+        update_fields: Optional[Iterable[str]],
+    ) -> None:
+        if update_fields is None or field_name in update_fields:
+            await refresh_subdivisions(model, field_name, [instance.pk], using_db)
+
+    model.register_listener(Signals.post_save, refresh_on_save)
+    return pieces
+
+
+async def refresh_subdivisions(
+    model: Type[Model],
+    field_name: str,
+    pks: Optional[Iterable[Any]] = None,
+    using_db: Optional[BaseDBAsyncClient] = None,
+) -> None:
+    """
+    Rebuilds the pieces of a subdivided polygon field in the database.
+
+    :param model: The model with the polygon field.
+    :param field_name: The name of the polygon field.
+    :param pks: The primary keys of the rows to refresh. All the rows by default.
+    :param using_db: The connection to use. The default one of the model by default.
+    """
+    field = get_geometry_field(model, field_name)
+    pieces = getattr(field, "subdivision_model", None)
+    if pieces is None:
+        raise TypeError(f'"{field_name}" of {model.__name__} is not subdivided.')
+
+    meta, pieces_meta = model._meta, pieces._meta
+    parent = pieces_meta.fields_db_projection[f"{PARENT}_id"]
+    geom = pieces_meta.fields_db_projection[GEOM]
+    column = field.source_field or field.model_field_name
+    where, delete_where, values = "", "", []
+    if pks is not None:
+        values = [list(pks)]
+        where = f' WHERE "{meta.db_pk_column}" = ANY($1)'
+        delete_where = f' WHERE "{parent}" = ANY($1)'
+
+    db = using_db or meta.db
+    await db.execute_query(
+        f'DELETE FROM "{pieces_meta.db_table}"{delete_where}', values
+    )
+    await db.execute_query(
+        f'INSERT INTO "{pieces_meta.db_table}" ("{parent}","{geom}") '
+        f'SELECT "{meta.db_pk_column}",'
+        f'ST_Subdivide("{column}",{field.subdivision_max_vertices}) '
+        f'FROM "{meta.db_table}"{where}',
+        values,
+    )
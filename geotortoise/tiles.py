@@ -0,0 +1,229 @@
+"""
+Server-side Mapbox Vector Tiles.
+
+PostGIS clips, simplifies and encodes the geometries of the tile with
+``ST_AsMVTGeom``/``ST_AsMVT``, so Python only handles the protobuf bytes and never
+decodes a geometry.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+from pypika import Field as PyPikaField
+from pypika.terms import LiteralValue
+from tortoise.queryset import QuerySet
+
+from ._base_functions import parameterize_sql
+from .fields import get_geometry_field
+from .functions import (
+    BBoxIntersects,
+    ST_AsMVT,
+    ST_AsMVTGeom,
+    ST_SetSRID,
+    ST_TileEnvelope,
+    ST_Transform,
+)
+
+WEB_MERCATOR_SRID = 3857
+DEFAULT_SRID = 4326
+MVT_GEOM = "mvt_geom"
+
+Bounds = Tuple[float, float, float, float]
+TileKey = Tuple[Hashable, int, int, int, Hashable]
+
+
+def tile_bounds(z: int, x: int, y: int, margin: float = 0) -> Bounds:
+    """
+    Returns the *(west, south, east, north)* bounds of a tile in lon/lat.
+
+    :param margin: Expands the bounds by this fraction of the tile size on every side.
+    """
+    n = 2**z
+
+    def lat(tile_y: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return (
+        (x - margin) / n * 360 - 180,
+        lat(y + 1 + margin),
+        (x + 1 + margin) / n * 360 - 180,
+        lat(y - margin),
+    )
+
+
+def tile_sql(
+    queryset: QuerySet,
+    z: int,
+    x: int,
+    y: int,
+    fields: Iterable[str] = (),
+    geom_field: Optional[str] = None,
+    layer: str = "default",
+    extent: int = 4096,
+    buffer: int = 256,
+) -> Tuple[str, List]:
+    """
+    Builds the query returning the z/x/y tile of a queryset as a single
+    ``ST_AsMVT`` value.
+
+    :param queryset: The rows to draw. Filters are kept.
+    :param z: The zoom of the tile.
+    :param x: The column of the tile.
+    :param y: The row of the tile.
+    :param fields: The fields added as feature attributes.
+    :param geom_field: The geometry field. The first one of the model by default.
+    :param layer: The name of the layer.
+    :param extent: The size of the tile in tile coordinate space.
+    :param buffer: The distance in tile coordinate space to keep around the tile.
+    :return: The SQL and the values to bind.
+    """
+    field = get_geometry_field(queryset.model, geom_field)
+    column = PyPikaField(field.source_field or field.model_field_name)
+    srid = field.srid or DEFAULT_SRID
+
+    envelope = ST_TileEnvelope(z, x, y)
+    geom = column if field.srid else ST_SetSRID(column, srid)
+    # Features in the buffer are kept by ST_AsMVTGeom, so they must pass the prefilter
+    bounds = ST_TileEnvelope(z, x, y, margin=buffer / extent)
+    if srid != WEB_MERCATOR_SRID:
+        geom = ST_Transform(geom, WEB_MERCATOR_SRID)
+        bounds = ST_Transform(bounds, srid)
+    if not field.srid:
+        bounds = ST_SetSRID(bounds, 0)
+
+    rows = (
+        queryset.filter(BBoxIntersects(column, bounds))
+        .annotate(**{MVT_GEOM: ST_AsMVTGeom(geom, envelope, extent, buffer)})
+        .values(*fields, MVT_GEOM)
+    )
+    rows_sql, values = parameterize_sql(rows.sql)
+    mvt = ST_AsMVT(LiteralValue('"tile"'), layer, extent, MVT_GEOM)
+    return f'SELECT {mvt.get_sql()} FROM ({rows_sql}) "tile"', values
+
+
+async def fetch_tile(
+    queryset: QuerySet,
+    z: int,
+    x: int,
+    y: int,
+    fields: Iterable[str] = (),
+    geom_field: Optional[str] = None,
+    layer: str = "default",
+    extent: int = 4096,
+    buffer: int = 256,
+    cache: Optional["TileCache"] = None,
+) -> bytes:
+    """
+    Returns the z/x/y tile of a queryset as Mapbox Vector Tile bytes.
+
+    See :func:`tile_sql` for the parameters.
+
+    :param cache: An optional :class:`TileCache`, looked up by layer and tile, and
+        by the SQL and values of the tile, so that querysets with different filters
+        or fields never share a tile.
+    """
+    sql, values = tile_sql(queryset, z, x, y, fields, geom_field, layer, extent, buffer)
+    query = (sql, tuple(values))
+    if cache is not None:
+        tile = cache.get(layer, z, x, y, query)
+        if tile is not None:
+            return tile
+
+    # The queryset is never run itself, so its connection may not be chosen yet
+    _, rows = await queryset._choose_db().execute_query(sql, values)
+    tile = (rows[0][0] if rows else None) or b""
+
+    if cache is not None:
+        cache.set(layer, z, x, y, tile, query)
+    return tile
+
+
+class TileCache:
+    """
+    Bounded LRU cache of encoded tiles, with an optional time to live.
+
+    Tiles are keyed by layer, z/x/y and an optional query identity, such as the
+    SQL and values :func:`fetch_tile` uses. When the data of a layer changes, call
+    :meth:`invalidate` with the lon/lat bounds of the change to drop the tiles
+    covering it at every zoom level.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        """
+        :param maxsize: The maximum number of tiles kept.
+        :param ttl: The seconds a tile is valid for. Tiles never expire by default.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._tiles: "OrderedDict[TileKey, Tuple[float, bytes]]"
+        self._tiles = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(
+        self, layer: Hashable, z: int, x: int, y: int, query: Hashable = None
+    ) -> Optional[bytes]:
+        key = (layer, z, x, y, query)
+        cached = self._tiles.get(key)
+        if cached is None:
+            return None
+        expires, tile = cached
+        if expires < time.monotonic():
+            del self._tiles[key]
+            return None
+        self._tiles.move_to_end(key)
+        return tile
+
+    def set(
+        self,
+        layer: Hashable,
+        z: int,
+        x: int,
+        y: int,
+        tile: bytes,
+        query: Hashable = None,
+    ) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        key = (layer, z, x, y, query)
+        self._tiles[key] = (expires, tile)
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.maxsize:
+            self._tiles.popitem(last=False)
+
+    def invalidate(
+        self,
+        bbox: Bounds,
+        layer: Optional[Hashable] = None,
+        margin: float = 256 / 4096,
+    ) -> int:
+        """
+        Drops the cached tiles intersecting a bounding box.
+
+        :param bbox: The *(west, south, east, north)* bounds, in lon/lat.
+        :param layer: Restricts the invalidation to a layer. All layers by default.
+        :param margin: The buffer of the tiles over their extent, as features in the
+            buffer are drawn too. The default of :func:`tile_sql`.
+        :return: The number of tiles dropped.
+        """
+        west, south, east, north = bbox
+        stale = []
+        for key in self._tiles:
+            tile_layer, z, x, y, _ = key
+            if layer is not None and tile_layer != layer:
+                continue
+            t_west, t_south, t_east, t_north = tile_bounds(z, x, y, margin)
+            if (
+                t_west <= east
+                and west <= t_east
+                and t_south <= north
+                and south <= t_north
+            ):
+                stale.append(key)
+        for key in stale:
+            del self._tiles[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._tiles.clear()
@@ -1,4 +1,10 @@
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+import shapely
 from shapely.geometry import Point
+from shapely.geometry.base import BaseGeometry
+
 from .exceptions import InvalidCoordinateError
 
 
@@ -20,3 +26,111 @@ def longitude_is_valid(x: float) -> bool:
 
 def latitude_is_valid(y: float) -> bool:
     return bool(-90 <= y <= 90)
+
+
+def _asarray(data: Union[np.ndarray, Sequence[BaseGeometry]]) -> np.ndarray:
+    data = np.asarray(data)
+    # An empty sequence has no shape, it is taken as no (longitude, latitude) rows
+    if data.ndim == 1 and not len(data) and data.dtype != object:
+        data = data.reshape(0, 2)
+    return data
+
+
+def _coordinates(
+    data: Union[np.ndarray, Sequence[BaseGeometry]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the (x, y) coordinates of the data and the row of each one."""
+    data = _asarray(data)
+    if data.dtype == object:
+        coords, index = shapely.get_coordinates(data, return_index=True)
+        return coords, index
+    if data.ndim != 2 or data.shape[1] < 2:
+        raise ValueError("Expected an array of (longitude, latitude) rows.")
+    return data[:, :2].astype(float, copy=False), np.arange(len(data))
+
+
+def coordinates_are_valid(
+    data: Union[np.ndarray, Sequence[BaseGeometry]]
+) -> np.ndarray:
+    """
+    Validates the longitude and latitude of whole arrays in a single pass.
+
+    :param data: An array of *(longitude, latitude)* rows, or an array of Shapely
+        geometries, whose vertices are all validated.
+    :return: A boolean mask, False for the rows with any coordinate out of bounds
+        or not a number.
+    """
+    coords, index = _coordinates(data)
+    with np.errstate(invalid="ignore"):
+        valid = (
+            (coords[:, 0] >= -180)
+            & (coords[:, 0] <= 180)
+            & (coords[:, 1] >= -90)
+            & (coords[:, 1] <= 90)
+        )
+    mask = np.ones(len(data), dtype=bool)
+    mask[index[~valid]] = False
+    return mask
+
+
+def invalid_coordinates(data: Union[np.ndarray, Sequence[BaseGeometry]]) -> np.ndarray:
+    """
+    Returns the index of the rows with invalid coordinates, in order.
+
+    See :func:`coordinates_are_valid` for the data accepted.
+    """
+    return np.flatnonzero(~coordinates_are_valid(data))
+
+
+def _wrap(lon: np.ndarray) -> np.ndarray:
+    """Wraps the longitudes out of bounds around the antimeridian."""
+    lon = lon.copy()
+    out = (lon < -180) | (lon > 180)
+    lon[out] = (lon[out] + 180) % 360 - 180
+    return lon
+
+
+def normalize_coordinates(
+    data: Union[np.ndarray, Sequence[BaseGeometry]],
+    wrap_longitude: bool = True,
+    clamp_latitude: bool = True,
+) -> np.ndarray:
+    """
+    Brings the coordinates of whole arrays back into bounds in a single pass.
+
+    :param data: An array of *(longitude, latitude)* rows, or an array of Shapely
+        geometries, whose vertices are all normalized.
+    :param wrap_longitude: Wraps the longitudes out of bounds around the antimeridian,
+        so that 190 becomes -170. Geometries are shifted as a whole, by the turns
+        that bring the center of their bounds into range, so that their shape is kept:
+        a geometry crossing the antimeridian still has vertices past 180 or -180.
+    :param clamp_latitude: Clamps the latitudes to the poles.
+    :return: A new array with the normalized coordinates.
+    """
+    data = _asarray(data)
+    if data.dtype == object:
+        shifts = np.zeros(len(data))
+        if wrap_longitude:
+            minx, _, maxx, _ = shapely.bounds(data).T
+            center = (minx + maxx) / 2
+            with np.errstate(invalid="ignore"):
+                shifts = np.nan_to_num(_wrap(center) - center)
+        _, index = shapely.get_coordinates(data, return_index=True)
+        offsets = shifts[index]
+
+        def normalize(coords: np.ndarray) -> np.ndarray:
+            coords = coords.astype(float)
+            coords[:, 0] += offsets
+            if clamp_latitude:
+                np.clip(coords[:, 1], -90, 90, out=coords[:, 1])
+            return coords
+
+        return shapely.transform(data, normalize)
+
+    _coordinates(data)
+    result = data.astype(float)
+    if wrap_longitude:
+        result[:, 0] = _wrap(result[:, 0])
+    if clamp_latitude:
+        np.clip(result[:, 1], -90, 90, out=result[:, 1])
+    return result
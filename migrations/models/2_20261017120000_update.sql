@@ -0,0 +1,6 @@
+-- upgrade --
+CREATE INDEX "idx_place_point_7a1e22" ON "place" USING GIST ("point");
+CREATE INDEX "idx_region_poly_5529c3" ON "region" USING GIST ("poly");
+-- downgrade --
+DROP INDEX "idx_place_point_7a1e22";
+DROP INDEX "idx_region_poly_5529c3";
@@ -0,0 +1,4 @@
+-- upgrade --
+ALTER TABLE "region" ADD "poly_low" GEOMETRY(POLYGON);
+-- downgrade --
+ALTER TABLE "region" DROP COLUMN "poly_low";
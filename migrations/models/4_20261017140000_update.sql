@@ -0,0 +1,16 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "country" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "name" VARCHAR(250) NOT NULL,
+    "area" GEOMETRY(POLYGON) NOT NULL
+);
+CREATE INDEX "idx_country_area_c90efd" ON "country" USING GIST ("area");
+CREATE TABLE IF NOT EXISTS "countryareapiece" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "geom" GEOMETRY NOT NULL,
+    "parent_id" INT NOT NULL REFERENCES "country" ("id") ON DELETE CASCADE
+);
+CREATE INDEX "idx_countryarea_geom_3b2a1e" ON "countryareapiece" USING GIST ("geom");
+-- downgrade --
+DROP TABLE IF EXISTS "countryareapiece";
+DROP TABLE IF EXISTS "country";
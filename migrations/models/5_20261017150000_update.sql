@@ -0,0 +1,12 @@
+-- upgrade --
+ALTER TABLE "place" ADD "point_hash" VARCHAR(7);
+ALTER TABLE "region" ADD "poly_hash" VARCHAR(5);
+UPDATE "place" SET "point_hash" = ST_GeoHash("point", 7);
+UPDATE "region" SET "poly_hash" = ST_GeoHash(ST_Centroid("poly"), 5);
+CREATE INDEX "idx_place_point_h_15ac89" ON "place" ("point_hash");
+CREATE INDEX "idx_region_poly_ha_328228" ON "region" ("poly_hash");
+-- downgrade --
+DROP INDEX "idx_place_point_h_15ac89";
+DROP INDEX "idx_region_poly_ha_328228";
+ALTER TABLE "region" DROP COLUMN "poly_hash";
+ALTER TABLE "place" DROP COLUMN "point_hash";
@@ -1,7 +1,9 @@
 import logging
 import sys
 
+import pytest
 from tortoise import Tortoise
+from tortoise.transactions import in_transaction
 
 from .models import DB_URL, TEST_MODELS
 
@@ -26,6 +28,24 @@ def db_handler(func_test):
     return _setup_db
 
 
+@pytest.fixture
+async def init_models(loop):
+    """Initializes the test models, without connecting to the database."""
+    await Tortoise.init(db_url=DB_URL, modules={"models": ["tests.models"]})
+    try:
+        yield
+    finally:
+        await Tortoise.close_connections()
+
+
+async def explain(queryset) -> str:
+    """Returns the query plan, disabling sequential scans as test tables are tiny."""
+    async with in_transaction() as connection:
+        await connection.execute_script("SET LOCAL enable_seqscan = off")
+        _, rows = await connection.execute_query(f"EXPLAIN {queryset.sql()}")
+    return "\n".join(row["QUERY PLAN"] for row in rows)
+
+
 if LOGGING:
     fmt = logging.Formatter(
         fmt="%(asctime)s - %(name)s:%(lineno)d - %(levelname)s - %(message)s",
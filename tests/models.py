@@ -1,17 +1,28 @@
 from tortoise import fields
-from tortoise.models import Model
 
 from geotortoise import fields as geo_fields
+from geotortoise.models import GeometryModel
+from geotortoise.subdivide import subdivision_model
 
 
-class Region(Model):
+class Region(GeometryModel):
     name = fields.CharField(max_length=250)
-    poly = geo_fields.PolygonField()
+    poly = geo_fields.PolygonField(
+        lazy=True, resolutions={"low": 0.01}, cells={"hash": 5}
+    )
 
 
-class Place(Model):
+class Place(GeometryModel):
     name = fields.CharField(max_length=250)
-    point = geo_fields.PointField()
+    point = geo_fields.PointField(cells={"hash": 7})
+
+
+class Country(GeometryModel):
+    name = fields.CharField(max_length=250)
+    area = geo_fields.PolygonField()
+
+
+CountryAreaPiece = subdivision_model(Country, "area", max_vertices=8)
 
 
 # ====================
@@ -0,0 +1,21 @@
+import shapely.wkb
+from shapely.geometry import Point
+
+from geotortoise.bulk import _records
+from tests.models import Place
+
+
+async def places(count):
+    for i in range(count):
+        yield {"name": f"Place {i}", "point": Point(i, 0)}
+
+
+async def test_copy_records_are_encoded_in_batches(init_models):
+    rows = [Place(name="Garden", point="POINT (1 2)"), {"name": "Nowhere"}]
+    records = [r async for r in _records(Place, ["name", "point"], rows, 1)]
+    streamed = [r async for r in _records(Place, ["point"], places(5), 2)]
+
+    assert records == [("Garden", Point(1, 2).wkb), ("Nowhere", None)]
+    assert [shapely.wkb.loads(point) for point, in streamed] == [
+        Point(i, 0) for i in range(5)
+    ]
@@ -0,0 +1,74 @@
+import gc
+import weakref
+
+from shapely.geometry import Point, box
+
+from geotortoise.cache import SpatialCache
+from geotortoise.functions import ST_Contains, ST_DWithin
+from tests.models import Region
+
+
+def populated_cache(**kwargs):
+    cache = SpatialCache(Region.all(), track_changes=False, **kwargs)
+    cache.populate(
+        [
+            Region(name="West", poly=box(0, 0, 1, 1)),
+            Region(name="East", poly=box(1, 0, 2, 1)),
+            Region(name="Far", poly=box(10, 10, 11, 11)),
+        ]
+    )
+    return cache
+
+
+async def test_spatial_cache_answers_filters_locally(init_models):
+    cache = populated_cache()
+    assert cache.enabled
+    assert [r.name for r in await cache.contains(Point(0.5, 0.5))] == ["West"]
+    assert [r.name for r in await cache.intersects(Point(1, 0.5))] == [
+        "West",
+        "East",
+    ]
+    assert [r.name for r in await cache.within(box(-1, -1, 3, 3))] == [
+        "West",
+        "East",
+    ]
+    assert [
+        r.name for r in await cache.filter(ST_Contains(poly="POINT (1.5 0.5)"))
+    ] == ["East"]
+    assert [
+        r.name for r in await cache.filter(ST_DWithin(poly=Point(3, 0.5), distance=1))
+    ] == ["East"]
+    assert [r.name for r in await cache.nearest(Point(9, 9), limit=2)] == [
+        "Far",
+        "East",
+    ]
+    assert [r.name for r in await cache.nearest(Point(1, 0.5))] == ["West"]
+
+
+async def test_spatial_cache_is_disabled_over_its_memory_cap(init_models):
+    cache = populated_cache(max_bytes=100)
+    assert not cache.enabled
+    assert len(cache) == 0
+
+
+async def test_spatial_cache_is_invalidated_by_signals(init_models):
+    cache = SpatialCache(Region.all())
+    cache.populate([Region(name="West", poly=box(0, 0, 1, 1))])
+    assert not cache._stale
+
+    await Region(name="East", poly=box(1, 0, 2, 1))._post_save(created=True)
+    assert cache._stale
+
+    cache.close()
+    cache.populate([])
+    await Region(name="East", poly=box(1, 0, 2, 1))._post_save(created=True)
+    assert not cache._stale
+
+
+async def test_spatial_cache_is_not_kept_alive_by_signals(init_models):
+    ref = weakref.ref(SpatialCache(Region.all()))
+    gc.collect()
+    assert ref() is None
+
+    # The listener of the collected cache does nothing
+    await Region(name="East", poly=box(1, 0, 2, 1))._post_save(created=True)
@@ -0,0 +1,64 @@
+import pytest
+
+from geotortoise.cells import (
+    cell_bounds,
+    cells_in_bbox,
+    cells_in_radius,
+    geohashes,
+    radius_bbox,
+)
+
+
+def test_geohashes():
+    assert geohashes([10.40744, -5.6], [57.64911, 42.6], 11) == [
+        "u4pruydqqvj",
+        "ezs42e44yx9",
+    ]
+    assert geohashes([], [], 5) == []
+    # Out of range coordinates fall in the cells of the bounds
+    assert geohashes([180, 200], [90, -100], 2) == ["zz", "pb"]
+
+
+def test_invalid_precision_raises_error():
+    with pytest.raises(ValueError):
+        geohashes([0], [0], 13)
+
+
+def test_cell_bounds():
+    assert cell_bounds("ezs42") == pytest.approx(
+        (-5.625, 42.5830078125, -5.5810546875, 42.626953125)
+    )
+    with pytest.raises(ValueError):
+        cell_bounds("ezs4a")
+
+
+def test_cells_in_bbox():
+    cells = cells_in_bbox((2.8, 41.9, 2.9, 42.0), 5)
+
+    assert len(cells) == 9
+    assert geohashes([2.85], [41.95], 5)[0] in cells
+    for cell in cells:
+        minx, miny, maxx, maxy = cell_bounds(cell)
+        assert minx <= 2.9 and maxx >= 2.8 and miny <= 42 and maxy >= 41.9
+
+
+def test_cells_in_bbox_across_the_antimeridian():
+    cells = cells_in_bbox((179.99, 0, -179.99, 0.01), 6)
+
+    assert sorted(cells) == ["800000", "800001", "xbpbpb", "xbpbpc"]
+
+
+def test_too_many_cells_raise_error():
+    with pytest.raises(ValueError):
+        cells_in_bbox((-10, -10, 10, 10), 6)
+
+
+def test_cells_in_radius():
+    cells = cells_in_radius(2.8, 41.9, 1000, 6)
+    minx, miny, maxx, maxy = radius_bbox(2.8, 41.9, 1000)
+
+    assert geohashes([2.8], [41.9], 6)[0] in cells
+    assert maxy - miny == pytest.approx(2 * 1000 / 111_195, rel=1e-3)
+    assert maxx - minx > maxy - miny
+    # Circles reaching a pole wrap the whole parallel
+    assert radius_bbox(0, 89.99, 5000)[::2] == (-180, 180)
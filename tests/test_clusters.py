@@ -0,0 +1,44 @@
+import pytest
+from pypika.terms import LiteralValue
+
+from geotortoise.clusters import clusters_sql
+from geotortoise.functions import ST_ClusterKMeans
+from tests.models import Place
+
+AGGREGATES = (
+    'COUNT(*) "count",ST_AsBinary(ST_Centroid(ST_Collect("point"))) "centroid",'
+    'ST_XMin(ST_Extent("point")) "xmin",ST_YMin(ST_Extent("point")) "ymin",'
+    'ST_XMax(ST_Extent("point")) "xmax",ST_YMax(ST_Extent("point")) "ymax"'
+)
+
+
+async def test_grid_clusters_sql(init_models):
+    sql, values = clusters_sql(Place.filter(name="Garden"), 0.5)
+
+    assert sql == (
+        f'SELECT ST_AsBinary("cluster") "cluster",{AGGREGATES} FROM ('
+        'SELECT "point" "point",ST_SnapToGrid(ST_Centroid("point"),0.5) "cluster" '
+        'FROM "place" WHERE "name"=\'Garden\''
+        ') "rows" GROUP BY "cluster"'
+    )
+    assert values == []
+
+
+async def test_partitioned_clusters_sql(init_models):
+    point = Place._meta.fields_map["point"]
+    sql, _ = clusters_sql(
+        Place.all(), ST_ClusterKMeans(point, 10, partition_by=["name"])
+    )
+    with pytest.raises(TypeError):
+        clusters_sql(
+            Place.all(),
+            ST_ClusterKMeans(point, 10, partition_by=[LiteralValue("1")]),
+        )
+
+    assert sql == (
+        f'SELECT "name","cluster",{AGGREGATES} FROM ('
+        'SELECT "name" "name","point" "point","id" "id",'
+        'ST_ClusterKMeans("point",10) OVER(PARTITION BY "name") "cluster" '
+        'FROM "place") "rows" '
+        'GROUP BY "name","cluster",CASE WHEN "cluster" IS NULL THEN "id" END'
+    )
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+import shapely
+import shapely.wkb
+from shapely.geometry import Point, Polygon
+from tortoise.exceptions import FieldError, OperationalError
+
+from geotortoise.codecs import (
+    decode_geometries,
+    decode_geometry,
+    encode_geometries,
+    encode_geometry,
+    parse_box2d,
+)
+from geotortoise.fields import PointField, PolygonField
+from geotortoise.queryset import decode_geometry_columns
+from tests.models import Place
+
+test_polygon = Polygon([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        Point(2, 41),
+        shapely.wkb.dumps(Point(2, 41), srid=4326),
+        shapely.wkb.dumps(Point(2, 41), hex=True, srid=4326),
+    ],
+)
+def test_encode_geometry_returns_ewkb_bytes(value):
+    encoded = encode_geometry(value)
+
+    assert isinstance(encoded, bytes)
+    assert shapely.wkb.loads(encoded) == Point(2, 41)
+
+
+def test_decode_geometry_keeps_srid():
+    data = memoryview(shapely.wkb.dumps(test_polygon, srid=4326))
+    geom = decode_geometry(data)
+
+    assert geom == test_polygon
+    assert shapely.get_srid(geom) == 4326
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        test_polygon.wkt,
+        shapely.wkb.dumps(test_polygon, hex=True, srid=4326),
+        shapely.wkb.dumps(test_polygon, srid=4326),
+        bytearray(shapely.wkb.dumps(test_polygon)),
+    ],
+)
+def test_to_python_value_parses_text_and_binary_values(value):
+    assert PolygonField().to_python_value(value) == test_polygon
+
+
+@pytest.mark.parametrize("srid", [None, 4326])
+def test_encode_geometries_matches_to_db_value(srid):
+    field = PointField(srid=srid)
+    values = [Point(2, 41), None, "POINT (3 42)"]
+
+    assert field.to_db_values(values) == [field.to_db_value(v, Place) for v in values]
+
+
+def test_encode_geometries_rejects_invalid_values():
+    with pytest.raises(FieldError):
+        encode_geometries(["not a geometry"])
+    with pytest.raises(FieldError):
+        encode_geometries([42])
+
+
+def test_decode_geometries_matches_to_python_value():
+    values = [
+        test_polygon.wkt,
+        shapely.wkb.dumps(test_polygon, hex=True, srid=4326),
+        memoryview(shapely.wkb.dumps(test_polygon)),
+        test_polygon,
+        None,
+    ]
+
+    decoded = decode_geometries(values)
+
+    field = PolygonField()
+    assert decoded == [field.to_python_value(value) for value in values]
+    assert shapely.get_srid(decoded[1]) == 4326
+
+
+def test_decode_geometries_rejects_invalid_values():
+    with pytest.raises(OperationalError):
+        decode_geometries(["POLYGON ((0 0"])
+
+
+def test_decode_geometry_columns_in_chunks():
+    rows = [{"id": i, "name": "Garden", "point": Point(i, 0).wkt} for i in range(5)]
+
+    decoded = asyncio.run(decode_geometry_columns(Place, rows, chunk_size=2))
+
+    assert [row["point"] for row in decoded] == [Point(i, 0) for i in range(5)]
+    assert [row["name"] for row in decoded] == ["Garden"] * 5
+
+
+def test_parse_box2d():
+    assert parse_box2d("BOX(2.8 41.9,-3.5 42)") == (2.8, 41.9, -3.5, 42)
+    assert parse_box2d(None) is None
+    with pytest.raises(OperationalError):
+        parse_box2d("POINT(1 2)")
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import LineString, Point, box
+
+from geotortoise.evaluator import evaluate, local_filter
+from geotortoise.exceptions import LocalEvaluationError
+from geotortoise.functions import (
+    BBoxIntersects,
+    ST_ClosestPoint,
+    ST_Contains,
+    ST_Distance,
+    ST_DistanceSphere,
+    ST_DWithin,
+    ST_Equals,
+    ST_Intersection,
+    ST_Union,
+    ST_Within,
+)
+from tests.models import Place
+
+points = np.array([Point(0, 0), Point(2, 2), Point(5, 5)])
+area = box(1, 1, 3, 3)
+
+
+def test_evaluate_predicates_on_arrays():
+    assert evaluate(ST_Within(point=area), points).tolist() == [False, True, False]
+    assert evaluate(ST_DWithin(point=area, distance=1.5), points).tolist() == [
+        True,
+        True,
+        False,
+    ]
+    assert evaluate(BBoxIntersects(point=box(0, 0, 2, 2)), points).tolist() == [
+        True,
+        True,
+        False,
+    ]
+    # Topological equality, as in PostGIS
+    lines = np.array([LineString([(0, 0), (2, 0)])])
+    same_line = LineString([(0, 0), (1, 0), (2, 0)])
+    assert evaluate(ST_Equals(line=same_line), lines).tolist() == [True]
+
+
+def test_evaluate_measures_and_constructions():
+    distances = evaluate(ST_Distance(point="POINT (0 3)"), points)
+    assert distances.tolist() == pytest.approx([3, 5**0.5, 29**0.5])
+    intersections = evaluate(ST_Intersection(poly=box(2, 2, 4, 4)), {"poly": [area]})
+    assert intersections[0].equals(box(2, 2, 3, 3))
+    closest = evaluate(ST_ClosestPoint(poly=Point(0, 2)), {"poly": [area]})
+    assert closest[0] == Point(1, 2)
+
+    # Two constants give the same result for every row
+    assert evaluate(ST_Contains(area, Point(2, 2)), points).tolist() == [True] * 3
+
+
+def test_evaluate_unsupported_functions_raises_error():
+    with pytest.raises(LocalEvaluationError):
+        evaluate(ST_DistanceSphere(point=area), points)
+    with pytest.raises(LocalEvaluationError):
+        evaluate(ST_DWithin(point=area, distance=1, geography=True), points)
+    with pytest.raises(LocalEvaluationError):
+        evaluate(ST_Union("point"), points)
+
+
+async def test_local_filter_on_instances(init_models):
+    places = [Place(name=str(p), point=p) for p in points]
+    inside = local_filter(
+        places,
+        ST_Within(point=box(0, 0, 3, 3)),
+        ST_Contains(area, Place._meta.fields_map["point"]),
+    )
+
+    assert [p.point for p in local_filter(places, ST_Within(point=area))] == [
+        Point(2, 2)
+    ]
+    assert shapely.equals(inside[0].point, Point(2, 2))
@@ -0,0 +1,151 @@
+import pytest
+import shapely
+import shapely.wkb
+from shapely.geometry import Point
+from tortoise import ConfigurationError, Tortoise
+from tortoise.contrib.postgres.indexes import BrinIndex, SpGistIndex
+from tortoise.exceptions import FieldError
+from tortoise.utils import get_schema_sql
+
+from geotortoise.fields import (
+    ENCODED_GEOMETRIES_ATTR,
+    PointField,
+    PolygonField,
+    RawGeometry,
+)
+from geotortoise.models import encode_geometry_columns
+from tests.models import Place, Region
+
+
+async def test_spatial_indexes_are_generated_with_the_schema(init_models):
+    sql = get_schema_sql(Tortoise.get_connection("default"), safe=False)
+
+    assert 'ON "place" USING GIST ("point");' in sql
+    assert 'ON "region" USING GIST ("poly");' in sql
+
+
+@pytest.mark.parametrize(
+    "index_type, index_class", [("spgist", SpGistIndex), ("brin", BrinIndex)]
+)
+def test_spatial_index_type(index_type, index_class):
+    field = PointField(index_type=index_type, source_field="geom")
+    index = field.get_spatial_index()
+
+    assert isinstance(index, index_class)
+    assert index.fields == ["geom"]
+
+
+def test_invalid_spatial_index_type_raises_error():
+    with pytest.raises(ConfigurationError):
+        PointField(index_type="btree")
+
+
+async def test_lazy_geometry_is_decoded_on_first_access(init_models):
+    poly = Point(2, 41).buffer(1)
+    region = Region._init_from_db(
+        id=1, name="Girona", poly=shapely.wkb.dumps(poly, hex=True)
+    )
+
+    assert isinstance(region.__dict__["poly"], RawGeometry)
+    assert region.poly == poly
+    assert region.__dict__["poly"] is region.poly
+
+    region.poly = Point(0, 0).buffer(1)
+    assert region.poly == Point(0, 0).buffer(1)
+
+
+async def test_polygon_resolutions_are_derived_on_write(init_models):
+    sql = get_schema_sql(Tortoise.get_connection("default"), safe=False)
+    poly = Point(2, 41).buffer(1, 64)
+    region = Region(name="Girona", poly=poly)
+    field = Region._meta.fields_map["poly_low"]
+    hex_wkb = field.to_db_value(region.poly_low, region)
+
+    regions = [Region(name=str(i), poly=poly) for i in range(2)]
+    encode_geometry_columns(Region, regions)
+    update_fields = Region._with_derived_fields(["poly"])
+
+    assert '"poly_low" GEOMETRY(POLYGON)' in sql
+    simplified = shapely.simplify(poly, 0.01, preserve_topology=True)
+    assert region.poly_low == simplified
+    assert shapely.wkb.loads(hex_wkb) == simplified
+    assert len(simplified.exterior.coords) < len(poly.exterior.coords)
+    assert [r.poly_low for r in regions] == [simplified, simplified]
+    assert update_fields == ["poly", "poly_hash", "poly_low"]
+
+
+async def test_cells_are_derived_on_write(init_models):
+    sql = get_schema_sql(Tortoise.get_connection("default"), safe=False)
+    place = Place(name="Garden", point=Point(2.828788, 41.986682))
+    key = Place._meta.fields_map["point_hash"].to_db_value(None, place)
+
+    poly = Point(2.8, 41.9).buffer(0.01)
+    regions = [Region(name="Girona", poly=poly), Region(name="Nowhere")]
+    encode_geometry_columns(Region, regions)
+    update_fields = Place._with_derived_fields(["point"])
+
+    assert '"point_hash" VARCHAR(7)' in sql
+    assert 'ON "place" ("point_hash");' in sql
+    assert key == place.point_hash == "sp6nb77"
+    # From the centroid of polygons
+    assert [r.poly_hash for r in regions] == ["sp3yr", None]
+    assert update_fields == ["point", "point_hash"]
+
+
+def test_invalid_cell_precision_raises_error():
+    field = PointField(cells={"hash": 7})
+    field.model_field_name = "point"
+
+    assert field.get_cell_field_name("hash") == "point_hash"
+    with pytest.raises(FieldError):
+        field.get_cell_field_name("block")
+    with pytest.raises(ConfigurationError):
+        PointField(cells={"hash": 13})
+
+
+async def test_bulk_update_sends_geometries_as_hex_ewkb(init_models):
+    place = Place(id=1, name="Garden", point=Point(1, 2))
+    sql = Place.bulk_update([place], fields=["point"]).sql()
+
+    hex_wkb = shapely.wkb.dumps(Point(1, 2), hex=True)
+    assert f"CAST('{hex_wkb}' AS GEOMETRY(POINT))" in sql
+    assert "POINT (1 2)" not in sql
+    assert ENCODED_GEOMETRIES_ATTR not in place.__dict__
+    assert place.point == Point(1, 2)
+    # Without the vectorized encoding of the model
+    sql = Place.all().bulk_update([place], fields=["point"]).sql()
+    assert f"CAST('{hex_wkb}' AS GEOMETRY(POINT))" in sql
+
+
+def test_unknown_polygon_resolution_raises_error():
+    field = PolygonField(resolutions={"low": 0.01})
+    field.model_field_name = "poly"
+
+    assert field.get_resolution_field_name("low") == "poly_low"
+    with pytest.raises(FieldError):
+        field.get_resolution_field_name("high")
+
+
+def test_grid_size_reduces_precision_on_write():
+    field = PolygonField(grid_size=0.001, resolutions={"low": 0.01})
+    field.model_field_name = "poly"
+    polygon = Point(2.828787714242935, 41.98668181757302).buffer(0.1)
+
+    hex_wkb = field.to_db_value(polygon, None)
+    [bulk_hex_wkb] = field.to_db_values([polygon])
+
+    expected = shapely.set_precision(polygon, 0.001)
+    assert shapely.wkb.loads(hex_wkb, hex=True).equals_exact(expected, 0)
+    assert bulk_hex_wkb == hex_wkb
+    assert field.get_resolution_fields()["poly_low"].grid_size == 0.001
+
+
+def test_grid_size_reduces_precision_on_read():
+    assert (
+        PointField(grid_size=1e-6, source_field="geom")
+        .get_select_term()
+        .get_sql(quote_char='"')
+        == 'ST_ReducePrecision("geom",1e-06)'
+    )
+    column = PointField(source_field="geom").get_select_term()
+    assert column.get_sql(quote_char='"') == '"geom"'
@@ -0,0 +1,152 @@
+import pytest
+import shapely
+from pypika.terms import LiteralValue
+from shapely.geometry import Point
+
+from geotortoise._base_functions import parameterize_sql
+from geotortoise.functions import (
+    BBoxIntersects,
+    KNNDistance,
+    KNNDistanceND,
+    ST_AsGeoJSON,
+    ST_Centroid,
+    ST_ClusterDBSCAN,
+    ST_ClusterKMeans,
+    ST_Collect,
+    ST_Contains,
+    ST_Distance,
+    ST_DWithin,
+    ST_Extent,
+    ST_MemUnion,
+    ST_SnapToGrid,
+    ST_Union,
+    convert_to_db_value,
+)
+
+
+def test_geometries_are_inlined_as_wkb_by_default():
+    sql = convert_to_db_value(Point(1, 2), 4326).get_sql()
+
+    assert sql == (
+        "ST_GeomFromWKB(decode('0101000000000000000000f03f0000000000000040','hex'),4326)"
+    )
+
+
+def test_parameterized_statement_does_not_depend_on_the_geometry():
+    statements = set()
+    for x in range(10):
+        sql, values = parameterize_sql(
+            ST_Contains(poly=Point(x, 0), g2_srid=4326).get_sql
+        )
+        statements.add(sql)
+        assert values == [shapely.to_wkb(Point(x, 0))]
+
+    assert statements == {"ST_Contains(poly,ST_GeomFromWKB($1,4326))"}
+
+
+def test_parameterized_wkt_is_bound_as_text():
+    sql, values = parameterize_sql(ST_Distance(point="POINT (1 2)").get_sql)
+
+    assert sql == "ST_Distance(point,ST_GeomFromText($1))"
+    assert values == ["POINT (1 2)"]
+
+
+def test_st_dwithin_geography_variant():
+    sql, _ = parameterize_sql(
+        ST_DWithin(
+            point=Point(1, 2),
+            distance=500,
+            g2_srid=4326,
+            geography=True,
+            use_spheroid=False,
+        ).get_sql
+    )
+
+    assert sql == (
+        "ST_DWithin(geography(point),geography(ST_GeomFromWKB($1,4326)),500,false)"
+    )
+
+
+def test_st_dwithin_requires_geography_for_use_spheroid():
+    with pytest.raises(TypeError):
+        ST_DWithin(point=Point(1, 2), distance=500, use_spheroid=True)
+    with pytest.raises(TypeError):
+        ST_DWithin(point=Point(1, 2))
+
+
+def test_bbox_intersects_renders_operator():
+    sql, _ = parameterize_sql(BBoxIntersects(poly=Point(1, 2)).get_sql)
+
+    assert sql == "poly && ST_GeomFromWKB($1)"
+
+
+@pytest.mark.parametrize(
+    "function, operator", [(KNNDistance, "<->"), (KNNDistanceND, "<<->>")]
+)
+def test_knn_distance_renders_operator(function, operator):
+    sql, _ = parameterize_sql(function(point=Point(1, 2), g2_srid=4326).get_sql)
+
+    assert sql == f"point {operator} ST_GeomFromWKB($1,4326)"
+
+
+def test_st_asgeojson():
+    assert ST_AsGeoJSON(LiteralValue("poly"), 6).get_sql() == "ST_AsGeoJSON(poly,6)"
+    assert (
+        ST_AsGeoJSON(LiteralValue("region"), geom_column="poly").get_sql()
+        == "ST_AsGeoJSON(region,'poly',9)"
+    )
+
+
+def test_cluster_window_functions():
+    point = LiteralValue('"point"')
+
+    assert ST_ClusterDBSCAN(point, 0.5, 2).get_sql() == (
+        'ST_ClusterDBSCAN("point",0.5,2) OVER()'
+    )
+    assert ST_ClusterKMeans(
+        point, 5, partition_by=["category", LiteralValue("kind")]
+    ).get_sql(quote_char='"') == (
+        'ST_ClusterKMeans("point",5) OVER(PARTITION BY "category",kind)'
+    )
+    assert ST_ClusterKMeans(point, 5, 0.1).get_sql() == (
+        'ST_ClusterKMeans("point",5,0.1) OVER()'
+    )
+
+
+def test_st_snaptogrid():
+    point = LiteralValue('"point"')
+
+    assert ST_SnapToGrid(point, 0.5).get_sql() == 'ST_SnapToGrid("point",0.5)'
+    assert ST_SnapToGrid(point, 0.5, 1).get_sql() == 'ST_SnapToGrid("point",0.5,1)'
+
+
+@pytest.mark.parametrize(
+    "function, name",
+    [
+        (ST_Extent, "ST_Extent"),
+        (ST_Collect, "ST_Collect"),
+        (ST_MemUnion, "ST_MemUnion"),
+    ],
+)
+def test_spatial_aggregates(function, name):
+    aggregate = function("point")
+
+    assert aggregate.is_aggregate
+    assert aggregate.get_sql(quote_char='"') == f'{name}("point")'
+
+
+def test_st_union_aggregate_and_comparative_forms():
+    aggregate = ST_Union("poly")
+    union = ST_Union(poly=Point(1, 2))
+
+    assert aggregate.is_aggregate
+    assert aggregate.get_sql(quote_char='"') == 'ST_Union("poly")'
+    assert not union.is_aggregate
+    assert union.get_sql().startswith("ST_Union(poly,ST_GeomFromWKB(")
+
+
+def test_centroid_of_an_aggregate_is_an_aggregate():
+    centroid = ST_Centroid(ST_Collect("point"))
+
+    assert centroid.is_aggregate
+    assert centroid.get_sql(quote_char='"') == 'ST_Centroid(ST_Collect("point"))'
@@ -1,9 +1,50 @@
-from shapely.geometry import Point, Polygon
+import asyncio
+import json
 
-from geotortoise.functions import ST_Contains, ST_Distance, ST_Within
-from tests.models import Place, Region
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Point, Polygon, shape
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
 
-from .conftest import db_handler
+from geotortoise.bulk import copy_from_geometries
+from geotortoise.cache import SpatialCache
+from geotortoise.clusters import fetch_clusters
+from geotortoise.codecs import decode_geometries, parse_box2d
+from geotortoise.evaluator import local_filter
+from geotortoise.functions import (
+    BBoxIntersects,
+    ST_Centroid,
+    ST_ClusterDBSCAN,
+    ST_Collect,
+    ST_Contains,
+    ST_Distance,
+    ST_DWithin,
+    ST_Extent,
+    ST_Intersects,
+    ST_Union,
+    ST_Within,
+)
+from geotortoise.instrumentation import SQL
+from geotortoise.instrumentation import explain as explain_plan
+from geotortoise.instrumentation import instrument_client, instrumentation
+from geotortoise.loaders import ContainsLoader
+from geotortoise.queryset import (
+    bbox_prefilter,
+    fetch_columns,
+    fetch_feature_collection,
+    fetch_parameterized,
+    nearest,
+    radius_prefilter,
+    select_resolution,
+    stream,
+)
+from geotortoise.subdivide import refresh_subdivisions
+from geotortoise.tiles import TileCache, fetch_tile
+from tests.models import Country, CountryAreaPiece, Place, Region
+
+from .conftest import db_handler, explain
 
 # TODO: Create model objects as fixtures
 test_region = Polygon(
@@ -46,6 +87,22 @@ async def test_create_region():
     assert (await Region.first()).poly == test_region
 
 
+@db_handler
+async def test_bulk_create_and_update_places():
+    await Place.bulk_create(
+        [
+            Place(name="Garden", point=test_place),
+            Place(name="Obstacle", point=test_obstacle.wkt),
+        ]
+    )
+    places = await Place.all().order_by("name")
+    assert [p.point for p in places] == [test_place, test_obstacle]
+
+    places[0].point = test_obstacle
+    await Place.bulk_update(places[:1], fields=["point"])
+    assert (await Place.get(name="Garden")).point == test_obstacle
+
+
 @db_handler
 async def test_st_contains():
     await Region.create(name="Girona", poly=test_region)
@@ -57,6 +114,17 @@ async def test_st_contains():
     assert len(qs) == 1
 
 
+@db_handler
+async def test_st_contains_with_bound_geometry():
+    await Region.create(name="Girona", poly=test_region)
+    await Region.create(name="Other region", poly=test_other_region)
+    qs = Region.filter(ST_Contains(Region._meta.fields_map["poly"], test_place))
+
+    regions = await fetch_parameterized(qs)
+    assert [r.name for r in regions] == ["Girona"]
+    assert regions[0].poly == test_region
+
+
 @db_handler
 async def test_st_within():
     await Place.create(name="Garden", point=test_place)
@@ -76,5 +144,384 @@ async def test_st_distance():
     pt = await Place.create(name="Garden", point=test_place)
     distance = await Place.annotate(distance=ST_Distance(pt.point, test_obstacle))
     # TODO: Return value in Km unit
-    assert distance[0].distance == 0.0004990848754599389
+    assert distance[0].distance == pytest.approx(test_place.distance(test_obstacle))
+
+
+@db_handler
+async def test_st_dwithin():
+    await Place.create(name="Garden", point=test_place)
+    await Place.create(name="Faraway", point=Point(23, 10))
+
+    nearby = await Place.filter(
+        ST_DWithin(point=test_obstacle, distance=50, geography=True)
+    )
+    assert [p.name for p in nearby] == ["Garden"]
+
+    nearby = await Place.filter(
+        ST_DWithin(point=test_obstacle, distance=50, geography=True, use_spheroid=False)
+    )
+    assert [p.name for p in nearby] == ["Garden"]
+
+
+@db_handler
+async def test_radius_filters_use_spatial_index():
+    await Tortoise.get_connection("default").execute_script(
+        'CREATE INDEX IF NOT EXISTS "geog_place_point" ON "place" USING GIST '
+        '(geography("point"));'
+    )
+    await Place.create(name="Garden", point=test_place)
+    spatial_index = "idx_place_point_"  # Generated by the PointField
+
+    plan = await explain(Place.filter(ST_DWithin(point=test_obstacle, distance=0.001)))
+    assert spatial_index in plan
+
+    plan = await explain(
+        Place.filter(ST_DWithin(point=test_obstacle, distance=50, geography=True))
+    )
+    assert "geog_place_point" in plan
+
+    plan = await explain(Place.filter(BBoxIntersects(point=test_region)))
+    assert spatial_index in plan
+
+    plan = await explain(nearest(Place.all(), 1, point=test_obstacle))
+    assert spatial_index in plan
+
+
+@db_handler
+async def test_nearest_with_keyset_pagination():
+    for i in range(5):
+        await Place.create(name=f"Place {i}", point=Point(i, 0))
+    await Place.create(name="Tie", point=Point(0, 2))
+
+    first_page = await nearest(Place.all(), 3, point=Point(0, 0))
+    assert [p.name for p in first_page] == ["Place 0", "Place 1", "Place 2"]
+    assert [p.distance for p in first_page] == [0, 1, 2]
 
+    last = first_page[-1]
+    second_page = await nearest(
+        Place.all(), 3, after=(last.distance, last.pk), point=Point(0, 0)
+    )
+    assert [p.name for p in second_page] == ["Tie", "Place 3", "Place 4"]
+
+
+@db_handler
+async def test_stream_in_chunks():
+    await Place.bulk_create(
+        [Place(name=f"Place {i}", point=Point(i, 0)) for i in range(5)]
+    )
+
+    chunks = [chunk async for chunk in stream(Place.all().order_by("id"), chunk_size=2)]
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[2][0].point == Point(4, 0)
+
+    chunks = [chunk async for chunk in stream(Place.all(), chunk_size=5, raw=True)]
+    assert isinstance(chunks[0][0]["point"], str)
+
+
+@db_handler
+async def test_fetch_tile():
+    await Region.create(name="Girona", poly=test_region)
+    cache = TileCache()
+
+    tile = await fetch_tile(Region.all(), 10, 519, 375, ["name"], cache=cache)
+    assert tile
+    assert len(cache) == 1
+    assert await fetch_tile(Region.all(), 10, 519, 375, ["name"], cache=cache) == tile
+
+    assert await fetch_tile(Region.all(), 10, 0, 0) == b""
+
+
+@db_handler
+async def test_fetch_feature_collection():
+    await Region.create(name="Girona", poly=test_region)
+    await Region.create(name="Other region", poly=test_other_region)
+
+    collection = json.loads(
+        await fetch_feature_collection(Region.filter(name="Girona"), ["name"])
+    )
+    assert collection["type"] == "FeatureCollection"
+    [feature] = collection["features"]
+    assert feature["properties"] == {"name": "Girona"}
+    assert shape(feature["geometry"]).equals_exact(test_region, tolerance=1e-9)
+
+    collection = json.loads(await fetch_feature_collection(Region.filter(name="None")))
+    assert collection["features"] == []
+
+    collection = json.loads(
+        await fetch_feature_collection(Region.all().order_by("-name"), ["name"])
+    )
+    names = [feature["properties"]["name"] for feature in collection["features"]]
+    assert names == ["Other region", "Girona"]
+
+
+@db_handler
+async def test_contains_loader():
+    await Region.create(name="Girona", poly=test_region)
+    await Region.create(name="Other region", poly=test_other_region)
+    loader = ContainsLoader(Region.all())
+
+    matches = await loader.bulk_contains([test_place, Point(0, 0), test_place])
+    assert [[r.name for r in regions] for regions in matches] == [
+        ["Girona"],
+        [],
+        ["Girona"],
+    ]
+    assert matches[0][0].poly == test_region
+
+    regions, nothing = await asyncio.gather(
+        loader.load(test_obstacle), loader.load(Point(0, 0))
+    )
+    assert [r.name for r in regions] == ["Girona"]
+    assert nothing == []
+
+
+@db_handler
+async def test_spatial_cache_reloads_after_changes():
+    await Region.create(name="Girona", poly=test_region)
+    cache = SpatialCache(Region.all())
+    try:
+        assert [r.name for r in await cache.contains(test_place)] == ["Girona"]
+
+        await Region.create(name="Other region", poly=test_other_region)
+        assert len(await cache.within(Polygon.from_bounds(-90, -90, 90, 90))) == 2
+
+        # Other geometries and positional filters are sent to the database
+        regions = await cache.filter(
+            ST_Contains(Region._meta.fields_map["poly"], test_place)
+        )
+        assert [r.name for r in regions] == ["Girona"]
+    finally:
+        cache.close()
+
+
+@db_handler
+async def test_local_filter_matches_the_database():
+    await Place.create(name="Garden", point=test_place)
+    await Place.create(name="Obstacle", point=test_obstacle)
+    await Place.create(name="Faraway", point=Point(23, 10))
+    places = await Place.all().order_by("name")
+
+    for function in (
+        ST_Within(point=test_region),
+        ST_DWithin(point=test_obstacle, distance=0.0004),
+        BBoxIntersects(point=test_other_region),
+    ):
+        expected = await Place.filter(function).order_by("name")
+        assert local_filter(places, function) == expected
+
+
+@db_handler
+async def test_copy_from_geometries():
+    async def places():
+        for i in range(5):
+            yield {"name": f"Place {i}", "point": Point(i, 0)}
+
+    assert await copy_from_geometries(Place, places(), batch_size=2) == 5
+    assert (
+        await copy_from_geometries(Place, [Place(name="Garden", point=test_place)]) == 1
+    )
+
+    assert await Place.all().count() == 6
+    assert (await Place.get(name="Garden")).point == test_place
+    # The connection is back to the text geometries
+    chunks = [chunk async for chunk in stream(Place.all(), raw=True)]
+    assert isinstance(chunks[0][0]["point"], str)
+
+
+@db_handler
+async def test_select_polygon_resolution():
+    detailed = Point(2.8, 42).buffer(0.1, 64)
+    region = await Region.create(name="Girona", poly=test_region)
+    region.poly = detailed
+    await region.save(update_fields=["poly"])
+
+    [low] = await select_resolution(Region.all(), "low")
+    assert "poly" not in low.__dict__
+    assert low.poly_low.equals_exact(
+        shapely.simplify(detailed, 0.01, preserve_topology=True), 1e-9
+    )
+
+
+@db_handler
+async def test_fetch_clusters():
+    await Place.bulk_create(
+        [Place(name="Girona", point=Point(2.8 + i * 0.01, 42)) for i in range(3)]
+        + [Place(name="Faraway", point=Point(23, 10))]
+    )
+
+    cells = await fetch_clusters(Place.all(), 1)
+    cells.sort(key=lambda cell: cell["count"])
+    assert [cell["count"] for cell in cells] == [1, 3]
+    assert cells[0]["cluster"] == Point(23, 10)
+    assert cells[1]["centroid"].equals_exact(Point(2.81, 42), 1e-9)
+    assert (cells[1]["xmin"], cells[1]["xmax"]) == pytest.approx((2.8, 2.82))
+
+    point = Place._meta.fields_map["point"]
+    groups = await fetch_clusters(
+        Place.all(), ST_ClusterDBSCAN(point, 0.1, 1, partition_by=["name"])
+    )
+    assert sorted((g["name"], g["count"]) for g in groups) == [
+        ("Faraway", 1),
+        ("Girona", 3),
+    ]
+
+    # Noise is not merged into a single cluster
+    groups = await fetch_clusters(Place.all(), ST_ClusterDBSCAN(point, 0.001, 2))
+    assert sorted((g["cluster"], g["count"]) for g in groups) == [(None, 1)] * 4
+
+
+@db_handler
+async def test_subdivided_polygon_filters():
+    area = Point(2.8, 42).buffer(1, 64)
+    country = await Country.create(name="Catalonia", area=area)
+    assert await CountryAreaPiece.filter(parent=country).count() > 1
+
+    # Inside, at the center where the pieces are split, and outside
+    for point, expected in ((test_place, 1), (Point(2.8, 42), 1), (Point(23, 10), 0)):
+        assert await Country.filter(ST_Contains(area=point)).count() == expected
+        assert await Country.filter(ST_Intersects(area=point)).count() == expected
+    assert await Country.filter(ST_Contains(area=test_region)).count() == 1
+
+    country.area = Point(23, 10).buffer(1)
+    await country.save()
+    assert await Country.filter(ST_Contains(area=test_place)).count() == 0
+
+    await Country.filter(id=country.id).update(area=area)
+    await refresh_subdivisions(Country, "area")
+    assert await Country.filter(ST_Contains(area=test_place)).count() == 1
+
+
+@db_handler
+async def test_instrumentation():
+    await Place.create(name="Girona", point=test_place)
+    instrument_client(Tortoise.get_connection("default"))
+    instrumentation.enable()
+    try:
+        await Place.filter(ST_DWithin(point=test_obstacle, distance=0.001))
+    finally:
+        instrumentation.disable()
+    stats = instrumentation.stats()
+    instrumentation.reset()
+    assert stats[SQL]["ST_DWithin"]["calls"] == 1
+    assert stats["decode"]["GeometryField.to_python_value"]["calls"] == 1
+
+    queryset = Place.filter(ST_DWithin(point=test_obstacle, distance=0.001))
+    async with in_transaction() as connection:
+        await connection.execute_script("SET LOCAL enable_seqscan = off")
+        plan = await explain_plan(queryset, analyze=True, using_db=connection)
+    assert plan.functions[0] == "ST_DWithin"
+    assert plan.uses_spatial_index
+    assert plan.spatial_index_scans[0].relation == "place"
+    assert plan.seq_scans == []
+
+
+@db_handler
+async def test_decode_in_chunks():
+    await Region.create(name="Girona", poly=test_region)
+    await Place.bulk_create(
+        [Place(name="Garden", point=Point(2.8 + i * 0.01, 42)) for i in range(3)]
+    )
+
+    [region] = await fetch_parameterized(Region.all(), decode_chunk_size=1)
+    places = [
+        place
+        async for chunk in stream(Place.all(), chunk_size=2, decode_chunk_size=1)
+        for place in chunk
+    ]
+    assert region.poly == test_region
+    assert sorted(place.point.x for place in places) == pytest.approx([2.8, 2.81, 2.82])
+
+
+@db_handler
+async def test_fetch_columns():
+    await Region.create(name="Girona", poly=test_region)
+    await Place.create(name="Garden", point=test_place)
+    await Place.create(name="Faraway", point=Point(23, 10))
+
+    columns = await fetch_columns(Place.all().order_by("id"))
+    assert list(columns) == ["id", "name", "point_x", "point_y", "point_hash"]
+    assert columns["name"].tolist() == ["Garden", "Faraway"]
+    assert columns["point_x"].dtype == np.float64
+    assert columns["point_x"].tolist() == [test_place.x, 23]
+    assert columns["point_y"].tolist() == [test_place.y, 10]
+    assert columns["point_hash"].tolist() == ["sp6nb77", "s9b2gkk"]
+
+    columns = await fetch_columns(Region.all(), ["poly"])
+    assert columns["poly"][0].equals(test_region)
+    columns = await fetch_columns(Region.all(), ["poly"], geometries="wkb")
+    assert shapely.from_wkb(columns["poly"][0]).equals(test_region)
+
+    columns = await fetch_columns(Place.filter(name="None"), ["id", "point"])
+    assert [len(column) for column in columns.values()] == [0, 0, 0]
+
+
+@db_handler
+async def test_spatial_aggregates():
+    await Place.bulk_create(
+        [Place(name="Girona", point=Point(2.8 + i * 0.01, 42)) for i in range(3)]
+        + [Place(name="Faraway", point=Point(23, 10))]
+    )
+    await Region.create(name="West", poly=Point(0, 0).buffer(1))
+    await Region.create(name="East", poly=Point(1, 0).buffer(1))
+
+    rows = await (
+        Place.annotate(
+            extent=ST_Extent("point"), center=ST_Centroid(ST_Collect("point"))
+        )
+        .group_by("name")
+        .order_by("name")
+        .values("name", "extent", "center")
+    )
+    assert [row["name"] for row in rows] == ["Faraway", "Girona"]
+    assert parse_box2d(rows[1]["extent"]) == pytest.approx((2.8, 42, 2.82, 42))
+    [_, center] = decode_geometries([row["center"] for row in rows])
+    assert center.equals_exact(Point(2.81, 42), 1e-9)
+
+    [dissolved] = await Region.annotate(shape=ST_Union("poly")).values_list(
+        "shape", flat=True
+    )
+    [dissolved] = decode_geometries([dissolved])
+    expected = shapely.union(Point(0, 0).buffer(1), Point(1, 0).buffer(1))
+    assert dissolved.geom_type == "Polygon"
+    assert dissolved.area == pytest.approx(expected.area)
+
+
+@db_handler
+async def test_precision_reduction():
+    field = Place._meta.fields_map["point"]
+    field.grid_size = 1e-6
+    try:
+        await Place.create(name="Garden", point=test_place)
+        [place] = await fetch_parameterized(Place.all())
+    finally:
+        field.grid_size = None
+    assert place.point == shapely.set_precision(test_place, 1e-6)
+    assert place.point.wkt == "POINT (2.828788 41.986682)"
+
+
+@db_handler
+async def test_cell_prefilters():
+    await Place.bulk_create(
+        [
+            Place(name="Garden", point=test_place),
+            Place(name="Faraway", point=Point(23, 10)),
+        ]
+    )
+    garden = await Place.get(name="Garden")
+    garden.point = test_obstacle
+    await garden.save(update_fields=["point"])
+    assert (await Place.get(name="Garden")).point_hash == "sp6nb7k"
+
+    nearby = await radius_prefilter(
+        Place.filter(ST_DWithin(point=test_obstacle, distance=50, geography=True)),
+        test_obstacle.x,
+        test_obstacle.y,
+        50,
+        "hash",
+    )
+    assert [p.name for p in nearby] == ["Garden"]
+
+    inside = await bbox_prefilter(
+        Place.all(), test_obstacle.buffer(0.01).bounds, "hash"
+    )
+    assert [p.name for p in inside] == ["Garden"]
@@ -0,0 +1,112 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import shapely.wkb
+from shapely.geometry import Point
+
+from geotortoise.codecs import decode_geometry, encode_geometries
+from geotortoise.fields import PointField
+from geotortoise.instrumentation import (
+    DECODE,
+    ENCODE,
+    SQL,
+    Measurement,
+    instrument_client,
+    instrumentation,
+    spatial_functions,
+)
+
+test_point = Point(2, 41)
+
+
+@pytest.fixture
+def enabled():
+    measurements = []
+    instrumentation.reset()
+    instrumentation.enable(measurements.append)
+    yield measurements
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_instrumentation_is_disabled_by_default():
+    PointField(srid=4326).to_db_value(test_point, None)
+
+    assert instrumentation.stats() == {}
+
+
+def test_field_encode_and_decode_are_measured(enabled):
+    field = PointField(srid=4326)
+
+    hex_wkb = field.to_db_value(test_point, None)
+    field.to_python_value(hex_wkb)
+    field.to_python_value(None)
+
+    stats = instrumentation.stats()
+    assert stats[ENCODE]["GeometryField.to_db_value"]["calls"] == 1
+    assert stats[ENCODE]["GeometryField.to_db_value"]["bytes"] == len(hex_wkb)
+    assert stats[DECODE]["GeometryField.to_python_value"]["calls"] == 1
+    assert stats[DECODE]["GeometryField.to_python_value"]["bytes"] == len(hex_wkb)
+    assert [m.operation for m in enabled] == [ENCODE, DECODE]
+
+
+def test_codecs_are_measured(enabled):
+    encoded = encode_geometries([test_point, test_point], hex=False)
+    decode_geometry(shapely.wkb.dumps(test_point))
+
+    stats = instrumentation.stats()
+    assert stats[ENCODE]["encode_geometries"]["bytes"] == sum(map(len, encoded))
+    assert stats[DECODE]["decode_geometry"]["calls"] == 1
+
+
+def test_counters_are_thread_safe(enabled):
+    def record():
+        for _ in range(1000):
+            instrumentation.record(DECODE, "threads", 0.001, 10)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(record) for _ in range(8)]:
+            future.result()
+
+    assert instrumentation.stats()[DECODE]["threads"]["calls"] == 8000
+    assert instrumentation.stats()[DECODE]["threads"]["bytes"] == 80000
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        (
+            'SELECT * FROM "region" WHERE ST_Contains("poly",ST_GeomFromText(\'POINT(2 41)\'))',
+            ["ST_Contains", "ST_GeomFromText"],
+        ),
+        ('SELECT "id" FROM "place" ORDER BY "point"<->\'0101\' LIMIT 1', ["<->"]),
+        ('SELECT "id" FROM "place"', []),
+    ],
+)
+def test_spatial_functions(sql, expected):
+    assert spatial_functions(sql) == expected
+
+
+class Client:
+    async def execute_query(self, query, values=None):
+        return 0, []
+
+    async def execute_query_dict(self, query, values=None):
+        return []
+
+
+def test_instrument_client_measures_spatial_statements(enabled):
+    client = instrument_client(Client())
+    assert instrument_client(client) is client
+
+    async def run():
+        await client.execute_query('SELECT ST_Within("point",\'0101\') FROM "place"')
+        await client.execute_query_dict('SELECT "id" FROM "place"')
+
+    asyncio.run(run())
+
+    assert instrumentation.stats() == {
+        SQL: {"ST_Within": {"calls": 1, "seconds": enabled[0].seconds, "bytes": 0}}
+    }
+    assert enabled == [Measurement(SQL, "ST_Within", enabled[0].seconds, 0)]
@@ -0,0 +1,47 @@
+import asyncio
+
+from shapely.geometry import Point
+
+from geotortoise.loaders import ContainsLoader
+from tests.models import Region
+
+
+class RecordingLoader(ContainsLoader):
+    """Resolves every point to itself, recording the batches sent."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    async def bulk_contains(self, points):
+        self.batches.append(list(points))
+        return [[point] for point in points]
+
+
+async def test_contains_loader_sql(init_models):
+    loader = ContainsLoader(Region.filter(name="Girona"))
+    sql, values, positions = loader.sql([Point(1, 2), "POINT (3 4)", Point(1, 2)])
+
+    # The columns of the lateral subquery are selected in no particular order
+    assert sql.startswith(
+        'SELECT "geotortoise_lookup"."lookup_index","region".* '
+        "FROM unnest($1::bytea[]) "
+        'WITH ORDINALITY "geotortoise_lookup"("lookup_wkb","lookup_index") '
+        "CROSS JOIN LATERAL (SELECT "
+    )
+    assert sql.endswith(
+        ' FROM "region" WHERE "name"=\'Girona\' AND '
+        'ST_Contains(poly,ST_GeomFromWKB("geotortoise_lookup"."lookup_wkb"))'
+        ') "region"'
+    )
+    assert values == [[Point(1, 2).wkb, Point(3, 4).wkb]]
+    assert positions == [0, 1, 0]
+
+
+async def test_contains_loader_coalesces_concurrent_lookups(init_models):
+    loader = RecordingLoader(Region.all(), max_batch_size=3)
+    points = [Point(i, i) for i in range(4)]
+    results = await asyncio.gather(*(loader.load(p) for p in points))
+
+    assert results == [[p] for p in points]
+    assert loader.batches == [points[:3], points[3:]]
@@ -0,0 +1,125 @@
+import pytest
+import shapely
+from shapely.geometry import Point
+from tortoise import Tortoise
+from tortoise.exceptions import FieldError
+
+from geotortoise.cells import cells_in_bbox, cells_in_radius
+from geotortoise.functions import ST_Within
+from geotortoise.queryset import (
+    bbox_prefilter,
+    columns_sql,
+    feature_collection_sql,
+    parameterized_sql,
+    radius_prefilter,
+)
+from tests.models import Place, Region
+
+BBOX = (2.82, 41.98, 2.83, 41.99)
+
+
+async def test_columns_sql(init_models):
+    area = Point(2.8, 42).buffer(1)
+    points_sql, values = columns_sql(Place.filter(ST_Within(point=area)).order_by("id"))
+    polygons_sql, _ = columns_sql(Region.filter(name="Girona"), ["id", "poly"])
+
+    assert points_sql == (
+        'SELECT "id" "id","name" "name","point_hash" "point_hash",'
+        'ST_X("point") "point_x",ST_Y("point") "point_y" FROM "place" '
+        'WHERE ST_Within(point,ST_GeomFromWKB($1)) ORDER BY "id" ASC'
+    )
+    assert values == [shapely.to_wkb(area)]
+    assert polygons_sql == (
+        'SELECT "id" "id",ST_AsBinary("poly") "poly" FROM "region" '
+        "WHERE \"name\"='Girona'"
+    )
+
+
+def record_queries(monkeypatch, rows=()):
+    """Records the queries sent to the database, answering them with the rows."""
+    statements = []
+
+    async def execute_query(query, values=None):
+        statements.append((query, values))
+        return len(rows), list(rows)
+
+    connection = Tortoise.get_connection("default")
+    monkeypatch.setattr(connection, "execute_query", execute_query)
+    return statements
+
+
+async def test_awaited_querysets_bind_geometries(monkeypatch, init_models):
+    statements = record_queries(monkeypatch)
+    areas = [Point(x, 0).buffer(1) for x in range(3)]
+    for area in areas:
+        assert await Place.filter(ST_Within(point=area)) == []
+
+    [sql] = {sql for sql, _ in statements}
+    assert sql.endswith(' FROM "place" WHERE ST_Within(point,ST_GeomFromWKB($1))')
+    assert [values for _, values in statements] == [
+        [shapely.to_wkb(area)] for area in areas
+    ]
+
+
+async def test_awaited_querysets_select_binary_geometries(monkeypatch, init_models):
+    poly = Point(2, 41).buffer(1)
+    monkeypatch.setattr(Region._meta.fields_map["poly"], "binary", True)
+    statements = record_queries(monkeypatch, [{"id": 1, "poly": shapely.to_wkb(poly)}])
+    [region] = await Region.filter(name="Girona").only("id", "poly")
+
+    assert statements == [
+        (
+            'SELECT "id" "id",ST_AsBinary("poly") "poly" FROM "region" '
+            "WHERE \"name\"='Girona'",
+            [],
+        )
+    ]
+    assert region.poly == poly
+
+
+async def test_parameterized_sql_reduces_precision(monkeypatch, init_models):
+    monkeypatch.setattr(Place._meta.fields_map["point"], "grid_size", 1e-6)
+    sql, _ = parameterized_sql(Place.filter(name="Garden"))
+    values_sql, _ = parameterized_sql(Place.all().values("point"))
+
+    assert 'ST_ReducePrecision("point",1e-06) "point"' in sql
+    # The column is only selected reduced
+    assert sql.count('"point"') == 2
+    assert values_sql == (
+        'SELECT ST_ReducePrecision("point",1e-06) "point" FROM "place"'
+    )
+
+
+async def test_parameterized_sql_selects_binary_geometries(monkeypatch, init_models):
+    monkeypatch.setattr(Region._meta.fields_map["poly"], "binary", True)
+    sql, _ = parameterized_sql(Region.filter(name="Girona").only("id", "poly"))
+
+    assert sql == (
+        'SELECT "id" "id",ST_AsBinary("poly") "poly" FROM "region" '
+        "WHERE \"name\"='Girona'"
+    )
+
+
+async def test_feature_collection_sql_keeps_the_ordering(init_models):
+    sql, _ = feature_collection_sql(Region.all().order_by("-name"), ["name"])
+    with pytest.raises(FieldError):
+        feature_collection_sql(Region.all().order_by("id"), ["name"])
+
+    assert 'json_agg(CAST(ST_AsGeoJSON("feature".*,' in sql
+    assert 'AS JSON) ORDER BY "feature"."name" DESC)' in sql
+
+
+async def test_cell_prefilters(init_models):
+    bbox_sql = bbox_prefilter(Place.all(), BBOX, "hash").sql()
+    radius_sql = radius_prefilter(Place.all(), 2.8, 41.9, 1000, "hash").sql()
+    with pytest.raises(FieldError):
+        bbox_prefilter(Place.all(), BBOX, "block")
+    # Polygons are keyed by their centroid
+    with pytest.raises(FieldError):
+        radius_prefilter(Region.all(), 2.8, 41.9, 1000, "hash")
+
+    cells = cells_in_bbox(BBOX, 7)
+    assert f"\"point_hash\" IN ('{cells[0]}'," in bbox_sql
+    assert bbox_sql.count("'sp") == len(cells)
+    cells = "','".join(cells_in_radius(2.8, 41.9, 1000, 7))
+    assert radius_sql.endswith(f"WHERE \"point_hash\" IN ('{cells}')")
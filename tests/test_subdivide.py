@@ -0,0 +1,34 @@
+import pytest
+from shapely.geometry import Point
+
+from geotortoise.functions import ST_Contains, ST_Intersects, ST_Within
+from geotortoise.subdivide import refresh_subdivisions
+from tests.models import Country, CountryAreaPiece, Region
+
+PIECES = 'SELECT "parent_id" FROM "countryareapiece" WHERE'
+
+
+async def test_subdivided_filters_use_the_pieces(init_models):
+    point = Point(1, 2)
+    contains = Country.filter(ST_Contains(area=point)).sql()
+    intersects = Country.filter(ST_Intersects(area=point)).sql()
+    within = Country.filter(ST_Within(area=point)).sql()
+
+    target = (
+        "ST_GeomFromWKB(decode('0101000000000000000000f03f0000000000000040','hex'))"
+    )
+    candidates = f'"country"."id" IN ({PIECES} ST_Intersects("geom",{target}))'
+    assert intersects.endswith(f"WHERE {candidates}")
+    assert contains.endswith(
+        f"WHERE {candidates} AND CASE WHEN "
+        f'"country"."id" IN ({PIECES} ST_Contains("geom",{target})) THEN true '
+        f'ELSE ST_Contains("area",{target}) END'
+    )
+    # Other functions are evaluated on the whole polygon
+    assert PIECES not in within
+
+
+async def test_refresh_requires_a_subdivided_field(init_models):
+    assert CountryAreaPiece._meta.db_table == "countryareapiece"
+    with pytest.raises(TypeError):
+        await refresh_subdivisions(Region, "poly")
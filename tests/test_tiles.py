@@ -0,0 +1,86 @@
+import pytest
+from tortoise import Tortoise
+
+from geotortoise.tiles import TileCache, fetch_tile, tile_bounds, tile_sql
+from tests.models import Region
+
+
+def test_tile_bounds():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-180, -85.0511, 180, 85.0511))
+    assert tile_bounds(1, 1, 0) == pytest.approx((0, 0, 180, 85.0511))
+    assert tile_bounds(1, 1, 0, margin=0.5) == pytest.approx(
+        (-90, -66.5133, 270, 88.9706), abs=1e-4
+    )
+
+
+async def test_tile_sql_clips_in_the_database(init_models):
+    sql, values = tile_sql(Region.filter(name="Girona"), 10, 520, 380, ["name"])
+
+    assert sql == (
+        "SELECT ST_AsMVT(\"tile\",'default',4096,'mvt_geom') FROM ("
+        'SELECT "name" "name",ST_AsMVTGeom(ST_Transform(ST_SetSRID("poly",4326),3857),'
+        'ST_TileEnvelope(10,520,380),4096,256,true) "mvt_geom" FROM "region" '
+        "WHERE \"name\"='Girona' AND "
+        "poly && "
+        "ST_SetSRID(ST_Transform(ST_TileEnvelope(10,520,380,margin=>0.0625),4326),0)"
+        ') "tile"'
+    )
+    assert values == []
+
+
+async def test_fetch_tile_caches_by_query(monkeypatch, init_models):
+    statements = []
+
+    async def execute_query(query, values=None):
+        statements.append(query)
+        return 1, [(f"tile {len(statements)}".encode(),)]
+
+    connection = Tortoise.get_connection("default")
+    monkeypatch.setattr(connection, "execute_query", execute_query)
+    cache = TileCache()
+    girona = Region.filter(name="Girona")
+
+    assert await fetch_tile(girona, 10, 519, 375, cache=cache) == b"tile 1"
+    assert await fetch_tile(Region.all(), 10, 519, 375, cache=cache) == b"tile 2"
+    assert await fetch_tile(girona, 10, 519, 375, cache=cache) == b"tile 1"
+    assert len(statements) == 2
+    assert cache.invalidate(tile_bounds(10, 519, 375), layer="default") == 2
+
+
+def test_tile_cache_evicts_least_recently_used():
+    cache = TileCache(maxsize=2)
+    cache.set("regions", 0, 0, 0, b"a")
+    cache.set("regions", 1, 0, 0, b"b")
+    assert cache.get("regions", 0, 0, 0) == b"a"
+
+    cache.set("regions", 1, 1, 0, b"c")
+    assert cache.get("regions", 1, 0, 0) is None
+    assert len(cache) == 2
+
+
+def test_tile_cache_expires_tiles():
+    cache = TileCache(ttl=-1)
+    cache.set("regions", 0, 0, 0, b"a")
+
+    assert cache.get("regions", 0, 0, 0) is None
+
+
+def test_tile_cache_invalidates_by_bbox():
+    cache = TileCache()
+    for layer in ("regions", "places"):
+        cache.set(layer, 0, 0, 0, b"world")
+        cache.set(layer, 1, 0, 0, b"north-west")
+        cache.set(layer, 1, 1, 1, b"south-east")
+
+    # Beijing is in the north-east quadrant
+    assert cache.invalidate((116.2, 39.8, 116.6, 40.1), layer="regions") == 1
+    assert cache.get("regions", 0, 0, 0) is None
+    assert cache.get("regions", 1, 0, 0) == b"north-west"
+    assert cache.get("places", 0, 0, 0) == b"world"
+
+    # Girona is in the buffer of the north-west quadrant
+    assert cache.invalidate((2.6, 41.8, 3.0, 42.1), layer="places") == 2
+    assert cache.get("places", 1, 0, 0) is None
+
+    assert cache.invalidate((-10, -10, 10, 10)) == 3
+    assert len(cache) == 0
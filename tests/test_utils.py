@@ -1,12 +1,16 @@
+import numpy as np
 import pytest
-from shapely.geometry import Point
+from shapely.geometry import Point, Polygon
 
+from geotortoise.exceptions import InvalidCoordinateError
 from geotortoise.utils import (
-    longitude_is_valid,
+    coordinates_are_valid,
+    invalid_coordinates,
     latitude_is_valid,
+    longitude_is_valid,
+    normalize_coordinates,
     validate_coordinates,
 )
-from geotortoise.exceptions import InvalidCoordinateError
 
 
 @pytest.mark.parametrize(
@@ -64,3 +68,75 @@ def test_coordinates_validator_returns_same_geometry_when_coordinates_are_valid(
     same_original_geometry = validate_coordinates(geom)
 
     assert same_original_geometry == geom
+
+
+def test_coordinates_are_valid_for_arrays():
+    coords = np.array([[0, 0], [180.01, 0], [-180, 90], [0, -90.01], [np.nan, 0]])
+
+    assert coordinates_are_valid(coords).tolist() == [True, False, True, False, False]
+    assert invalid_coordinates(coords).tolist() == [1, 3, 4]
+
+
+def test_coordinates_are_valid_for_geometries():
+    geoms = [
+        Point(4, 89),
+        Polygon([(170, 0), (190, 0), (190, 10), (170, 0)]),
+        Polygon([(0, 0), (10, 0), (10, 10), (0, 0)]),
+        Point(0, -91),
+    ]
+
+    assert coordinates_are_valid(geoms).tolist() == [True, False, True, False]
+    assert invalid_coordinates(geoms).tolist() == [1, 3]
+
+
+@pytest.mark.parametrize(
+    "data", [[], np.empty((0, 2)), np.empty(0, dtype=object)], ids=str
+)
+def test_empty_coordinates(data):
+    assert coordinates_are_valid(data).tolist() == []
+    assert invalid_coordinates(data).tolist() == []
+    assert normalize_coordinates(data).tolist() == []
+
+
+@pytest.mark.parametrize(
+    "wrap_longitude, clamp_latitude, expected",
+    [
+        (True, True, [[-170, 0], [180, 90], [170, -90]]),
+        (True, False, [[-170, 0], [180, 95], [170, -100]]),
+        (False, True, [[190, 0], [180, 90], [-190, -90]]),
+    ],
+)
+def test_normalize_coordinates(wrap_longitude, clamp_latitude, expected):
+    coords = np.array([[190, 0], [180, 95], [-190, -100]])
+
+    normalized = normalize_coordinates(coords, wrap_longitude, clamp_latitude)
+
+    assert normalized.tolist() == expected
+    assert coords.tolist() == [[190, 0], [180, 95], [-190, -100]]
+
+
+def test_normalize_coordinates_of_geometries():
+    geoms = [
+        Point(190, 95),
+        Polygon([(190, 0), (200, 0), (200, 10), (190, 0)]),
+        None,
+    ]
+
+    normalized = normalize_coordinates(geoms)
+
+    assert normalized[0] == Point(-170, 90)
+    assert normalized[1] == Polygon([(-170, 0), (-160, 0), (-160, 10), (-170, 0)])
+    assert normalized[2] is None
+    assert coordinates_are_valid(normalized[:2]).all()
+
+
+def test_normalize_coordinates_keeps_geometries_across_the_antimeridian():
+    crossing = Polygon([(179, 0), (181, 0), (181, 1), (179, 0)])
+    shifted = Polygon([(539, 0), (541, 0), (541, 1), (539, 0)])
+
+    normalized = normalize_coordinates([crossing, shifted])
+
+    # Shifted as a whole, never torn into a shape around the globe
+    assert normalized[0] == crossing
+    assert normalized[1] == Polygon([(-181, 0), (-179, 0), (-179, 1), (-181, 0)])
+    assert normalized[0].bounds[2] - normalized[0].bounds[0] == 2